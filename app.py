@@ -1,11 +1,10 @@
 from flask import Flask, render_template
-from pymongo import MongoClient
+from mongo_client import get_db
 
 app = Flask(__name__)
 
-# MongoDB connection
-client = MongoClient("mongodb://mongodb-9iyq:27017")  # Ensure this is correct for your MongoDB instance
-db = client['StockData']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 
 # Collections for OHLCV data and Meta Data
 ohlcv_collection = db['ohlcv_data']
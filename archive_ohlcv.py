@@ -0,0 +1,71 @@
+from mongo_client import get_db
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ohlcv_storage import OHLCV_COLLECTION
+from price_archive import PriceArchive, archive_cutoffs, hot_sessions
+from trading_calendar import exchange_for
+from watermarks import mark_rewritten
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+ohlcv_collection = db[OHLCV_COLLECTION]
+
+MAX_WORKERS = 4
+
+# Function to move every ticker's bars older than the hot horizon into the Parquet archive
+def archive_all(archive, sessions, max_workers=MAX_WORKERS, dry_run=False):
+    # Each ticker keeps the given number of sessions of its own exchange
+    cutoffs = archive_cutoffs(sessions)
+    logging.info("Archiving bars dated before " + ", ".join(
+        f"{cutoff:%Y-%m-%d} ({exchange})" for exchange, cutoff in cutoffs.items())
+        + f" (keeping {sessions} trading sessions hot) to {archive.path}")
+
+    tickers = sorted(ohlcv_collection.distinct('ticker', {'date': {'$lt': max(cutoffs.values())}}))
+    if dry_run:
+        cold = sum(ohlcv_collection.count_documents({'ticker': ticker, 'date': {'$lt': cutoffs[exchange_for(ticker)]}})
+                   for ticker in tickers)
+        logging.info(f"Dry run: {cold} bars would be archived")
+        return 0
+
+    # Recorded before anything moves, so readers never skip the archive for a range it may hold
+    archive.record_cutoffs(cutoffs)
+    moved = failed = 0
+    archived = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(archive.archive_ticker, ohlcv_collection, ticker, cutoffs[exchange_for(ticker)]): ticker
+            for ticker in tickers
+        }
+        for future in as_completed(futures):
+            try:
+                count = future.result()
+                moved += count
+                if count:
+                    archived.append(futures[future])
+            except Exception as e:
+                # Nothing is deleted for a ticker whose archive write failed
+                logging.error(f"Error archiving {futures[future]}: {e}")
+                failed += 1
+
+    archive.write_manifest()
+    # The archived bars left ohlcv_data without a watermark moving; caches rebuild these tickers
+    mark_rewritten(db, archived)
+    logging.info(f"Archived {moved} bars from {len(tickers) - failed} tickers, {failed} tickers failed")
+    return moved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move ohlcv_data bars older than the hot horizon to compressed Parquet")
+    parser.add_argument('--sessions', type=int, default=None,
+                        help="trading sessions to keep in ohlcv_data (default: $OHLCV_HOT_SESSIONS or 300)")
+    parser.add_argument('--path', help="archive directory (default: $PRICE_ARCHIVE_DIR or ./price_archive)")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--dry-run', action='store_true', help="only count the bars that would be archived")
+    args = parser.parse_args()
+    archive_all(PriceArchive(args.path), args.sessions or hot_sessions(), args.workers, args.dry_run)
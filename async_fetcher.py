@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+import pandas as pd
+
+from dead_tickers import NoDataError
+from http_cache import cache_key
+
+# Yahoo's chart endpoint; pass a different base_url to point the fetcher at a local stub server
+YAHOO_BASE_URL = 'https://query2.finance.yahoo.com'
+
+# Yahoo throttles requests that do not look like they come from a browser
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+}
+
+# Responses worth retrying after a backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Global requests-per-second limit shared by every coroutine of a fetcher."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        # At least one whole token, or a fractional rate could never pay for a request
+        self.capacity = max(1.0, capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncYahooFetcher:
+    """
+    Fetches daily history for many tickers with bounded in-flight requests and a token bucket,
+    retrying 429s and 5xx responses with exponential backoff and jitter.
+    """
+
+    def __init__(self, requests_per_second=5, max_in_flight=10, max_retries=5,
+                 backoff_base=1.0, timeout=30, base_url=YAHOO_BASE_URL, response_cache=None):
+        self.requests_per_second = requests_per_second
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.base_url = base_url.rstrip('/')
+        self.response_cache = response_cache
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'errors': 0}
+
+    async def fetch_history(self, session, bucket, ticker, period='2y', start=None, end=None):
+        """
+        Return the ticker's daily history as a yfinance-style frame (empty if the range has no bars).
+        Raises NoDataError when Yahoo answers 404, i.e. it does not know the symbol.
+        """
+        params = {'interval': '1d', 'events': 'div,split', 'includeAdjustedClose': 'true'}
+        if start is not None:
+            params['period1'] = _epoch(start)
+            params['period2'] = _epoch(end) if end is not None else int(time.time())
+        else:
+            params['range'] = period
+        url = f"{self.base_url}/v8/finance/chart/{ticker}"
+
+        # The SQLite cache blocks, so its reads and writes run in the default executor, off the event loop
+        key = cache_key('GET', url, params)
+        if self.response_cache is not None:
+            cached = await asyncio.to_thread(self.response_cache.get, key, 'history')
+            if cached is not None:
+                return chart_to_frame(json.loads(cached[2]))
+
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            self.stats['requests'] += 1
+            async with session.get(url, params=params) as response:
+                if response.status == 404:
+                    raise NoDataError(ticker)
+                if response.status not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    body = await response.read()
+                    if self.response_cache is not None:
+                        await asyncio.to_thread(self.response_cache.put, key, 'history', response.status, {}, body)
+                    return chart_to_frame(json.loads(body))
+
+                if response.status == 429:
+                    self.stats['throttled'] += 1
+                retry_after = response.headers.get('Retry-After')
+
+            if attempt == self.max_retries:
+                break
+            self.stats['retries'] += 1
+            delay = self.backoff_base * 2 ** attempt * random.uniform(0.5, 1.5)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            logging.warning(f"HTTP {response.status} for {ticker}, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+        raise RuntimeError(f"Giving up on {ticker} after {self.max_retries} retries (HTTP {response.status})")
+
+    async def fetch_many(self, requests, on_result):
+        """
+        Fetch every (ticker, kwargs) pair in requests and hand each outcome to
+        on_result(ticker, hist, error). on_result is synchronous and runs in a worker
+        thread so that database writes never block the event loop.
+        """
+        bucket = TokenBucket(self.requests_per_second)
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+
+        async with aiohttp.ClientSession(headers=DEFAULT_HEADERS, timeout=timeout, connector=connector) as session:
+            async def run(ticker, kwargs):
+                async with in_flight:
+                    try:
+                        hist, error = await self.fetch_history(session, bucket, ticker, **kwargs), None
+                    except Exception as e:
+                        self.stats['errors'] += 1
+                        hist, error = None, e
+                await asyncio.to_thread(on_result, ticker, hist, error)
+
+            await asyncio.gather(*(run(ticker, kwargs) for ticker, kwargs in requests))
+
+    def run(self, requests, on_result):
+        """Blocking entry point for the synchronous scripts."""
+        asyncio.run(self.fetch_many(requests, on_result))
+
+
+def chart_to_frame(payload):
+    """Convert a v8 chart response into the auto-adjusted Open/High/Low/Close/Volume frame yfinance returns."""
+    result = (payload.get('chart', {}).get('result') or [None])[0]
+    if not result or not result.get('timestamp'):
+        return pd.DataFrame()
+
+    quote = result['indicators']['quote'][0]
+    frame = pd.DataFrame({
+        'Open': quote.get('open'),
+        'High': quote.get('high'),
+        'Low': quote.get('low'),
+        'Close': quote.get('close'),
+        'Volume': quote.get('volume'),
+    }, dtype='float64')
+
+    # Daily bars are stamped at midnight in the exchange's timezone, as yfinance does
+    exchange_tz = result.get('meta', {}).get('exchangeTimezoneName', 'UTC')
+    index = pd.to_datetime(result['timestamp'], unit='s', utc=True).tz_convert(exchange_tz).normalize()
+    frame.index = index
+
+    adjclose = result['indicators'].get('adjclose')
+    if adjclose:
+        ratio = pd.Series(adjclose[0]['adjclose'], index=index, dtype='float64') / frame['Close']
+        for column in ('Open', 'High', 'Low'):
+            frame[column] = frame[column] * ratio
+        frame['Close'] = frame['Close'] * ratio
+
+    frame = frame[~frame.index.duplicated(keep='last')]
+    return frame.dropna(subset=['Close'])
+
+
+def _epoch(value):
+    if isinstance(value, datetime):
+        moment = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    else:
+        moment = datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    return int(moment.timestamp())
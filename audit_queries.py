@@ -0,0 +1,158 @@
+from mongo_client import get_db
+import logging
+import argparse
+import sys
+from datetime import datetime, timedelta
+from dead_tickers import DEAD_TICKERS_COLLECTION
+from fundamentals import FUNDAMENTALS_COLLECTION, PERIOD_STATEMENTS
+from index_manifest import INDEXES, ensure_indexes, index_drift
+from price_buckets import PRICE_BUCKET_COLLECTION
+from watermarks import WATERMARK_COLLECTION
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+
+RS_FIELDS_PRESENT = {"$or": [{f"RS{i}": {"$exists": True, "$ne": None}} for i in range(4, 0, -1)]}
+
+# Function to list every query shape the scripts issue as (where it comes from, collection, explain body).
+# Bodies are built from sample values so the planner sees realistic predicates;
+# shapes marked expect_collscan read the whole collection on purpose.
+def query_shapes(sample):
+    ticker, date = sample['ticker'], sample['date']
+    return [
+        ("per-ticker history by date (price_loader, peer_score, migrate_*)", 'ohlcv_data',
+         {'find': 'ohlcv_data', 'filter': {'ticker': ticker}, 'sort': {'date': 1}}),
+        ("latest bars (watermarks bootstrap, daily_cron.calculate_rs_values)", 'ohlcv_data',
+         {'find': 'ohlcv_data', 'filter': {'ticker': ticker}, 'sort': {'date': -1}, 'limit': 252}),
+        ("bar by (ticker, date) (sector_trend_average, RS upserts)", 'ohlcv_data',
+         {'find': 'ohlcv_data', 'filter': {'ticker': ticker, 'date': date}}),
+        ("latest bar with RS values (daily_cron, update_historical_rs_scores)", 'ohlcv_data',
+         {'find': 'ohlcv_data', 'filter': {'ticker': ticker, **RS_FIELDS_PRESENT}, 'sort': {'date': -1}, 'limit': 1}),
+        ("bars since a date (price cache and bucket sync)", 'ohlcv_data',
+         {'find': 'ohlcv_data', 'filter': {'ticker': ticker, 'date': {'$gte': date}}}),
+        ("distinct tickers (every job)", 'ohlcv_data',
+         {'distinct': 'ohlcv_data', 'key': 'ticker', 'query': {}}),
+        ("distinct dates since start (sector_trend_average)", 'ohlcv_data',
+         {'distinct': 'ohlcv_data', 'key': 'date', 'query': {'date': {'$gte': date - timedelta(days=30)}}}),
+        ("latest comprehensive row (migrate_fundamentals)", 'comprehensive_data',
+         {'find': 'comprehensive_data', 'filter': {'ticker': ticker}, 'sort': {'date': -1}, 'limit': 1}),
+        ("indicator by ticker (sector_updater, update_historical_rs_scores)", 'indicators',
+         {'find': 'indicators', 'filter': {'ticker': ticker}, 'limit': 1}),
+        ("indicator by (ticker, date) (daily_cron.normalize_and_update_rs_scores)", 'indicators',
+         {'find': 'indicators', 'filter': {'ticker': ticker, 'date': date}}),
+        ("tickers by sector (sector_trend_average)", 'indicators',
+         {'aggregate': 'indicators', 'cursor': {}, 'pipeline': [
+             {"$match": {"sector": {"$exists": True, "$ne": None}}},
+             {"$group": {"_id": "$sector", "tickers_in_sector": {"$addToSet": "$ticker"}}}]}),
+        ("tickers by industry (sector_trend_average)", 'indicators',
+         {'aggregate': 'indicators', 'cursor': {}, 'pipeline': [
+             {"$match": {"industry": {"$exists": True, "$ne": None}}},
+             {"$group": {"_id": "$industry", "tickers_in_industry": {"$addToSet": "$ticker"}}}]}),
+        ("all indicators grouped by sector (update_sector_score, peer_score)", 'indicators',
+         {'aggregate': 'indicators', 'cursor': {}, 'pipeline': [
+             {"$group": {"_id": "$sector", "stocks": {"$push": "$$ROOT"}}}]}, 'expect_collscan'),
+        ("sector trend by date (sector_trend_average)", 'sector_trends',
+         {'find': 'sector_trends', 'filter': {'date': date}, 'limit': 1}),
+        ("sector trend upsert key (sector_trend_average)", 'sector_trends',
+         {'find': 'sector_trends', 'filter': {'date': date, 'sector': sample['sector'], 'type': 'sector'}}),
+        ("industry trend upsert key (sector_trend_average)", 'sector_trends',
+         {'find': 'sector_trends', 'filter': {'date': date, 'industry': sample['industry'], 'type': 'industry'}}),
+        ("stored report periods (fundamentals.stored_periods)", FUNDAMENTALS_COLLECTION,
+         {'find': FUNDAMENTALS_COLLECTION, 'filter': {'ticker': ticker, 'statement': {'$in': PERIOD_STATEMENTS}}}),
+        ("latest statement (fundamentals.load_fundamentals)", FUNDAMENTALS_COLLECTION,
+         {'find': FUNDAMENTALS_COLLECTION, 'filter': {'ticker': ticker, 'statement': 'financials'},
+          'sort': {'period': -1}, 'limit': 1}),
+        ("watermarks for a chunk (watermarks.get_watermarks)", WATERMARK_COLLECTION,
+         {'find': WATERMARK_COLLECTION, 'filter': {'ticker': {'$in': [ticker]}}}),
+        ("watermarks moved since the last sync (price_cache)", WATERMARK_COLLECTION,
+         {'find': WATERMARK_COLLECTION, 'filter': {'updated_at': {'$gt': datetime.utcnow() - timedelta(days=1)}}}),
+        ("dead ticker lookup (dead_tickers.mark_dead)", DEAD_TICKERS_COLLECTION,
+         {'find': DEAD_TICKERS_COLLECTION, 'filter': {'ticker': ticker}, 'limit': 1}),
+        ("year buckets (price_buckets)", PRICE_BUCKET_COLLECTION,
+         {'find': PRICE_BUCKET_COLLECTION, 'filter': {'ticker': ticker}, 'sort': {'year': 1}}),
+        ("meta data by ticker (app)", 'meta_data',
+         {'find': 'meta_data', 'filter': {'ticker': ticker}, 'limit': 1}),
+    ]
+
+# Function to pick real values to put in the query predicates
+def sample_values():
+    sample = {'ticker': 'AAPL', 'date': datetime(2024, 1, 2), 'sector': 'Technology', 'industry': 'Software'}
+    bar = db['ohlcv_data'].find_one({}, {'ticker': 1, 'date': 1})
+    if bar:
+        sample.update(ticker=bar['ticker'], date=bar['date'])
+    indicator = db['indicators'].find_one({'sector': {'$ne': None}, 'industry': {'$ne': None}},
+                                          {'sector': 1, 'industry': 1})
+    if indicator:
+        sample.update(sector=indicator['sector'], industry=indicator['industry'])
+    return sample
+
+# Function to collect the plan stages of the winning plan, skipping the plans the optimizer rejected
+def plan_stages(node, found=None):
+    found = [] if found is None else found
+    if isinstance(node, dict):
+        if isinstance(node.get('stage'), str):
+            found.append((node['stage'], node.get('indexName')))
+        for key, value in node.items():
+            if key not in ('rejectedPlans', 'allPlansExecution'):
+                plan_stages(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            plan_stages(value, found)
+    return found
+
+# Function to explain one query shape and return the problems found in its plan
+def audit_shape(body, expect_collscan):
+    explain = db.command('explain', body, verbosity='queryPlanner')
+    stages = plan_stages(explain)
+    problems = []
+    if any(stage == 'COLLSCAN' for stage, _ in stages) and not expect_collscan:
+        problems.append('COLLSCAN')
+    if any(stage == 'SORT' for stage, _ in stages):
+        problems.append('in-memory SORT')
+    indexes = sorted({index for _, index in stages if index})
+    return problems, indexes
+
+# Function to audit the index manifest and every query shape; returns the number of problems
+def audit():
+    problems = 0
+    existing = set(db.list_collection_names())
+
+    for name in INDEXES:
+        if name not in existing:
+            continue
+        missing, unmanaged = index_drift(db, name)
+        for keys in missing:
+            logging.error(f"{name}: manifest index {dict(keys)} is missing")
+            problems += 1
+        for keys in unmanaged:
+            logging.warning(f"{name}: index {dict(keys)} is not in the manifest")
+
+    for shape in query_shapes(sample_values()):
+        source, collection, body = shape[:3]
+        if collection not in existing:
+            logging.info(f"SKIP  {source}: {collection} does not exist")
+            continue
+        found, indexes = audit_shape(body, expect_collscan='expect_collscan' in shape)
+        if found:
+            problems += 1
+            logging.error(f"FLAG  {source}: {', '.join(found)}")
+        else:
+            logging.info(f"OK    {source}: {', '.join(indexes) or 'expected full scan'}")
+
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check indexes against the manifest and explain() every query shape")
+    parser.add_argument('--apply', action='store_true', help="create missing manifest indexes before auditing")
+    args = parser.parse_args()
+    if args.apply:
+        ensure_indexes(db)
+    problems = audit()
+    logging.info(f"Query plan audit finished with {problems} problem(s)")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,87 @@
+from mongo_client import get_db
+import logging
+import argparse
+import random
+import time
+from ohlcv_storage import OHLCV_COLLECTION, is_timeseries
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+
+# Configuration
+SAMPLE_TICKERS = 50
+PEER_GROUP_SIZE = 20
+REPEATS = 3
+
+# Function to time a read and return (seconds, documents read), keeping the best of several repeats
+def time_reads(read, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        documents = read()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, documents)
+    return best
+
+# Function to read full per-ticker close histories, as rs_score_new does
+def read_ticker_histories(collection, tickers):
+    return sum(len(list(collection.find({"ticker": ticker}, {"date": 1, "close": 1, "_id": 0})))
+               for ticker in tickers)
+
+# Function to read one peer group's closes sorted by date, as peer_score does
+def read_peer_group(collection, peers):
+    return len(list(collection.find({"ticker": {"$in": peers}}, {"date": 1, "close": 1}).sort("date", 1)))
+
+# Function to scan every close in the collection, as the full-history RS jobs do
+def scan_collection(collection):
+    return sum(1 for _ in collection.find({}, {"ticker": 1, "date": 1, "close": 1, "_id": 0}).batch_size(10000))
+
+# Function to report storage and read throughput for one collection
+def benchmark_collection(name, tickers, peers, repeats, full_scan):
+    collection = db[name]
+    stats = db.command('collStats', name)
+    layout = 'time-series' if is_timeseries(db, name) else 'standard'
+    logging.info(f"{name} ({layout}): {stats.get('count', 0)} rows, storage {stats.get('storageSize', 0) / 2**20:.1f} MB, "
+                 f"indexes {stats.get('totalIndexSize', 0) / 2**20:.1f} MB")
+
+    patterns = {
+        f"rs_score_new per-ticker history x{len(tickers)}": lambda: read_ticker_histories(collection, tickers),
+        f"peer_score peer group of {len(peers)}": lambda: read_peer_group(collection, peers),
+    }
+    if full_scan:
+        patterns["full collection scan"] = lambda: scan_collection(collection)
+
+    for pattern, read in patterns.items():
+        elapsed, documents = time_reads(read, repeats)
+        logging.info(f"  {pattern}: {documents} docs in {elapsed:.3f}s ({documents / elapsed:,.0f} docs/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ohlcv_data storage layouts on the RS and peer score read patterns")
+    parser.add_argument('collections', nargs='*', default=[OHLCV_COLLECTION, 'ohlcv_data_legacy'],
+                        help="collections to compare, e.g. the time-series ohlcv_data and the migrated-from legacy copy")
+    parser.add_argument('--sample', type=int, default=SAMPLE_TICKERS, help="tickers read for the per-ticker pattern")
+    parser.add_argument('--peers', type=int, default=PEER_GROUP_SIZE, help="tickers in the peer group query")
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--full-scan', action='store_true', help="also time a scan of every row")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    collections = [name for name in args.collections if name in db.list_collection_names()]
+    if not collections:
+        raise SystemExit(f"None of {', '.join(args.collections)} exist")
+
+    # The same tickers are read from every collection so the numbers are comparable
+    all_tickers = sorted(db[collections[0]].distinct('ticker'))
+    rng = random.Random(args.seed)
+    tickers = rng.sample(all_tickers, min(args.sample, len(all_tickers)))
+    peers = rng.sample(all_tickers, min(args.peers, len(all_tickers)))
+
+    for name in collections:
+        benchmark_collection(name, tickers, peers, args.repeats, args.full_scan)
@@ -0,0 +1,123 @@
+from mongo_client import DB_NAME, get_db
+import logging
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from index_manifest import ensure_indexes
+from ohlcv_storage import OHLCV_COLLECTION
+from ohlcv_writer import OHLCV_COLUMNS, frame_to_documents
+from price_loader import PRICE_SOURCE_ENV
+from price_panel import load_price_panel
+from rs_engine import RS_FIELDS, rs_matrices, write_rs_values
+from rs_server import compute_rs_server
+from trading_calendar import sessions
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Configuration
+BENCHMARK_DB = 'RSBenchmark'
+# The scratch database is dropped afterwards, so only names ending in this suffix are accepted
+SCRATCH_SUFFIX = 'Benchmark'
+TICKERS = 500
+SESSIONS = 1260
+GAP_RATE = 0.01
+INSERT_BATCH = 10000
+
+# Function to fill the scratch database with random-walk daily bars, a few missing per ticker
+def create_dataset(db, tickers, days, seed):
+    db.drop_collection(OHLCV_COLLECTION)
+    ensure_indexes(db, [OHLCV_COLLECTION])
+    collection = db[OHLCV_COLLECTION]
+
+    rng = np.random.default_rng(seed)
+    dates = sessions('US')
+    dates = dates[dates <= pd.Timestamp.today()][-days:]
+    batch = []
+    for number in range(tickers):
+        closes = 100 * np.cumprod(1 + rng.normal(0.0003, 0.02, len(dates)))
+        keep = rng.random(len(dates)) >= GAP_RATE
+        hist = pd.DataFrame({column: closes for column in OHLCV_COLUMNS}, index=dates)[keep]
+        hist['Volume'] = rng.integers(10000, 1000000, len(hist))
+        batch.extend(frame_to_documents(f"SYN{number:05d}", hist))
+        if len(batch) >= INSERT_BATCH:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    logging.info(f"Created {collection.estimated_document_count()} bars for {tickers} tickers over {len(dates)} sessions")
+
+# Function to remove every RS field so each engine starts from the same state
+def clear_rs_fields(db):
+    db[OHLCV_COLLECTION].update_many({}, {"$unset": {field: "" for field in RS_FIELDS}})
+
+# Function to read bytes in and out of the server, as counted by serverStatus
+def network_bytes(db):
+    network = db.command('serverStatus')['network']
+    return network['bytesIn'] + network['bytesOut']
+
+# Function to read back every bar's RS fields keyed by _id, to compare the engines' results
+def read_rs_fields(db):
+    projection = {field: 1 for field in RS_FIELDS}
+    return {doc.pop('_id'): doc for doc in db[OHLCV_COLLECTION].find({}, projection)}
+
+# Function to run the Python engine: load the closes, compute in numpy, write bulk updates
+def run_python_engine(db):
+    panel = load_price_panel(db, fields=('close',))
+    write_rs_values(db[OHLCV_COLLECTION], panel.dates, panel.tickers, rs_matrices(panel.closes))
+
+# Function to run the server engine: one $setWindowFields pipeline merged back into the bars
+def run_server_engine(db):
+    compute_rs_server(db)
+
+# Function to time one engine from a clean state and report wall time and network transfer
+def benchmark_engine(db, name, run):
+    clear_rs_fields(db)
+    transferred = network_bytes(db)
+    start = time.perf_counter()
+    run(db)
+    elapsed = time.perf_counter() - start
+    transferred = network_bytes(db) - transferred
+    logging.info(f"{name} engine: {elapsed:.2f}s, {transferred / 2**20:.1f} MB over the network")
+    return read_rs_fields(db)
+
+# Function to check both engines wrote the same fields with the same values
+def compare_results(python_values, server_values):
+    mismatches = 0
+    for _id, python_doc in python_values.items():
+        server_doc = server_values.get(_id, {})
+        if python_doc.keys() != server_doc.keys() or not all(
+                np.isclose(python_doc[field], server_doc[field]) for field in python_doc):
+            mismatches += 1
+    logging.info(f"{len(python_values) - mismatches} of {len(python_values)} bars match, {mismatches} differ")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the Python and server-side RS engines on a synthetic dataset")
+    parser.add_argument('--db', default=BENCHMARK_DB, help="scratch database, ending in 'Benchmark'; dropped afterwards unless --keep")
+    parser.add_argument('--tickers', type=int, default=TICKERS)
+    parser.add_argument('--sessions', type=int, default=SESSIONS, help="trading days of history per ticker")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help="keep the scratch database")
+    args = parser.parse_args()
+    if args.db == DB_NAME or not args.db.endswith(SCRATCH_SUFFIX):
+        parser.error(f"--db must name a scratch database ending in {SCRATCH_SUFFIX!r}, got {args.db!r}")
+
+    # The Python engine must read the scratch bars from Mongo, not a local cache of StockData
+    os.environ[PRICE_SOURCE_ENV] = 'documents'
+    db = get_db(args.db)
+    try:
+        create_dataset(db, args.tickers, args.sessions, args.seed)
+        python_values = benchmark_engine(db, "python", run_python_engine)
+        server_values = benchmark_engine(db, "server", run_server_engine)
+        mismatches = compare_results(python_values, server_values)
+    finally:
+        if not args.keep:
+            db.client.drop_database(args.db)
+    sys.exit(1 if mismatches else 0)
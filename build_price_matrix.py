@@ -0,0 +1,25 @@
+from mongo_client import get_db
+import logging
+import argparse
+from price_cache import PriceCache
+from price_matrix import build_price_matrix
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the shared memory-mapped date x ticker price matrix")
+    parser.add_argument('--path', help="matrix directory (default: $PRICE_MATRIX_DIR or ./price_matrix)")
+    parser.add_argument('--cache-path', help="Parquet cache directory (default: $PRICE_CACHE_DIR or ./price_cache)")
+    args = parser.parse_args()
+
+    # The matrix is built from the local Parquet cache, brought up to date with ohlcv_data first
+    cache = PriceCache(db, path=args.cache_path)
+    cache.sync()
+    build_price_matrix(cache, path=args.path)
@@ -1,21 +1,18 @@
 import pandas as pd
-from pymongo import MongoClient
+from mongo_client import get_db
 import numpy as np
+import argparse
+from indicator_snapshots import write_indicators
+from price_panel import load_price_panel
+from trading_calendar import align_series
 
-# MongoDB connection (hardcoded)
-client = MongoClient("mongodb://mongodb-9iyq:27017")
-db = client['StockData']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 ohlcv_collection = db['ohlcv_data']
-indicators_collection = db['indicators']
 
 # Benchmark ticker for S&P 500 (^GSPC)
 benchmark_ticker = '^GSPC'
 
-# Load benchmark data from MongoDB
-benchmark_data = list(ohlcv_collection.find({"ticker": benchmark_ticker}).sort("date", 1))
-benchmark_df = pd.DataFrame(benchmark_data)
-benchmark_df['date'] = pd.to_datetime(benchmark_df['date'])
-
 # Function to normalize RS score to 1-99 range
 def normalize_rs_score(rs_raw, max_score, min_score):
     return ((rs_raw - min_score) / (max_score - min_score)) * 98 + 1
@@ -71,53 +68,54 @@ def detect_new_rs_high(merged_df, lookback=40):
             return True
     return False
 
-# Fetch all unique tickers from the MongoDB database
-tickers = ohlcv_collection.distinct("ticker")
-
-# Iterate over all tickers and calculate RS
-for ticker in tickers:
-    print(f"Processing ticker: {ticker}")
-
-    # Fetch ticker data from MongoDB
-    ticker_data = list(ohlcv_collection.find({"ticker": ticker}).sort("date", 1))
-    
-    if len(ticker_data) > 0:
-        # Convert to pandas DataFrame
-        ticker_df = pd.DataFrame(ticker_data)
-        ticker_df['date'] = pd.to_datetime(ticker_df['date'])
-
-        # Merge on date
-        merged_df = pd.merge(ticker_df[['date', 'close']], benchmark_df[['date', 'close']], on='date', suffixes=('_ticker', '_benchmark'), how='inner')
-
-        # Ensure the data is sorted by date
-        merged_df = merged_df.sort_values('date').reset_index(drop=True)
-
-        if len(merged_df) >= 1:
-            # Calculate RS score
-            rs_score = calculate_rs_score(merged_df)
-            
-            # Detect new RS high
-            new_rs_high = detect_new_rs_high(merged_df)
-            
-            # Store RS score and whether it's a new RS high in the indicators collection
-            indicator_data = {
-                "ticker": ticker,
-                "rs_score": rs_score,
-                "new_rs_high": new_rs_high,
-                "date": pd.to_datetime('today')  # Store the current date
-            }
-
-            # Insert into indicators collection
-            indicators_collection.update_one(
-                {"ticker": ticker},
-                {"$set": indicator_data},
-                upsert=True
-            )
-
-            print(f"Stored RS score for {ticker}: {rs_score}, New RS High: {new_rs_high}")
+# Function to calculate and store the RS score of every ticker against the benchmark
+def main(publish=False):
+    # One bulk read of every ticker's closes, the benchmark included
+    panel = load_price_panel(db, fields=('close',))
+    benchmark_df = panel.frame(benchmark_ticker)
+    updates = {}
+
+    # Iterate over all tickers and calculate RS
+    for ticker in panel.tickers:
+        print(f"Processing ticker: {ticker}")
+
+        # The ticker's closes from the panel
+        ticker_df = panel.frame(ticker)
+
+        if len(ticker_df) > 0:
+            # Align on trading day ids to the days both traded, already in date order
+            merged_df = align_series(close_ticker=ticker_df['close'], close_benchmark=benchmark_df['close'])
+
+            if len(merged_df) >= 1:
+                # Calculate RS score
+                rs_score = calculate_rs_score(merged_df)
+
+                # Detect new RS high
+                new_rs_high = detect_new_rs_high(merged_df)
+
+                # Store RS score and whether it's a new RS high in the indicators collection
+                indicator_data = {
+                    "ticker": ticker,
+                    "rs_score": rs_score,
+                    "new_rs_high": new_rs_high,
+                    "date": pd.to_datetime('today')  # Store the current date
+                }
+
+                # Queued for one bulk write (or snapshot swap) into the indicators collection
+                updates[(ticker,)] = indicator_data
+
+                print(f"Calculated RS score for {ticker}: {rs_score}, New RS High: {new_rs_high}")
+            else:
+                print(f"No merged data available for {ticker}")
         else:
-            print(f"No merged data available for {ticker}")
-    else:
-        print(f"No data found for {ticker}")
+            print(f"No data found for {ticker}")
+
+    write_indicators(db, updates, key=('ticker',), publish=publish)
+    print("Relative strength score calculation complete.")
 
-print("Relative strength score calculation complete.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate benchmark-relative RS scores into indicators")
+    parser.add_argument('--publish', action='store_true',
+                        help="write a complete new indicators snapshot and swap it in atomically")
+    args = parser.parse_args()
+    main(publish=args.publish)
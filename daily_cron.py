@@ -1,85 +1,106 @@
 import yfinance as yf
-from pymongo import MongoClient, UpdateOne
+from pymongo import UpdateOne
+from mongo_client import get_db
 import pandas as pd
 import logging
+from datetime import datetime
+from http_session import shared_session_from_env, session_summary
+from index_manifest import ensure_indexes
+from ohlcv_storage import OHLCV_COLLECTION, is_timeseries
+from ohlcv_writer import BulkWriter, frame_to_documents, write_operations
+from rs_server import compute_rs_server, resolve_rs_engine
+from rs_state import RSState, seed_from_collection
+from trading_calendar import has_session_since, normalize_date, normalize_dates
+from watermarks import get_watermarks, set_watermark, history_range, rows_after_watermark
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
-# MongoDB connection setup
-client = MongoClient("mongodb://mongodb-9iyq:27017")
-db = client['StockData']
-ohlcv_collection = db['ohlcv_data']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+ohlcv_collection = db[OHLCV_COLLECTION]
 indicators_collection = db['indicators']
 
-# List of tickers to process
-tickers = ohlcv_collection.distinct('ticker')
-
-# Function to fetch and update daily OHLCV data
-def fetch_daily_ohlcv_data():
-    for ticker in tickers:
-        stock = yf.Ticker(ticker)
-        today_data = stock.history(period="5d")  # Fetch the last 5 days of data
-
-        if not today_data.empty:
-            date = today_data.index[-1].to_pydatetime()
-            row = today_data.iloc[-1]
-
-            # Create the data document
-            data = {
-                "ticker": ticker,
-                "date": date,
-                "open": row['Open'],
-                "high": row['High'],
-                "low": row['Low'],
-                "close": row['Close'],
-                "volume": row['Volume'],
-            }
-
-            # Use update_one with upsert=True to avoid duplicates
-            ohlcv_collection.update_one(
-                {"ticker": ticker, "date": date},
-                {"$set": data},
-                upsert=True
-            )
-            logging.info(f"Upserted record for {ticker} on {date}")
+# Function to fetch and store every bar since each ticker's watermark.
+# Returns the watermarks it started from and {ticker: closes by normalized date} of the bars written.
+def fetch_daily_ohlcv_data(tickers, timeseries, session=None):
+    watermarks = get_watermarks(db, tickers)
+
+    # Called by the writer once a ticker's bars are written; only then is its watermark moved
+    def on_written(ticker, error):
+        if error:
+            logging.error(f"Error storing data for {ticker}: {error}")
+        else:
+            set_watermark(db, ticker, last_dates[ticker])
+            written[ticker] = new_closes[ticker]
+            logging.info(f"Upserted records for {ticker} through {last_dates[ticker]}")
+
+    last_dates = {}
+    new_closes = {}
+    written = {}
+    today = datetime.utcnow().date()
+    with BulkWriter(ohlcv_collection) as writer:
+        for ticker in tickers:
+            watermark = watermarks.get(ticker)
+            # A finished last bar and no session since (weekend or holiday): nothing new to fetch
+            if watermark is not None and watermark.date() < today and not has_session_since(ticker, watermark, today):
+                continue
+            stock = yf.Ticker(ticker, session=session)
+            try:
+                date_range = history_range(watermark)
+                if date_range:
+                    start, end = date_range
+                    new_data = stock.history(start=start, end=end)
+                else:
+                    new_data = stock.history(period="5d")  # No watermark yet, fetch the last 5 days of data
+                new_data = rows_after_watermark(new_data, watermark, inclusive=not timeseries)
+            except Exception as e:
+                logging.error(f"Error fetching data for {ticker}: {e}")
+                continue
+
+            if new_data.empty:
+                continue
+
+            last_dates[ticker] = new_data.index.max()
+            new_closes[ticker] = pd.Series(new_data['Close'].to_numpy(), index=normalize_dates(new_data.index))
+            writer.submit(ticker, write_operations(frame_to_documents(ticker, new_data), timeseries), on_written)
     
     logging.info("Daily OHLCV data updated successfully.")
-
-# Function to calculate RS values (RS1, RS2, RS3, RS4) and daily percentage change
-def calculate_rs_values():
-    periods = {
-        "RS1": 63,
-        "RS2": 126,
-        "RS3": 189,
-        "RS4": 252
-    }
-
-    for ticker in tickers:
-        history = list(ohlcv_collection.find({"ticker": ticker}).sort("date", -1).limit(252))
-        if len(history) < 252:
-            logging.warning(f"Not enough data to calculate RS for ticker {ticker}")
-            continue
-
-        history_df = pd.DataFrame(history)
-        history_df['daily_pct_change'] = history_df['close'].pct_change() * 100
-
-        updates = {}
-        for rs_key, period in periods.items():
-            if len(history_df) >= period:
-                rolling_return = (history_df['close'].iloc[0] - history_df['close'].iloc[period]) / history_df['close'].iloc[period] * 100
-                updates[rs_key] = rolling_return
-
-        updates["daily_pct_change"] = history_df['daily_pct_change'].iloc[0]
-
-        if updates:
-            ohlcv_collection.update_one(
-                {"ticker": ticker, "date": history_df['date'].iloc[0]},
-                {"$set": updates},
-                upsert=True
-            )
-    
-    logging.info("RS values and daily percentage change calculated.")
+    return watermarks, written
+
+# Function to calculate RS values (RS1, RS2, RS3, RS4) and daily percentage change for the bars just written
+def calculate_rs_values(new_closes, watermarks):
+    if not new_closes:
+        logging.info("No new bars to calculate RS values for.")
+        return
+
+    if resolve_rs_engine(db) == 'server':
+        # Only the bars fetched in this run are written; the windows still read the history before them
+        since = min(closes.index.min() for closes in new_closes.values()).to_pydatetime()
+        compute_rs_server(db, list(new_closes), since)
+        logging.info("RS values and daily percentage change calculated.")
+        return
+
+    # The last 253 closes of every ticker, from one small file instead of ~252 documents per ticker
+    state = RSState.load()
+    operations = []
+    for ticker, closes in new_closes.items():
+        # A ticker the state has not seen, or whose bars were stored by another job, is refilled once from ohlcv_data
+        watermark = watermarks.get(ticker)
+        if state.last_date(ticker) != (watermark and normalize_date(watermark)):
+            seed_from_collection(db, state, ticker, closes.index.min().to_pydatetime())
+
+        for date, close in closes.items():
+            if state.append(ticker, date, close):
+                updates = state.rs_values(ticker)
+                if updates:
+                    operations.append(UpdateOne({"ticker": ticker, "date": date.to_pydatetime()}, {"$set": updates}))
+
+    # The buffers now hold the stored closes, whether or not the RS writes below succeed
+    state.save()
+    if operations:
+        ohlcv_collection.bulk_write(operations, ordered=False)
+    logging.info(f"RS values and daily percentage change calculated for {len(operations)} bars.")
 
 # Function to calculate weighted RS score for a stock
 def calculate_weighted_rs_score(ticker):
@@ -123,7 +144,7 @@ def calculate_weighted_rs_score(ticker):
         return None
 
 # Normalize and update RS scores in the indicators collection
-def normalize_and_update_rs_scores():
+def normalize_and_update_rs_scores(tickers):
     scores = []
     for ticker in tickers:
         score = calculate_weighted_rs_score(ticker)
@@ -149,15 +170,25 @@ def normalize_and_update_rs_scores():
 # Main function to run the daily cron job
 def run_daily_cron_job():
     logging.info("Starting daily cron job...")
+    ensure_indexes(db)
+
+    # Time-series storage only takes inserts, so bars are never re-written or upserted there
+    timeseries = is_timeseries(db)
+
+    # List of tickers to process
+    tickers = ohlcv_collection.distinct('ticker')
 
     # Step 1: Fetch today's OHLCV data for all tickers
-    fetch_daily_ohlcv_data()
+    session = shared_session_from_env(pool_size=4)
+    watermarks, new_closes = fetch_daily_ohlcv_data(tickers, timeseries, session)
+    for line in session_summary(session):
+        logging.info(line)
 
     # Step 2: Calculate RS values and daily percentage change
-    calculate_rs_values()
+    calculate_rs_values(new_closes, watermarks)
 
     # Step 3: Calculate RS scores for all tickers
-    normalize_and_update_rs_scores()
+    normalize_and_update_rs_scores(tickers)
 
     logging.info("Daily cron job completed.")
 
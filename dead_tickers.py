@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+# Collection of tickers that came back empty or delisted, with when to probe them again
+DEAD_TICKERS_COLLECTION = 'dead_tickers'
+
+# A dead ticker is re-probed after PROBE_TTL, doubling after every further miss up to MAX_PROBE_TTL
+PROBE_TTL = timedelta(days=7)
+MAX_PROBE_TTL = timedelta(days=90)
+
+
+# Text yfinance and Yahoo use when a symbol has no data, as opposed to a throttled or failed request
+NO_DATA_MESSAGES = ('possibly delisted', 'no price data found', 'no timezone found', 'no data found',
+                    "data doesn't exist")
+
+
+class NoDataError(Exception):
+    """Raised when Yahoo confirms it has no history at all for a ticker."""
+
+
+def is_no_data_error(error):
+    """
+    True when an exception confirms the ticker has no data: a NoDataError or one of yfinance's
+    delisted/missing errors. Rate limits and network errors are not, so they never mark a ticker dead.
+    """
+    if isinstance(error, NoDataError):
+        return True
+    message = str(error).lower()
+    return any(text in message for text in NO_DATA_MESSAGES)
+
+
+def load_dead_tickers(db, now=None):
+    """
+    Return (skip, probe): tickers still inside their negative-cache TTL, which should not be
+    requested at all, and dead tickers whose TTL has run out and get one more try this run.
+    """
+    now = now or datetime.utcnow()
+    skip, probe = set(), set()
+    for doc in db[DEAD_TICKERS_COLLECTION].find({}, {'ticker': 1, 'probe_after': 1, '_id': 0}):
+        (skip if doc['probe_after'] > now else probe).add(doc['ticker'])
+    return skip, probe
+
+
+def mark_dead(db, ticker, reason='no data'):
+    """Record an empty or delisted ticker and push its next probe out with exponential backoff."""
+    now = datetime.utcnow()
+    doc = db[DEAD_TICKERS_COLLECTION].find_one({'ticker': ticker}, {'misses': 1})
+    misses = (doc['misses'] if doc else 0) + 1
+    ttl = min(PROBE_TTL * 2 ** (misses - 1), MAX_PROBE_TTL)
+    db[DEAD_TICKERS_COLLECTION].update_one(
+        {'ticker': ticker},
+        {
+            '$set': {'reason': reason, 'misses': misses, 'last_probed': now, 'probe_after': now + ttl},
+            '$setOnInsert': {'first_seen': now}
+        },
+        upsert=True
+    )
+
+
+def mark_alive(db, ticker):
+    """Forget a ticker that returned data again."""
+    db[DEAD_TICKERS_COLLECTION].delete_one({'ticker': ticker})
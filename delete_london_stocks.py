@@ -1,5 +1,6 @@
 import logging
-from pymongo import MongoClient
+from mongo_client import get_db
+from index_manifest import ensure_indexes
 
 # Setup basic logging
 logging.basicConfig(
@@ -7,18 +8,16 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# MongoDB connection setup
-client = MongoClient("mongodb://mongodb-9iyq:27017")
-db = client['StockData']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 ohlcv_collection = db['ohlcv_data']
 indicators_collection = db['indicators']
 
 def ensure_index():
-    """Ensure indexes are created on the 'ticker' field for faster queries."""
-    logging.info("Ensuring indexes on 'ticker' field for both collections.")
+    """Ensure the manifest indexes (both lead with 'ticker') exist for faster queries."""
+    logging.info("Ensuring manifest indexes for both collections.")
     
-    ohlcv_collection.create_index("ticker")
-    indicators_collection.create_index("ticker")
+    ensure_indexes(db, ['ohlcv_data', 'indicators'])
     
     logging.info("Indexing complete.")
 
@@ -1,79 +1,204 @@
 import yfinance as yf
-from pymongo import MongoClient
+from mongo_client import get_db
 import pandas as pd
 import logging
+import argparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from async_fetcher import AsyncYahooFetcher
+from dead_tickers import is_no_data_error, load_dead_tickers, mark_dead, mark_alive
+from http_session import shared_session_from_env, session_summary
+from ingest_pipeline import IngestPipeline
+from ohlcv_storage import OHLCV_COLLECTION, ensure_ohlcv_collection, create_staging_collection, merge_staging
+from ohlcv_writer import BulkWriter, frame_to_documents, write_operations
+from watermarks import get_watermark, get_watermarks, set_watermark, history_range, rows_after_watermark
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# MongoDB connection (replace with your credentials)
-client = MongoClient("mongodb://mongodb-9iyq:27017")
-db = client['StockData']
-ohlcv_collection = db['ohlcv_data']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 meta_collection = db['meta_data']
 
-# Create a unique index for ohlcv collection to avoid duplicates
-ohlcv_collection.create_index([('ticker', 1), ('date', 1)], unique=True)
+# ohlcv_data is a standard collection with a unique (ticker, date) index, or a time-series
+# collection (OHLCV_STORAGE=timeseries when it is first created) that only takes inserts;
+# resolved by ensure_ohlcv_collection() when the script starts. A --backfill run writes plain
+# inserts to the staging collection instead and merges it into ohlcv_data at the end.
+ohlcv_collection = db[OHLCV_COLLECTION]
+insert_only = False
+
+# Watermarks held back until a backfill's staged bars are merged into ohlcv_data (None: set on write)
+deferred_watermarks = None
+
+# History requested for tickers without a watermark
+HISTORY_PERIOD = '2y'
+history_period = HISTORY_PERIOD
+
+# Keep-alive session shared by every yfinance call, optionally cached on disk (set YF_HTTP_CACHE)
+session = None
 
 # Track success and failures
 successful_tickers = []
 failed_tickers = []
+no_data_tickers = []  # Came back empty this run and are now in the negative cache
+skipped_tickers = []  # Known dead from an earlier run, not requested at all
+probing_tickers = set()  # Known dead but due for a re-probe this run
+
+# Number of tickers requested per yf.download call in batched mode
+CHUNK_SIZE = 100
+
+# Function to queue the rows of a history frame on the shared bulk writer
+def store_ticker_history(ticker, hist, writer):
+    last_date = hist.index.max()
+
+    # Called by the writer once every row of this ticker is written (error is None) or has failed
+    def on_written(ticker, error):
+        if error:
+            logging.error(f"Error inserting data for {ticker}: {error}")
+            failed_tickers.append(ticker)
+        else:
+            # Only advance the watermark once the rows are stored
+            advance_watermark(ticker, last_date)
+            record_success(ticker)
+
+    writer.submit(ticker, write_operations(frame_to_documents(ticker, hist), insert_only), on_written)
+
+# Function to move a ticker's watermark, or hold it back until a backfill is merged
+def advance_watermark(ticker, last_date):
+    if deferred_watermarks is None:
+        set_watermark(db, ticker, last_date)
+    else:
+        deferred_watermarks[ticker] = last_date
+
+# Function to fetch a ticker's new bars: the range after its watermark, or its full history if it has none.
+# With yfinance's exceptions shown (set in __main__) a delisted ticker raises instead of returning an empty
+# frame, so it can be told apart from a rate limit or network error.
+def fetch_ticker_history(ticker, watermark):
+    stock = yf.Ticker(ticker, session=session)
+
+    # Incremental fetch: only request the bars after the ticker's watermark
+    date_range = history_range(watermark)
+    if date_range:
+        start, end = date_range
+        return stock.history(start=start, end=end)
+
+    # A single period request returns whatever shorter history exists too, so there is no need to retry shorter ones
+    return stock.history(period=history_period)
 
 # Function to fetch OHLCV data and store it in MongoDB
-def fetch_and_store_ticker_data(ticker):
+def fetch_and_store_ticker_data(ticker, writer):
     logging.info(f"Fetching data for {ticker}")
-    stock = yf.Ticker(ticker)
-
-    periods = ['2y', '1y', '6mo']  # Trying multiple periods as a fallback
-    for period in periods:
-        try:
-            # Fetch historical OHLCV data for the current period
-            hist = stock.history(period=period)
-
-            # Skip if no data found
-            if hist.empty:
-                logging.warning(f"No data found for {ticker} with period {period}, possibly delisted or unavailable.")
-                continue  # Try the next period
-
-            # Store the OHLCV data in MongoDB
-            for date, row in hist.iterrows():
-                data = {
-                    'ticker': ticker,
-                    'date': date,
-                    'open': row['Open'],
-                    'high': row['High'],
-                    'low': row['Low'],
-                    'close': row['Close'],
-                    'volume': row['Volume']
-                }
-                try:
-                    ohlcv_collection.update_one(
-                        {'ticker': ticker, 'date': data['date']},
-                        {'$set': data},
-                        upsert=True
-                    )
-                except Exception as e:
-                    logging.error(f"Error inserting data for {ticker} on {date}: {e}")
-                    failed_tickers.append(ticker)
-                    return False
-
-            logging.info(f"Successfully stored data for {ticker} with period {period}")
-            successful_tickers.append(ticker)
-            return True
-
-        except Exception as e:
-            logging.error(f"Error fetching data for {ticker} with period {period}: {e}")
-
-    logging.warning(f"Encountered error with {ticker}, skipping for now.")
-    failed_tickers.append(ticker)  # Mark as failed if all periods fail
-    return False
+    watermark = get_watermark(db, ticker)
+    try:
+        hist = fetch_ticker_history(ticker, watermark)
+    except Exception as e:
+        if not is_no_data_error(e):
+            logging.error(f"Error fetching data for {ticker}: {e}")
+            failed_tickers.append(ticker)
+            return False
+        record_empty(ticker, watermark, e)
+        return True
+
+    store_fetched_history(ticker, hist, watermark, writer)
+    return True
+
+# Function to split a combined yf.download frame into one frame per ticker
+def split_download_frame(data, tickers):
+    frames = {}
+    for ticker in tickers:
+        if isinstance(data.columns, pd.MultiIndex):
+            if ticker not in data.columns.get_level_values(0):
+                continue
+            hist = data[ticker]
+        else:
+            # A single-ticker download comes back with flat columns
+            hist = data
+        hist = hist.dropna(subset=['Close'])
+        if not hist.empty:
+            frames[ticker] = hist
+    return frames
+
+# Function to fetch a chunk of tickers and store each ticker's rows
+def fetch_and_store_chunk(tickers, writer, period=None):
+    logging.info(f"Fetching chunk of {len(tickers)} tickers starting at {tickers[0]}")
+    watermarks = get_watermarks(db, tickers)
+
+    # Tickers with a watermark only need the bars after the oldest one; tickers without one need the
+    # full period. They are downloaded separately so a cold ticker never drags the rest into a full re-download.
+    incremental = [ticker for ticker in tickers if watermarks[ticker] is not None]
+    cold = [ticker for ticker in tickers if watermarks[ticker] is None]
+    if incremental:
+        date_ranges = [history_range(watermarks[ticker]) for ticker in incremental]
+        download_and_store(incremental, watermarks, writer,
+                           start=min(start for start, _ in date_ranges), end=date_ranges[0][1])
+    if cold:
+        download_and_store(cold, watermarks, writer, period=period or history_period)
+
+# Function to fetch a group of tickers with one yf.download call and store each ticker's rows
+def download_and_store(tickers, watermarks, writer, **download_args):
+    try:
+        data = yf.download(tickers, group_by='ticker', auto_adjust=True,
+                           threads=True, progress=False, session=session, **download_args)
+    except Exception as e:
+        logging.error(f"Error downloading chunk starting at {tickers[0]}: {e}")
+        failed_tickers.extend(tickers)
+        return
+
+    frames = split_download_frame(data, tickers)
+    for ticker in tickers:
+        if ticker not in frames and watermarks[ticker] is None:
+            # yf.download does not say why a ticker came back empty; requested on its own, yfinance raises
+            # the reason, so only a confirmed miss goes into the negative cache
+            fetch_and_store_ticker_data(ticker, writer)
+        else:
+            store_fetched_history(ticker, frames.get(ticker), watermarks[ticker], writer)
+
+# Function to store whatever a batched or async fetch returned for one ticker
+def store_fetched_history(ticker, hist, watermark, writer):
+    if hist is not None:
+        hist = rows_after_watermark(hist, watermark, inclusive=not insert_only)
+
+    if hist is None or hist.empty:
+        record_empty(ticker, watermark)
+    else:
+        store_ticker_history(ticker, hist, writer)
+
+# Function to record a ticker with no new rows: up to date, confirmed dead by error, or a failure to retry next run
+def record_empty(ticker, watermark, error=None):
+    if watermark is not None:
+        # Already stored through its watermark, nothing new to write
+        record_success(ticker)
+    elif is_no_data_error(error):
+        record_no_data(ticker)
+    else:
+        # An empty answer with no reason is as likely a swallowed rate limit as a dead ticker
+        logging.error(f"No data returned for {ticker} and no reason given, will retry next run")
+        failed_tickers.append(ticker)
+
+# Function to record a ticker whose data is stored or already up to date
+def record_success(ticker):
+    successful_tickers.append(ticker)
+    if ticker in probing_tickers:
+        mark_alive(db, ticker)
+
+# Function to put a ticker that returned no history into the negative cache
+def record_no_data(ticker):
+    logging.warning(f"No data found for {ticker}, possibly delisted or unavailable.")
+    mark_dead(db, ticker)
+    no_data_tickers.append(ticker)
+
+# Function to drop the tickers the negative cache says are still dead
+def skip_known_dead(tickers):
+    skip, probe = load_dead_tickers(db)
+    probing_tickers.update(probe)
+    skipped_tickers.extend(ticker for ticker in tickers if ticker in skip)
+    return [ticker for ticker in tickers if ticker not in skip]
 
 # Function to fetch data in parallel using ThreadPoolExecutor
 def fetch_data_in_parallel(tickers, max_workers=10):
     total_tickers = len(tickers)
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_ticker = {executor.submit(fetch_and_store_ticker_data, ticker): ticker for ticker in tickers}
+    tickers = skip_known_dead(tickers)
+    with BulkWriter(ohlcv_collection) as writer, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_ticker = {executor.submit(fetch_and_store_ticker_data, ticker, writer): ticker for ticker in tickers}
         
         for future in as_completed(future_to_ticker):
             ticker = future_to_ticker[future]
@@ -82,10 +207,102 @@ def fetch_data_in_parallel(tickers, max_workers=10):
             except Exception as exc:
                 logging.error(f"{ticker} generated an exception: {exc}")
 
-    # Summary message at the end
+    log_summary(total_tickers)
+
+# Function to fetch data in chunks of tickers using yf.download
+def fetch_data_in_batches(tickers, chunk_size=CHUNK_SIZE):
+    total_tickers = len(tickers)
+    tickers = skip_known_dead(tickers)
+    with BulkWriter(ohlcv_collection) as writer:
+        # total_tickers still counts the skipped ones, so step through what is left of the list
+        for start in range(0, len(tickers), chunk_size):
+            chunk = tickers[start:start + chunk_size]
+            if chunk:
+                fetch_and_store_chunk(chunk, writer)
+
+    log_summary(total_tickers)
+
+# Function to fetch data with the asyncio engine under a global requests-per-second limit
+def fetch_data_async(tickers, requests_per_second=5, max_in_flight=10):
+    total_tickers = len(tickers)
+    tickers = skip_known_dead(tickers)
+    watermarks = get_watermarks(db, tickers)
+
+    requests = []
+    for ticker in tickers:
+        date_range = history_range(watermarks[ticker])
+        if date_range:
+            requests.append((ticker, {'start': date_range[0], 'end': date_range[1]}))
+        else:
+            requests.append((ticker, {'period': history_period}))
+
+    fetcher = AsyncYahooFetcher(requests_per_second=requests_per_second, max_in_flight=max_in_flight,
+                                response_cache=getattr(session, 'response_cache', None))
+    with BulkWriter(ohlcv_collection) as writer:
+        def on_result(ticker, hist, error):
+            if error and is_no_data_error(error):
+                record_empty(ticker, watermarks[ticker], error)
+            elif error:
+                logging.error(f"Error fetching data for {ticker}: {error}")
+                failed_tickers.append(ticker)
+            else:
+                store_fetched_history(ticker, hist, watermarks[ticker], writer)
+
+        fetcher.run(requests, on_result)
+
+    logging.info(f"Async fetcher: {fetcher.stats['requests']} requests, {fetcher.stats['retries']} retries, "
+                 f"{fetcher.stats['throttled']} throttled")
+    log_summary(total_tickers)
+
+# Function to fetch data through the staged fetch -> transform -> write pipeline
+def fetch_data_pipeline(tickers, fetch_workers=10, transform_workers=2, write_workers=2):
+    total_tickers = len(tickers)
+    tickers = skip_known_dead(tickers)
+    watermarks = get_watermarks(db, tickers)
+    last_dates = {}
+
+    def fetch(ticker):
+        return fetch_ticker_history(ticker, watermarks[ticker])
+
+    def transform(ticker, hist):
+        hist = rows_after_watermark(hist, watermarks[ticker], inclusive=not insert_only)
+        if hist.empty:
+            if watermarks[ticker] is None:
+                # yfinance raises for a delisted ticker, so an empty frame here is an unexplained failure
+                raise RuntimeError(f"No data returned for {ticker} and no reason given")
+            return []  # Already stored through its watermark
+        last_dates[ticker] = hist.index.max()
+        return write_operations(frame_to_documents(ticker, hist), insert_only)
+
+    def on_written(ticker, error):
+        if error:
+            logging.error(f"Error inserting data for {ticker}: {error}")
+            failed_tickers.append(ticker)
+            return
+        if ticker in last_dates:
+            advance_watermark(ticker, last_dates[ticker])
+        record_success(ticker)
+
+    def on_failed(ticker, stage, error):
+        if is_no_data_error(error):
+            record_empty(ticker, watermarks[ticker], error)
+            return
+        logging.error(f"Error in {stage} stage for {ticker}: {error}")
+        failed_tickers.append(ticker)
+
+    pipeline = IngestPipeline(ohlcv_collection, fetch, transform, on_written=on_written, on_failed=on_failed,
+                              fetch_workers=fetch_workers, transform_workers=transform_workers,
+                              write_workers=write_workers)
+    pipeline.run(tickers)
+    log_summary(total_tickers)
+
+# Function to log the run summary
+def log_summary(total_tickers):
     logging.info("\n\n=== SUMMARY ===")
     logging.info(f"Total tickers expected: {total_tickers}")
     logging.info(f"Successfully fetched data for: {len(successful_tickers)} tickers")
+    logging.info(f"Skipped (known dead): {len(skipped_tickers)} tickers")
+    logging.info(f"No data, now marked dead: {len(no_data_tickers)} tickers")
     logging.info(f"Failed to fetch data for: {len(failed_tickers)} tickers")
 
     # Print failed tickers for easier debugging
@@ -94,7 +311,43 @@ def fetch_data_in_parallel(tickers, max_workers=10):
     else:
         logging.info("No tickers failed.")
 
+    if session is not None:
+        for line in session_summary(session):
+            logging.info(line)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch OHLCV history for the screener tickers into MongoDB")
+    parser.add_argument('--mode', choices=['batched', 'per-ticker', 'async', 'pipeline'], default='batched',
+                        help="batched: one yf.download call per chunk of tickers; per-ticker: one yf.Ticker per symbol; "
+                             "async: asyncio engine with a global rate limit; pipeline: staged fetch/transform/write")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--requests-per-second', type=float, default=5,
+                        help="async mode: token bucket rate shared by all requests")
+    parser.add_argument('--max-in-flight', type=int, default=10,
+                        help="async mode: maximum concurrent requests")
+    parser.add_argument('--fetch-workers', type=int, default=10, help="pipeline mode: fetcher threads")
+    parser.add_argument('--transform-workers', type=int, default=2, help="pipeline mode: transform threads")
+    parser.add_argument('--write-workers', type=int, default=2, help="pipeline mode: bulk writer threads")
+    parser.add_argument('--backfill', action='store_true',
+                        help="cold-start load: insert into a staging collection with no secondary indexes, "
+                             "then $merge it into ohlcv_data in one pass and build the indexes afterwards")
+    parser.add_argument('--period', default=HISTORY_PERIOD,
+                        help="history requested for tickers without a watermark, e.g. 5y or max for a backfill")
+    args = parser.parse_args()
+    # Raise yfinance's delisted/no-data errors instead of returning empty frames, for the dead-ticker checks
+    yf.config.debug.hide_exceptions = False
+    session = shared_session_from_env(pool_size=max(args.fetch_workers, args.max_in_flight, 10))
+    history_period = args.period
+    ohlcv_collection, insert_only = ensure_ohlcv_collection(db, with_indexes=not args.backfill)
+    staging = args.backfill and not insert_only
+    if staging:
+        ohlcv_collection = create_staging_collection(db)
+        insert_only = True
+        deferred_watermarks = {}
+    elif args.backfill:
+        # Time-series storage already takes plain inserts and cannot be a $merge target
+        logging.info("ohlcv_data is a time-series collection, backfilling with direct inserts")
+
     # Load tickers from CSV files
     uk_stocks = pd.read_csv('Stock Screener_UK.csv')['Symbol']
     us_stocks = pd.read_csv('Stock Screener_2024-09-30 (3).csv')['Symbol']
@@ -102,6 +355,22 @@ if __name__ == "__main__":
     # Combine and drop duplicates
     all_tickers = pd.concat([us_stocks, uk_stocks]).drop_duplicates().tolist()
 
-    # Fetch data in parallel
-    fetch_data_in_parallel(all_tickers)
+    # Fetch data in chunks or in parallel, one ticker at a time
+    if args.mode == 'batched':
+        fetch_data_in_batches(all_tickers, chunk_size=args.chunk_size)
+    elif args.mode == 'async':
+        fetch_data_async(all_tickers, requests_per_second=args.requests_per_second,
+                         max_in_flight=args.max_in_flight)
+    elif args.mode == 'pipeline':
+        fetch_data_pipeline(all_tickers, fetch_workers=args.fetch_workers,
+                            transform_workers=args.transform_workers, write_workers=args.write_workers)
+    else:
+        fetch_data_in_parallel(all_tickers)
+
+    if staging:
+        merge_staging(db)
+        # The bars are in ohlcv_data now, so their watermarks can move
+        for ticker, last_date in deferred_watermarks.items():
+            set_watermark(db, ticker, last_date)
+        logging.info(f"Backfill merged, {len(deferred_watermarks)} watermarks advanced")
 
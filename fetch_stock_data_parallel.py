@@ -1,10 +1,17 @@
 import yfinance as yf
-from pymongo import MongoClient
+from mongo_client import get_db
 import pandas as pd
 import time
 import logging
 import sys
+import argparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dead_tickers import is_no_data_error, load_dead_tickers, mark_dead, mark_alive
+from fundamentals import FUNDAMENTALS_COLLECTION, stored_periods, period_refs
+from index_manifest import ensure_indexes
+from http_session import shared_session_from_env, session_summary
+from ingest_pipeline import IngestPipeline
+from ohlcv_writer import BulkWriter, frame_to_documents, upsert_operations
 
 # Configure logging
 logging.basicConfig(
@@ -16,96 +23,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# MongoDB connection (using Render's internal hostname)
-uri = "mongodb://mongodb-9iyq:27017"  # Internal connection string for MongoDB on Render
-client = MongoClient(uri)  # Removed ServerApi
-db = client['StockData']  # The database will be created if it doesn't exist
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 collection = db['comprehensive_data']
 
-# Create a unique index to prevent duplicates
-try:
-    collection.create_index([('ticker', 1), ('date', 1)], unique=True)
-    logger.info("Index created successfully")
-except Exception as e:
-    logger.error(f"Failed to create index: {e}")
+# Keep-alive session shared by every yfinance call, optionally cached on disk (set YF_HTTP_CACHE)
+session = None
+
+# Known dead tickers due for a re-probe this run
+probing_tickers = set()
+
+# Function to apply the index manifest, including the unique (ticker, date) index that prevents duplicates
+def ensure_collection_indexes():
+    try:
+        ensure_indexes(db, ['comprehensive_data', FUNDAMENTALS_COLLECTION])
+        logger.info("Index created successfully")
+    except Exception as e:
+        # Without the unique index the upserts would store duplicate bars, so the run stops here
+        logger.error(f"Failed to create index: {e}")
+        raise
 
 # Function to check MongoDB connection
 def check_mongo_connection():
     try:
-        client.admin.command('ping')
+        db.client.admin.command('ping')
         logger.info("MongoDB connection successful.")
         return True
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
         return False
 
-# Function to convert any non-string keys to strings recursively
-def convert_keys_to_string(data):
-    if isinstance(data, dict):
-        return {str(key): convert_keys_to_string(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_keys_to_string(element) for element in data]
-    else:
-        return data
+# Function to download a ticker's price history; fundamentals are refreshed separately by refresh_fundamentals.py
+def fetch_ticker_data(ticker):
+    stock = yf.Ticker(ticker, session=session)
+    # With yfinance's exceptions shown (set in __main__) a delisted ticker raises instead of coming back empty
+    hist = stock.history(period="2y")
+    if hist.empty:
+        raise RuntimeError(f"No data returned for {ticker} and no reason given")
+    return hist
+
+# Function to turn the daily bars into upserts that point at the stored fundamentals
+def build_ticker_operations(ticker, hist):
+    # history() already carries dividends and splits, so no separate requests are needed for them
+    documents = frame_to_documents(
+        ticker, hist,
+        dividends=hist['Dividends'].tolist() if 'Dividends' in hist else [0] * len(hist),
+        splits=hist['Stock Splits'].tolist() if 'Stock Splits' in hist else [0] * len(hist),
+        fundamentals=period_refs(hist.index, stored_periods(db, ticker))
+    )
+    return upsert_operations(documents)
 
 # Function to fetch and store data
-def fetch_and_store_ticker_data(ticker):
+def fetch_and_store_ticker_data(ticker, writer):
     logger.info(f"Fetching data for {ticker}")
-    stock = yf.Ticker(ticker)
-    
     try:
-        hist = stock.history(period="2y")
-        if hist.empty:
-            logger.warning(f"No data found for {ticker}, possibly delisted or unavailable.")
-            return False
-
-        dividends = stock.dividends
-        splits = stock.splits
-        financials = convert_keys_to_string(stock.financials.T.to_dict() if not stock.financials.empty else {})
-        balance_sheet = convert_keys_to_string(stock.balance_sheet.T.to_dict() if not stock.balance_sheet.empty else {})
-        cashflow = convert_keys_to_string(stock.cashflow.T.to_dict() if not stock.cashflow.empty else {})
-        
-        try:
-            recommendations = stock.recommendations_summary
-            analyst_recommendations = convert_keys_to_string(recommendations.to_dict()) if recommendations is not None else {}
-        except Exception as e:
-            logger.warning(f"Could not fetch recommendations for {ticker}: {e}")
-            analyst_recommendations = {}
-
-        for date, row in hist.iterrows():
-            data = {
-                'ticker': ticker,
-                'date': date.to_pydatetime(),
-                'open': row['Open'],
-                'high': row['High'],
-                'low': row['Low'],
-                'close': row['Close'],
-                'volume': row['Volume'],
-                'dividends': dividends.get(date, 0),
-                'splits': splits.get(date, 0),
-                'financials': financials,
-                'balance_sheet': balance_sheet,
-                'cashflow': cashflow,
-                'analyst_recommendations': analyst_recommendations
-            }
-            collection.update_one(
-                {'ticker': ticker, 'date': data['date']},
-                {'$set': data},
-                upsert=True
-            )
-        logger.info(f"Successfully fetched and stored data for {ticker}")
+        operations = build_ticker_operations(ticker, fetch_ticker_data(ticker))
+        writer.submit(ticker, operations, record_write_result)
+        logger.info(f"Successfully fetched data for {ticker}")
     except Exception as e:
-        logger.error(f"Error fetching data for {ticker}: {e}")
+        # Only a confirmed miss goes into the negative cache; anything else is retried next run
+        if is_no_data_error(e):
+            record_no_data(ticker)
+        else:
+            logger.error(f"Error fetching data for {ticker}: {e}")
         return False
     return True
 
+# Function to report the outcome of a ticker's bulk write
+def record_write_result(ticker, error):
+    if error:
+        logger.error(f"Error storing data for {ticker}: {error}")
+    else:
+        logger.info(f"Stored data for {ticker}")
+        if ticker in probing_tickers:
+            mark_alive(db, ticker)
+
+# Function to put a ticker that returned no history into the negative cache
+def record_no_data(ticker):
+    logger.warning(f"No data found for {ticker}, possibly delisted or unavailable.")
+    mark_dead(db, ticker)
+
+# Function to drop the tickers the negative cache says are still dead
+def skip_known_dead(tickers):
+    skip, probe = load_dead_tickers(db)
+    probing_tickers.update(probe)
+    remaining = [ticker for ticker in tickers if ticker not in skip]
+    logger.info(f"Skipped (known dead): {len(tickers) - len(remaining)} tickers, re-probing {len(probe)}")
+    return remaining
+
 # Function to fetch data in parallel batches using threading
 def fetch_data_in_parallel(tickers, max_workers=10):
     total_tickers = len(tickers)
     logger.info(f"Fetching data for {total_tickers} tickers using {max_workers} threads.")
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_ticker = {executor.submit(fetch_and_store_ticker_data, ticker): ticker for ticker in tickers}
+    with BulkWriter(collection) as writer, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_ticker = {executor.submit(fetch_and_store_ticker_data, ticker, writer): ticker for ticker in tickers}
         for future in as_completed(future_to_ticker):
             ticker = future_to_ticker[future]
             try:
@@ -117,10 +129,40 @@ def fetch_data_in_parallel(tickers, max_workers=10):
             except Exception as exc:
                 logger.error(f"Error fetching data for {ticker}: {exc}")
 
+# Function to fetch data through the staged fetch -> transform -> write pipeline
+def fetch_data_pipeline(tickers, fetch_workers=10, transform_workers=2, write_workers=2):
+    logger.info(f"Fetching data for {len(tickers)} tickers with {fetch_workers} fetchers, "
+                f"{transform_workers} transformers and {write_workers} writers.")
+
+    def on_failed(ticker, stage, error):
+        if is_no_data_error(error):
+            record_no_data(ticker)
+            return
+        logger.error(f"Error in {stage} stage for {ticker}: {error}")
+
+    pipeline = IngestPipeline(collection, fetch_ticker_data, build_ticker_operations,
+                              on_written=record_write_result, on_failed=on_failed,
+                              fetch_workers=fetch_workers, transform_workers=transform_workers,
+                              write_workers=write_workers)
+    pipeline.run(tickers)
+
 # Main process
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch price history into comprehensive_data")
+    parser.add_argument('--mode', choices=['threaded', 'pipeline'], default='threaded',
+                        help="threaded: each worker fetches, transforms and writes; pipeline: separate stages")
+    parser.add_argument('--fetch-workers', type=int, default=10)
+    parser.add_argument('--transform-workers', type=int, default=2)
+    parser.add_argument('--write-workers', type=int, default=2)
+    args = parser.parse_args()
+    # Raise yfinance's delisted/no-data errors instead of returning empty frames, for the dead-ticker checks
+    yf.config.debug.hide_exceptions = False
+    session = shared_session_from_env(pool_size=args.fetch_workers)
+
     # Check MongoDB connection before proceeding
     if check_mongo_connection():
+        ensure_collection_indexes()
+
         # Load tickers from the CSV files stored in the GitHub repo (in the same directory)
         uk_stocks = pd.read_csv('Stock Screener_UK.csv')['Symbol']
         us_stocks = pd.read_csv('Stock Screener_2024-09-30 (3).csv')['Symbol']
@@ -131,10 +173,17 @@ if __name__ == "__main__":
         # Save combined tickers to a CSV file (optional)
         all_tickers.to_csv('combined_tickers.csv', index=False)
 
-        # Convert tickers to a list and drop any NaN values
-        tickers_list = all_tickers.dropna().tolist()
+        # Convert tickers to a list, drop any NaN values and the tickers known to be dead
+        tickers_list = skip_known_dead(all_tickers.dropna().tolist())
+
+        # Fetch data using threading or the staged pipeline
+        if args.mode == 'pipeline':
+            fetch_data_pipeline(tickers_list, fetch_workers=args.fetch_workers,
+                                transform_workers=args.transform_workers, write_workers=args.write_workers)
+        else:
+            fetch_data_in_parallel(tickers_list, max_workers=args.fetch_workers)
 
-        # Fetch data using threading
-        fetch_data_in_parallel(tickers_list, max_workers=10)
+        for line in session_summary(session):
+            logger.info(line)
     else:
         logger.error("Script aborted due to MongoDB connection failure.")
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+# Collection holding one document per (ticker, statement, report period)
+FUNDAMENTALS_COLLECTION = 'fundamentals'
+
+# Statements whose yfinance frames have one column per report period end date
+PERIOD_STATEMENTS = ['financials', 'balance_sheet', 'cashflow']
+
+# recommendations_summary has one row per relative period ('0m', '-1m', ...) instead
+RECOMMENDATIONS = 'analyst_recommendations'
+
+# Collection recording when each ticker's fundamentals were last checked and its next earnings date
+REFRESH_COLLECTION = 'fundamentals_refresh'
+
+# yfinance statements are annual; a newer one can't be out before the period ends plus the filing lag
+REPORT_INTERVAL = timedelta(days=365)
+FILING_LAG = timedelta(days=90)
+
+# refresh_reason() for a ticker whose statements are current but whose analyst recommendations are not
+RECOMMENDATIONS_STALE = 'recommendations stale'
+
+
+def statement_documents(ticker, statement, frame):
+    """Build one document per report period from a yfinance statement frame (line items x periods)."""
+    if frame is None or frame.empty:
+        return []
+    documents = []
+    for period, values in frame.items():
+        documents.append({
+            'ticker': ticker,
+            'statement': statement,
+            'period': pd.Timestamp(period).to_pydatetime(),
+            'values': {str(item): _native(value) for item, value in values.items()}
+        })
+    return documents
+
+
+def recommendation_documents(ticker, frame, as_of=None):
+    """Build one document per relative period ('0m', '-1m', ...) of a recommendations_summary frame."""
+    if frame is None or frame.empty or 'period' not in frame:
+        return []
+    as_of = as_of or datetime.utcnow()
+    documents = []
+    for _, row in frame.iterrows():
+        documents.append({
+            'ticker': ticker,
+            'statement': RECOMMENDATIONS,
+            'period': row['period'],
+            'as_of': as_of,
+            'values': {str(key): _native(value) for key, value in row.items() if key != 'period'}
+        })
+    return documents
+
+
+def store_fundamentals(db, ticker, statements, recommendations=None):
+    """
+    Upsert a ticker's statements ({statement: frame}) and recommendations into the fundamentals
+    collection with one bulk write. Returns {statement: report periods, oldest first}.
+    """
+    documents = []
+    for statement, frame in statements.items():
+        documents.extend(statement_documents(ticker, statement, frame))
+    documents.extend(recommendation_documents(ticker, recommendations))
+
+    if documents:
+        db[FUNDAMENTALS_COLLECTION].bulk_write([
+            UpdateOne(
+                {'ticker': doc['ticker'], 'statement': doc['statement'], 'period': doc['period']},
+                {'$set': doc},
+                upsert=True
+            )
+            for doc in documents
+        ], ordered=False)
+
+    periods = {}
+    for doc in documents:
+        if doc['statement'] in PERIOD_STATEMENTS:
+            periods.setdefault(doc['statement'], []).append(doc['period'])
+    return {statement: sorted(values) for statement, values in periods.items()}
+
+
+def period_refs(dates, periods):
+    """
+    For each bar date, point at the latest report period of every statement that had ended by then,
+    e.g. {'financials': datetime(2023, 12, 31), ...}. Statements with no period ended yet are left out.
+    """
+    dates = pd.DatetimeIndex(dates)
+    if dates.tz is not None:
+        dates = dates.tz_convert('UTC').tz_localize(None)
+
+    refs = [{} for _ in range(len(dates))]
+    for statement, statement_periods in periods.items():
+        if not statement_periods:
+            continue
+        ends = pd.DatetimeIndex(statement_periods)
+        positions = np.searchsorted(ends.values, dates.values, side='right') - 1
+        for ref, position in zip(refs, positions):
+            if position >= 0:
+                ref[statement] = statement_periods[position]
+    return refs
+
+
+def stored_periods(db, ticker):
+    """Return {statement: report periods, oldest first} for what is already stored for a ticker."""
+    periods = {}
+    for doc in db[FUNDAMENTALS_COLLECTION].find(
+        {'ticker': ticker, 'statement': {'$in': PERIOD_STATEMENTS}},
+        {'statement': 1, 'period': 1, '_id': 0}
+    ):
+        periods.setdefault(doc['statement'], []).append(doc['period'])
+    return {statement: sorted(values) for statement, values in periods.items()}
+
+
+def refresh_reason(state, periods, now, ttl=timedelta(days=30), earnings_window=timedelta(days=7),
+                   recommendations_ttl=timedelta(days=30)):
+    """
+    Decide whether a ticker's fundamentals need fetching. Returns the reason, or None to skip.
+    A ticker is checked once its expected earnings date has passed, then daily through the earnings
+    window until a new report period turns up, since the statements can reach Yahoo days after the
+    release. Otherwise it is skipped while its latest report period is still current, and refreshed
+    once its last check is older than the TTL. A ticker with no statements at all (ETFs, funds) is
+    refreshed on the TTL alone. Analyst recommendations change regardless of filings,
+    so they have their own TTL; RECOMMENDATIONS_STALE asks for those alone.
+    """
+    if state is None or state.get('last_checked') is None:
+        return 'never refreshed'
+
+    last_checked = state['last_checked']
+    next_earnings = state.get('next_earnings')
+    if next_earnings and now >= next_earnings and last_checked < next_earnings:
+        return 'earnings released'
+
+    released = state.get('last_earnings')
+    last_changed = state.get('last_changed')
+    if (released and now <= released + earnings_window and (last_changed is None or last_changed < released)
+            and now - last_checked >= timedelta(days=1)):
+        return 'awaiting filing'
+
+    # Without report periods there is no filing to wait for, only the TTL
+    due = True
+    if periods:
+        latest_period = min(statement_periods[-1] for statement_periods in periods.values())
+        due = now >= latest_period + REPORT_INTERVAL + FILING_LAG
+    if due and now - last_checked > ttl:
+        return 'ttl expired'
+
+    if now - state.get('recommendations_checked', last_checked) > recommendations_ttl:
+        return RECOMMENDATIONS_STALE
+    return None
+
+
+def record_refresh(db, ticker, next_earnings=None, changed=False, last_earnings=None):
+    """
+    Remember when a ticker was checked, whether a new report period turned up, its next earnings date,
+    and the earnings date that has just passed (last_earnings), whose filing may still be awaited.
+    """
+    now = datetime.utcnow()
+    update = {'last_checked': now, 'recommendations_checked': now, 'next_earnings': next_earnings}
+    if changed:
+        update['last_changed'] = now
+    if last_earnings:
+        update['last_earnings'] = last_earnings
+    db[REFRESH_COLLECTION].update_one({'ticker': ticker}, {'$set': update}, upsert=True)
+
+
+def record_recommendations_refresh(db, ticker):
+    """Remember a recommendations-only check; the statements' last check is left alone."""
+    db[REFRESH_COLLECTION].update_one({'ticker': ticker}, {'$set': {'recommendations_checked': datetime.utcnow()}},
+                                      upsert=True)
+
+
+def load_fundamentals(db, ticker, statement, period=None):
+    """Return one statement document for a ticker: the given report period, or the latest one."""
+    query = {'ticker': ticker, 'statement': statement}
+    if period is not None:
+        query['period'] = period
+    return db[FUNDAMENTALS_COLLECTION].find_one(query, {'_id': 0}, sort=[('period', -1)])
+
+
+def _native(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
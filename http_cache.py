@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Seconds each kind of Yahoo response stays fresh
+DEFAULT_TTLS = {
+    'history': 6 * 3600,
+    'fundamentals': 7 * 86400,
+    'recommendations': 86400,
+    'crumb': 3600,
+    'cookie': 3600,
+}
+
+# Endpoints whose responses are only valid with the session cookies they were issued with. Their
+# entries carry that cookie jar under COOKIES_HEADER, and a cache hit restores it, so a cached
+# crumb is never sent with some other session's cookies.
+SESSION_ENDPOINTS = ('crumb', 'cookie')
+COOKIES_HEADER = 'X-Cached-Cookies'
+
+# Cache size above which the least recently used responses are evicted
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Environment variable naming the cache file; when unset the scripts run without a cache
+CACHE_PATH_ENV = 'YF_HTTP_CACHE'
+
+
+def endpoint_for(url, params=None):
+    """Classify a Yahoo URL into one of the cached endpoint kinds, or None if it should not be cached."""
+    parts = urlsplit(url)
+    path = parts.path
+    if parts.netloc == 'fc.yahoo.com':
+        return 'cookie'
+    if '/finance/chart/' in path:
+        return 'history'
+    if '/getcrumb' in path:
+        return 'crumb'
+    if '/finance/quoteSummary/' in path:
+        modules = str((params or {}).get('modules', '')) + urlsplit(url).query
+        return 'recommendations' if 'recommendationTrend' in modules else 'fundamentals'
+    if '/fundamentals-timeseries/' in path:
+        return 'fundamentals'
+    return None
+
+
+def cache_key(method, url, params=None):
+    """Build a stable key from the method, URL and query, ignoring the per-session crumb."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + list((params or {}).items())
+    query = sorted((str(key), str(value)) for key, value in query if key != 'crumb')
+    return f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}?{urlencode(query)}"
+
+
+class ResponseCache:
+    """
+    SQLite-backed store of HTTP response bodies with per-endpoint TTLs and least-recently-used
+    eviction once the stored bodies exceed max_bytes. Safe to share between threads.
+    """
+
+    def __init__(self, path, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, endpoint TEXT, status INTEGER, headers TEXT, content BLOB,"
+            " size INTEGER, created REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key, endpoint):
+        """Return (status, headers, content) for a fresh entry, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, content, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[3] > self.ttls[endpoint]:
+                self.misses[endpoint] += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits[endpoint] += 1
+        return row[0], json.loads(row[1]), row[2]
+
+    def put(self, key, endpoint, status, headers, content):
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, status, json.dumps(dict(headers)), content, len(content), now, now)
+            )
+            self._size += len(content) - (previous[0] if previous else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def invalidate(self, endpoint):
+        """Drop every entry of one endpoint kind, e.g. a crumb Yahoo no longer accepts."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE endpoint = ?", (endpoint,))
+            self._conn.commit()
+            self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self):
+        # Free down to 90% of the limit so every put does not trigger another eviction
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logging.info(f"Evicted {len(evicted)} cached responses to stay under {self.max_bytes} bytes")
+
+    def summary(self):
+        """One-line hit/miss counts per endpoint for the run summary."""
+        endpoints = sorted(set(self.hits) | set(self.misses))
+        if not endpoints:
+            return "HTTP cache: no cacheable requests"
+        return "HTTP cache: " + ", ".join(
+            f"{endpoint} {self.hits[endpoint]} hits/{self.misses[endpoint]} misses" for endpoint in endpoints)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedSession(requests.Session):
+    """
+    requests.Session that answers cacheable Yahoo GETs from a ResponseCache.
+    The cache lives under response_cache rather than cache because yfinance refuses sessions
+    with a cache attribute (it assumes requests_cache, which breaks its cookie handling).
+    """
+
+    def __init__(self, response_cache):
+        super().__init__()
+        self.response_cache = response_cache
+
+    def request(self, method, url, params=None, **kwargs):
+        endpoint = endpoint_for(url, params)
+        if method.upper() != 'GET' or endpoint is None:
+            return super().request(method, url, params=params, **kwargs)
+
+        key = cache_key(method, url, params)
+        cached = self.response_cache.get(key, endpoint)
+        if cached is not None:
+            status, headers, content = cached
+            if endpoint not in SESSION_ENDPOINTS:
+                return _cached_response(url, status, headers, content)
+            # A crumb or cookie response is only usable together with the cookie jar it was issued with
+            cookies = headers.pop(COOKIES_HEADER, None)
+            if cookies is not None:
+                response = _cached_response(url, status, headers, content)
+                for cookie in cookies:
+                    self.cookies.set(**cookie)
+                    response.cookies.set(**cookie)
+                return response
+
+        response = super().request(method, url, params=params, **kwargs)
+        if response.status_code == 200:
+            headers = dict(response.headers)
+            if endpoint in SESSION_ENDPOINTS:
+                headers[COOKIES_HEADER] = _cookie_list(self.cookies)
+            self.response_cache.put(key, endpoint, response.status_code, headers, response.content)
+        elif response.status_code in (401, 403):
+            # Yahoo rejected our crumb; make sure the next cookie and getcrumb requests go to the network
+            for session_endpoint in SESSION_ENDPOINTS:
+                self.response_cache.invalidate(session_endpoint)
+        return response
+
+
+def _cookie_list(jar):
+    return [{'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+             'expires': cookie.expires, 'secure': cookie.secure} for cookie in jar]
+
+
+def _cached_response(url, status, headers, content):
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.url = url
+    response.encoding = 'utf-8'
+    response.from_cache = True
+    return response
+
+
+def response_cache_from_env():
+    """Return a ResponseCache backed by the file named in YF_HTTP_CACHE, or None when it is unset."""
+    path = os.environ.get(CACHE_PATH_ENV)
+    if not path:
+        return None
+    return ResponseCache(path)
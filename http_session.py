@@ -0,0 +1,51 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import CachedSession, response_cache_from_env
+
+# Distinct hosts to keep a pool for (query1/query2/fc/guce/consent.yahoo.com and a spare)
+HOST_POOLS = 8
+
+
+def shared_session(pool_size, response_cache=None):
+    """
+    Build one keep-alive session for every yf.Ticker and yf.download call in a process.
+    pool_size should match the number of worker threads so no connection is opened and thrown away
+    because the pool was full. With a response_cache the session also answers from the on-disk cache.
+    """
+    session = CachedSession(response_cache) if response_cache is not None else requests.Session()
+    adapter = HTTPAdapter(pool_connections=HOST_POOLS, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def shared_session_from_env(pool_size):
+    """shared_session() with the response cache named by YF_HTTP_CACHE, if it is set."""
+    return shared_session(pool_size, response_cache_from_env())
+
+
+def connection_stats(session):
+    """Return how many connections the session opened and how many requests reused an open one."""
+    opened = requests_sent = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            opened += pool.num_connections
+            requests_sent += pool.num_requests
+    return {
+        'connections': opened,
+        'requests': requests_sent,
+        'reused': max(requests_sent - opened, 0),
+    }
+
+
+def session_summary(session):
+    """Run-summary lines for the session: connection reuse, plus cache hits/misses when it caches."""
+    stats = connection_stats(session)
+    lines = [f"HTTP connections: {stats['connections']} opened for {stats['requests']} requests "
+             f"({stats['reused']} reused an open connection)"]
+    if isinstance(session, CachedSession):
+        lines.append(session.response_cache.summary())
+    return lines
@@ -0,0 +1,101 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from dead_tickers import DEAD_TICKERS_COLLECTION
+from fundamentals import FUNDAMENTALS_COLLECTION, REFRESH_COLLECTION
+from price_buckets import PRICE_BUCKET_COLLECTION
+from watermarks import WATERMARK_COLLECTION
+
+# Every index the scripts rely on, by collection. ensure_indexes() applies this at startup and
+# audit_queries.py checks the live indexes and query plans against it; add new indexes here only.
+INDEXES = {
+    'ohlcv_data': [
+        # Per-ticker history scans, latest-bar lookups and the (ticker, date) upserts
+        IndexModel([('ticker', ASCENDING), ('date', ASCENDING)], unique=True),
+        # Cross-sectional work by day: sector_trend_average's distinct dates and date-range scans
+        IndexModel([('date', ASCENDING)]),
+    ],
+    'comprehensive_data': [
+        IndexModel([('ticker', ASCENDING), ('date', ASCENDING)], unique=True),
+    ],
+    'indicators': [
+        # Lookups and upserts by ticker, and by (ticker, date) for the dated RS score rows
+        IndexModel([('ticker', ASCENDING), ('date', DESCENDING)]),
+        # Sector and industry grouping in sector_trend_average, update_sector_score and peer_score
+        IndexModel([('sector', ASCENDING), ('ticker', ASCENDING)]),
+        IndexModel([('industry', ASCENDING), ('ticker', ASCENDING)]),
+    ],
+    'sector_trends': [
+        IndexModel([('date', ASCENDING), ('type', ASCENDING), ('sector', ASCENDING)]),
+        IndexModel([('date', ASCENDING), ('type', ASCENDING), ('industry', ASCENDING)]),
+    ],
+    'meta_data': [
+        IndexModel([('ticker', ASCENDING)]),
+    ],
+    FUNDAMENTALS_COLLECTION: [
+        IndexModel([('ticker', ASCENDING), ('statement', ASCENDING), ('period', DESCENDING)], unique=True),
+    ],
+    REFRESH_COLLECTION: [
+        IndexModel([('ticker', ASCENDING)], unique=True),
+    ],
+    WATERMARK_COLLECTION: [
+        IndexModel([('ticker', ASCENDING)], unique=True),
+        # The Parquet cache asks which tickers changed since its last sync
+        IndexModel([('updated_at', ASCENDING)]),
+    ],
+    DEAD_TICKERS_COLLECTION: [
+        IndexModel([('ticker', ASCENDING)], unique=True),
+    ],
+    PRICE_BUCKET_COLLECTION: [
+        IndexModel([('ticker', ASCENDING), ('year', ASCENDING)], unique=True),
+    ],
+}
+
+
+def manifest_models(db, name):
+    """The manifest's IndexModels for one collection, adjusted for time-series collections (no unique indexes)."""
+    # Imported here because ohlcv_storage applies this manifest when it creates collections
+    from ohlcv_storage import is_timeseries
+
+    models = INDEXES.get(name, [])
+    if not is_timeseries(db, name):
+        return models
+    return [IndexModel(list(model.document['key'].items())) for model in models]
+
+
+def ensure_indexes(db, collections=None, strict=False):
+    """
+    Create every manifest index whose keys are not indexed yet. Safe to run on every startup:
+    existing indexes on the same keys are left alone whatever their name. A failed unique index is
+    raised, since the writes relying on it would otherwise store duplicates; any other failure is
+    logged so a conflicting secondary index never stops a job. With strict=True (after a backfill,
+    when every index is being built at once) the remaining indexes are still attempted and then any
+    failure is raised.
+    """
+    failures = []
+    for name in collections or INDEXES:
+        live = {tuple(info['key']) for info in db[name].index_information().values()}
+        for model in manifest_models(db, name):
+            if tuple(model.document['key'].items()) in live:
+                continue
+            try:
+                db[name].create_indexes([model])
+                logging.info(f"Created index {dict(model.document['key'])} on {name}")
+            except OperationFailure as e:
+                # audit_queries.py reports the drift so it can be fixed by hand
+                logging.error(f"Could not create index {dict(model.document['key'])} on {name}: {e}")
+                if model.document.get('unique'):
+                    raise
+                failures.append(f"{dict(model.document['key'])} on {name}: {e}")
+
+    if strict and failures:
+        raise RuntimeError(f"Could not create {len(failures)} manifest index(es): " + "; ".join(failures))
+
+
+def index_drift(db, name):
+    """Return (missing, unmanaged) index key lists for a collection compared with the manifest."""
+    expected = {tuple(model.document['key'].items()) for model in manifest_models(db, name)}
+    live = {tuple(info['key']) for index, info in db[name].index_information().items() if index != '_id_'}
+    return sorted(expected - live), sorted(live - expected)
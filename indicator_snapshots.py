@@ -0,0 +1,101 @@
+import logging
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from index_manifest import manifest_models
+
+INDICATORS_COLLECTION = 'indicators'
+
+# Earlier versions of indicators kept for rollback, newest last by name
+SNAPSHOT_PREFIX = 'indicators_snapshot_'
+BUILD_PREFIX = 'indicators_build_'
+KEEP_SNAPSHOTS = 3
+
+WRITE_BATCH = 1000
+
+
+def snapshot_names(db):
+    """Names of the rollback snapshots, oldest first."""
+    return sorted(name for name in db.list_collection_names() if name.startswith(SNAPSHOT_PREFIX))
+
+
+def _stamp():
+    return datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+
+
+def _swap_in(db, incoming, keep):
+    """Keep the live collection as the newest snapshot by renaming it, then rename the incoming one in."""
+    if INDICATORS_COLLECTION in db.list_collection_names():
+        db[INDICATORS_COLLECTION].rename(f"{SNAPSHOT_PREFIX}{_stamp()}")
+    db[incoming].rename(INDICATORS_COLLECTION, dropTarget=True)
+
+    for name in snapshot_names(db)[:-keep or None]:
+        db.drop_collection(name)
+
+
+def _upserts(updates, key):
+    return [UpdateOne(dict(zip(key, values)), {'$set': fields}, upsert=True) for values, fields in updates.items()]
+
+
+def publish_snapshot(db, updates, key=('ticker',), keep=KEEP_SNAPSHOTS):
+    """
+    Publish indicators as a complete new collection: the current documents, copied server-side
+    into a build collection and given the manifest's indexes, with this run's updates
+    ({key values: fields to set}) applied there as one upsert each. The live collection is then
+    renamed to the newest snapshot and the build renamed to indicators, so each publish copies
+    the collection once. Only the updated keys are sent and written; the rest of the collection
+    never leaves the server.
+    Readers see either the old or the new ranking, never a mix, though a read landing between the
+    two renames finds no indicators. Writes made to indicators by another job while the build runs
+    are lost, so publishing jobs should not overlap. A run with no updates publishes nothing, so it
+    never pushes an older version out of the snapshots.
+    """
+    if not updates:
+        logging.info("No indicator updates, nothing published")
+        return
+
+    build = f"{BUILD_PREFIX}{_stamp()}"
+    if INDICATORS_COLLECTION in db.list_collection_names():
+        db[INDICATORS_COLLECTION].aggregate([{'$out': build}])
+    # $out copies no indexes, and each upsert needs the key index to find its document
+    db[build].create_indexes(manifest_models(db, INDICATORS_COLLECTION))
+    operations = _upserts(updates, key)
+    for start in range(0, len(operations), WRITE_BATCH):
+        db[build].bulk_write(operations[start:start + WRITE_BATCH], ordered=False)
+    _swap_in(db, build, keep)
+    logging.info(f"Published {db[INDICATORS_COLLECTION].estimated_document_count()} indicator documents "
+                 f"({len(updates)} updated)")
+
+
+def rollback(db, snapshot=None, keep=KEEP_SNAPSHOTS, steps=1):
+    """
+    Swap a rollback snapshot back in: the named one, else the steps-th newest (1, the default, is the
+    version replaced by the last publish). The replaced version becomes the newest snapshot, so
+    rolling back twice with steps=1 toggles between the two newest versions; pass steps=2 to go
+    back one more, and so on up to the number of snapshots kept.
+    """
+    names = snapshot_names(db)
+    if snapshot is None:
+        if not 1 <= steps <= len(names):
+            raise ValueError(f"Cannot roll back {steps} step(s): {len(names)} indicator snapshot(s) kept")
+        snapshot = names[-steps]
+    elif snapshot not in names:
+        raise ValueError(f"Unknown indicator snapshot {snapshot!r}")
+
+    # Snapshots made before they were renamed out of indicators may lack the indexes
+    db[snapshot].create_indexes(manifest_models(db, INDICATORS_COLLECTION))
+    # The snapshot rolled back to is renamed in, so the count stays as the replaced version is added
+    _swap_in(db, snapshot, keep)
+    logging.info(f"Rolled indicators back to {snapshot}")
+
+
+def write_indicators(db, updates, key=('ticker',), publish=False):
+    """Apply {key values: fields} to indicators, as one snapshot swap when publishing, else as bulk upserts."""
+    if publish:
+        publish_snapshot(db, updates, key)
+        return
+    operations = _upserts(updates, key)
+    if operations:
+        result = db[INDICATORS_COLLECTION].bulk_write(operations, ordered=False)
+        logging.info(f"Updated {result.modified_count} indicator documents, inserted {result.upserted_count}")
@@ -0,0 +1,188 @@
+import logging
+import queue
+import threading
+
+from ohlcv_writer import BulkWriter
+
+STAGES = ('fetch', 'transform', 'write')
+
+# Marks the end of a stage's input
+_DONE = object()
+
+# Seconds a blocked queue put or get waits before checking whether the pipeline is aborting
+QUEUE_POLL = 0.5
+
+
+class IngestPipeline:
+    """
+    Staged fetch -> transform -> write pipeline connected by bounded queues.
+
+    fetch(ticker) downloads whatever the ticker needs, transform(ticker, fetched) turns it into a
+    list of write operations, and a small pool of writer threads, each with its own BulkWriter,
+    flushes them with unordered bulk writes. Every stage has its own worker count, and a full
+    queue blocks the stage feeding it, so a slow stage throttles the ones upstream instead of
+    piling up memory.
+
+    on_written(ticker, error) is called once a ticker's operations are written (error is None)
+    or failed; on_failed(ticker, stage, error) is called when fetch or transform raises. Any other
+    exception kills its worker; the pipeline then stops every stage and run() raises it.
+    """
+
+    def __init__(self, collection, fetch, transform, on_written=None, on_failed=None,
+                 fetch_workers=8, transform_workers=2, write_workers=2,
+                 queue_size=64, write_batch=1000, metrics_interval=5.0):
+        self.collection = collection
+        self.fetch = fetch
+        self.transform = transform
+        self.on_written = on_written
+        self.on_failed = on_failed
+        self.workers = {'fetch': fetch_workers, 'transform': transform_workers, 'write': write_workers}
+        self.write_batch = write_batch
+        self.metrics_interval = metrics_interval
+        self.queues = {
+            'fetched': queue.Queue(maxsize=queue_size),
+            'operations': queue.Queue(maxsize=queue_size),
+        }
+        self.depth_samples = {name: [] for name in self.queues}
+        self._abort = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+
+    def run(self, tickers):
+        """Push every ticker through the pipeline and block until the last write is flushed."""
+        pending = queue.Queue()
+        for ticker in tickers:
+            pending.put(ticker)
+
+        inbound = {'fetch': pending, 'transform': self.queues['fetched'], 'write': self.queues['operations']}
+        outbound = {'fetch': self.queues['fetched'], 'transform': self.queues['operations'], 'write': None}
+        targets = {'fetch': self._fetch_worker, 'transform': self._transform_worker, 'write': self._write_worker}
+
+        stop_metrics = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(stop_metrics,), name='pipeline-metrics', daemon=True)
+        monitor.start()
+
+        threads = {}
+        for stage in STAGES:
+            threads[stage] = [
+                threading.Thread(target=self._guard, args=(stage, targets[stage], inbound[stage], outbound[stage]),
+                                 name=f'{stage}-{i}', daemon=True)
+                for i in range(self.workers[stage])
+            ]
+            for thread in threads[stage]:
+                thread.start()
+
+        # Once every worker of a stage has finished, tell each worker of the next stage to stop
+        for stage, following in zip(STAGES, STAGES[1:] + (None,)):
+            for thread in threads[stage]:
+                thread.join()
+            if following:
+                for _ in range(self.workers[following]):
+                    self._put(inbound[following], _DONE)
+
+        stop_metrics.set()
+        monitor.join()
+        self.log_metrics()
+        if self._error:
+            stage, error = self._error
+            raise RuntimeError(f"Pipeline stopped after a {stage} worker failed: {error}") from error
+
+    def _guard(self, stage, target, inbound, outbound):
+        """Run a worker; if it dies, record why and abort the pipeline so no other stage blocks on its queue."""
+        try:
+            target(inbound, outbound)
+        except Exception as e:
+            logging.error(f"Pipeline {stage} worker died: {e}")
+            with self._error_lock:
+                if self._error is None:
+                    self._error = (stage, e)
+            self._abort.set()
+
+    def _put(self, q, item):
+        """Queue put that gives up once the pipeline is aborting; returns False if the item was dropped."""
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=QUEUE_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """Queue get that returns _DONE once the pipeline is aborting."""
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=QUEUE_POLL)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fetch_worker(self, inbound, outbound):
+        while not self._abort.is_set():
+            try:
+                ticker = inbound.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fetched = self.fetch(ticker)
+            except Exception as e:
+                self._failed(ticker, 'fetch', e)
+                continue
+            if not self._put(outbound, (ticker, fetched)):
+                return
+
+    def _transform_worker(self, inbound, outbound):
+        while True:
+            item = self._get(inbound)
+            if item is _DONE:
+                return
+            ticker, fetched = item
+            try:
+                operations = self.transform(ticker, fetched)
+            except Exception as e:
+                self._failed(ticker, 'transform', e)
+                continue
+            if not self._put(outbound, (ticker, operations)):
+                return
+
+    def _write_worker(self, inbound, _):
+        with BulkWriter(self.collection, max_batch=self.write_batch) as writer:
+            while True:
+                item = self._get(inbound)
+                if item is _DONE:
+                    return
+                ticker, operations = item
+                writer.submit(ticker, operations, self.on_written)
+
+    def _failed(self, ticker, stage, error):
+        if self.on_failed:
+            self.on_failed(ticker, stage, error)
+        else:
+            logging.error(f"{stage} failed for {ticker}: {error}")
+
+    def _monitor(self, stop):
+        while not stop.wait(self.metrics_interval):
+            depths = {name: q.qsize() for name, q in self.queues.items()}
+            for name, depth in depths.items():
+                self.depth_samples[name].append(depth)
+            logging.info("Pipeline queue depth: " + ", ".join(
+                f"{name}={depth}/{self.queues[name].maxsize}" for name, depth in depths.items()))
+
+    def log_metrics(self):
+        """
+        Log the average fill of each queue and the stage it points at: a queue that stays mostly full
+        means the stage draining it is the bottleneck, and empty queues mean fetching is.
+        """
+        fill = {}
+        for name, samples in self.depth_samples.items():
+            fill[name] = (sum(samples) / len(samples) / self.queues[name].maxsize) if samples else 0.0
+            logging.info(f"Queue '{name}' average fill: {fill[name]:.0%}")
+
+        if fill['operations'] > 0.5:
+            bottleneck = 'write'
+        elif fill['fetched'] > 0.5:
+            bottleneck = 'transform'
+        else:
+            bottleneck = 'fetch'
+        logging.info(f"Pipeline bottleneck: {bottleneck} stage")
+        return bottleneck
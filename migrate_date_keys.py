@@ -0,0 +1,102 @@
+from pymongo import UpdateOne, DeleteOne
+from mongo_client import get_db
+import logging
+import argparse
+from ohlcv_storage import OHLCV_COLLECTION, is_timeseries
+from trading_calendar import date_keys, normalize_date
+from watermarks import WATERMARK_COLLECTION, mark_rewritten
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+
+BATCH_SIZE = 1000
+
+# Collections of daily bars keyed on (ticker, date); comprehensive_data is written by fetch_stock_data_parallel.py
+BAR_COLLECTIONS = [OHLCV_COLLECTION, 'comprehensive_data']
+
+# Function to rewrite one ticker's bars onto normalized date keys, merging bars that land on the same day
+def migrate_ticker(collection, ticker, timeseries):
+    docs = list(collection.find({'ticker': ticker}).sort('date', 1))
+    if not docs:
+        return 0, 0
+
+    keys, ids = date_keys([doc['date'] for doc in docs])
+    off_session = [key for key, day_id in zip(keys, ids) if day_id is None]
+    if off_session:
+        # Kept, but without a day id the calendar-aligned readers leave these bars out
+        logging.warning(f"{collection.name}: {ticker} has {len(off_session)} bars on days no exchange traded "
+                        f"(first {off_session[0]:%Y-%m-%d}), stored without a day_id")
+    groups = {}
+    for doc, key, day_id in zip(docs, keys, ids):
+        groups.setdefault(key, []).append((doc, day_id))
+
+    operations, merged = [], {}
+    for key, group in groups.items():
+        # Later raw timestamps win; fields only an earlier duplicate had (e.g. RS values) are kept
+        document = {}
+        for doc, _ in group:
+            document.update({field: value for field, value in doc.items() if value is not None})
+        document.update({'date': key, 'day_id': group[-1][1]})
+        keeper = group[-1][0]
+        merged[key] = document
+        if not timeseries and (len(group) > 1 or keeper['date'] != key or keeper.get('day_id') != document['day_id']):
+            # Duplicates go first so the keeper can take the date key without hitting the unique index
+            operations.extend(DeleteOne({'_id': doc['_id']}) for doc, _ in group[:-1])
+            document.pop('_id')
+            operations.append(UpdateOne({'_id': keeper['_id']}, {'$set': document}))
+
+    if timeseries:
+        # Time-series collections cannot re-key bars in place, so the ticker is rewritten
+        collection.delete_many({'ticker': ticker})
+        rows = [{field: value for field, value in doc.items() if field != '_id'} for doc in merged.values()]
+        collection.insert_many(rows, ordered=False)
+        return len(docs) - len(rows), len(rows)
+
+    for start in range(0, len(operations), BATCH_SIZE):
+        collection.bulk_write(operations[start:start + BATCH_SIZE], ordered=True)
+    return len(docs) - len(groups), len(operations)
+
+# Function to normalize every ticker's bars in one collection
+def migrate_collection(name):
+    collection = db[name]
+    timeseries = is_timeseries(db, name)
+    tickers = sorted(collection.distinct('ticker'))
+    logging.info(f"Normalizing date keys for {len(tickers)} tickers in {name}")
+
+    merged_total = rewritten_total = 0
+    for count, ticker in enumerate(tickers, start=1):
+        try:
+            merged, rewritten = migrate_ticker(collection, ticker, timeseries)
+        except Exception as e:
+            logging.error(f"Error normalizing {ticker} in {name}: {e}")
+            continue
+        merged_total += merged
+        rewritten_total += rewritten
+        if count % 100 == 0:
+            logging.info(f"Normalized {count}/{len(tickers)} tickers in {name}")
+
+    logging.info(f"Date keys normalized in {name}: {merged_total} duplicate bars merged, {rewritten_total} writes")
+
+# Function to normalize every bar collection and every watermark
+def migrate_all(collections=BAR_COLLECTIONS):
+    for name in collections:
+        migrate_collection(name)
+
+    for watermark in db[WATERMARK_COLLECTION].find({}, {'ticker': 1, 'last_date': 1}):
+        db[WATERMARK_COLLECTION].update_one({'_id': watermark['_id']},
+                                            {'$set': {'last_date': normalize_date(watermark['last_date'])}})
+    # Every ticker's bars were re-keyed in place, so incremental caches re-read them in full
+    mark_rewritten(db)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-key daily bars on normalized trading dates with day ids")
+    parser.add_argument('--collections', nargs='+', default=BAR_COLLECTIONS,
+                        help=f"bar collections to migrate (default: {' '.join(BAR_COLLECTIONS)})")
+    args = parser.parse_args()
+    migrate_all(args.collections)
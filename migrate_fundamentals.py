@@ -0,0 +1,91 @@
+import argparse
+import logging
+
+import pandas as pd
+from pymongo import UpdateOne
+from mongo_client import get_db
+
+from fundamentals import FUNDAMENTALS_COLLECTION, PERIOD_STATEMENTS, RECOMMENDATIONS, store_fundamentals, period_refs
+from index_manifest import ensure_indexes
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+comprehensive_collection = db['comprehensive_data']
+
+# Fields that used to be copied onto every daily document
+EMBEDDED_FIELDS = PERIOD_STATEMENTS + [RECOMMENDATIONS]
+
+
+def stored_statement_frame(stored):
+    """Rebuild a yfinance-shaped statement frame (line items x periods) from the embedded {item: {period: value}} dict."""
+    if not stored:
+        return None
+    frame = pd.DataFrame(stored)
+    frame.index = pd.to_datetime(frame.index)
+    return frame.T
+
+
+def migrate_ticker(ticker, batch_size=1000):
+    """Move one ticker's embedded fundamentals into the fundamentals collection and strip them from its rows."""
+    latest = comprehensive_collection.find_one(
+        {"ticker": ticker, "$or": [{field: {"$exists": True}} for field in EMBEDDED_FIELDS]},
+        {field: 1 for field in EMBEDDED_FIELDS},
+        sort=[("date", -1)]
+    )
+    if not latest:
+        return 0
+
+    recommendations = latest.get(RECOMMENDATIONS)
+    periods = store_fundamentals(
+        db, ticker,
+        {statement: stored_statement_frame(latest.get(statement)) for statement in PERIOD_STATEMENTS},
+        pd.DataFrame(recommendations) if recommendations else None
+    )
+
+    rows = list(comprehensive_collection.find({"ticker": ticker}, {"date": 1}))
+    refs = period_refs([row["date"] for row in rows], periods)
+    unset = {field: "" for field in EMBEDDED_FIELDS}
+
+    operations = [
+        UpdateOne({"_id": row["_id"]}, {"$set": {"fundamentals": ref}, "$unset": unset})
+        for row, ref in zip(rows, refs)
+    ]
+    for start in range(0, len(operations), batch_size):
+        comprehensive_collection.bulk_write(operations[start:start + batch_size], ordered=False)
+    return len(operations)
+
+
+def migrate_all(compact=False):
+    """Migrate every ticker, then optionally run compact so the freed space goes back to the OS."""
+    ensure_indexes(db, [FUNDAMENTALS_COLLECTION])
+    tickers = comprehensive_collection.distinct("ticker")
+    logging.info(f"Migrating fundamentals for {len(tickers)} tickers")
+
+    migrated_rows = 0
+    for ticker in tickers:
+        try:
+            rows = migrate_ticker(ticker)
+            migrated_rows += rows
+            logging.info(f"Migrated {ticker}: {rows} rows")
+        except Exception as e:
+            logging.error(f"Error migrating {ticker}: {e}")
+
+    logging.info(f"Stripped embedded fundamentals from {migrated_rows} rows")
+
+    if compact:
+        logging.info("Compacting comprehensive_data...")
+        db.command("compact", "comprehensive_data")
+        logging.info("Compaction complete")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move fundamentals out of comprehensive_data into their own collection")
+    parser.add_argument('--compact', action='store_true', help="run compact on comprehensive_data afterwards")
+    args = parser.parse_args()
+    migrate_all(compact=args.compact)
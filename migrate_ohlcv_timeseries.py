@@ -0,0 +1,99 @@
+from mongo_client import get_db
+import logging
+import argparse
+from ohlcv_storage import OHLCV_COLLECTION, is_timeseries, create_timeseries_collection
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+
+# The standard collection is renamed here while its rows are copied into the new time-series ohlcv_data.
+# Time-series collections cannot be renamed, so the new one has to be created under the final name.
+LEGACY_COLLECTION = 'ohlcv_data_legacy'
+BATCH_SIZE = 5000
+
+# Function to move the standard collection aside and create the time-series ohlcv_data in its place
+def prepare_collections(legacy_name):
+    if is_timeseries(db):
+        if legacy_name not in db.list_collection_names():
+            logging.info(f"{OHLCV_COLLECTION} is already a time-series collection, nothing to migrate")
+            return False
+        logging.info(f"Resuming migration from {legacy_name}")
+        return True
+
+    if legacy_name in db.list_collection_names():
+        raise RuntimeError(f"Both {OHLCV_COLLECTION} and {legacy_name} exist as standard collections; "
+                           f"drop or rename one before migrating")
+
+    db[OHLCV_COLLECTION].rename(legacy_name)
+    create_timeseries_collection(db)
+    logging.info(f"Renamed {OHLCV_COLLECTION} to {legacy_name}; readers see a partial {OHLCV_COLLECTION} until the copy finishes")
+    return True
+
+# Function to stream one ticker's rows into the time-series collection in insert_many batches
+def migrate_ticker(legacy, target, ticker, batch_size):
+    expected = legacy.count_documents({'ticker': ticker})
+    if target.count_documents({'ticker': ticker}) == expected:
+        return 0  # Copied by an earlier, interrupted run
+
+    # A partial copy from an interrupted run is cleared so the ticker is copied exactly once
+    target.delete_many({'ticker': ticker})
+
+    copied = 0
+    batch = []
+    cursor = legacy.find({'ticker': ticker}, {'_id': 0}).sort('date', 1).batch_size(batch_size)
+    for doc in cursor:
+        if doc.get('date') is None:
+            continue  # Time-series documents need a timeField
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            target.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        target.insert_many(batch, ordered=False)
+        copied += len(batch)
+    return copied
+
+# Function to copy every ticker and verify the row counts match
+def migrate_all(legacy_name=LEGACY_COLLECTION, batch_size=BATCH_SIZE, drop_legacy=False):
+    if not prepare_collections(legacy_name):
+        return
+
+    legacy = db[legacy_name]
+    target = db[OHLCV_COLLECTION]
+    tickers = sorted(legacy.distinct('ticker'))
+    logging.info(f"Migrating {len(tickers)} tickers from {legacy_name} to time-series {OHLCV_COLLECTION}")
+
+    copied = 0
+    for count, ticker in enumerate(tickers, start=1):
+        copied += migrate_ticker(legacy, target, ticker, batch_size)
+        if count % 100 == 0:
+            logging.info(f"Migrated {count}/{len(tickers)} tickers ({copied} rows copied this run)")
+
+    legacy_rows = legacy.count_documents({'date': {'$ne': None}})
+    target_rows = target.count_documents({})
+    if legacy_rows != target_rows:
+        logging.error(f"Row count mismatch: {legacy_rows} in {legacy_name}, {target_rows} in {OHLCV_COLLECTION}; "
+                      f"keeping {legacy_name}, re-run to resume")
+        return
+
+    logging.info(f"Migration complete: {target_rows} rows in time-series {OHLCV_COLLECTION}")
+    if drop_legacy:
+        legacy.drop()
+        logging.info(f"Dropped {legacy_name}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate ohlcv_data into a native MongoDB time-series collection")
+    parser.add_argument('--legacy-name', default=LEGACY_COLLECTION,
+                        help="name the standard collection is moved to while it is copied")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--drop-legacy', action='store_true',
+                        help="drop the standard collection once the row counts match")
+    args = parser.parse_args()
+    migrate_all(args.legacy_name, args.batch_size, args.drop_legacy)
@@ -0,0 +1,51 @@
+import os
+import threading
+
+from pymongo import MongoClient
+
+# Connection string, overridable per deployment
+MONGO_URI_ENV = 'MONGO_URI'
+DEFAULT_MONGO_URI = 'mongodb://mongodb-9iyq:27017'
+DB_NAME = 'StockData'
+
+# One pool per process, shared by every stage and thread; sized for the widest worker pools in the jobs
+POOL_OPTIONS = {
+    'maxPoolSize': 50,
+    'minPoolSize': 0,
+    'maxIdleTimeMS': 300000,
+    'serverSelectionTimeoutMS': 10000,
+    'connectTimeoutMS': 10000,
+    'socketTimeoutMS': 120000,
+    'waitQueueTimeoutMS': 60000,
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide MongoClient, created on first use from MONGO_URI. It is built with connect=False,
+    so nothing touches the network until the first operation.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                uri = os.environ.get(MONGO_URI_ENV, DEFAULT_MONGO_URI)
+                _client = MongoClient(uri, connect=False, **POOL_OPTIONS)
+    return _client
+
+
+def get_db(name=DB_NAME):
+    """The StockData database on the shared client."""
+    return get_client()[name]
+
+
+def close_client():
+    """Close the shared client; the next get_client() call opens a new one."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
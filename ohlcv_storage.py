@@ -0,0 +1,119 @@
+import logging
+import os
+
+from pymongo import ASCENDING
+
+from index_manifest import ensure_indexes
+from watermarks import mark_rewritten
+
+# Collection every script reads daily bars from
+OHLCV_COLLECTION = 'ohlcv_data'
+
+# Insert-only landing collection for bulk backfills, merged into ohlcv_data in one server-side pass
+STAGING_COLLECTION = 'ohlcv_staging'
+
+# $merge matches staged bars to stored ones on this key, which needs a unique index on ohlcv_data
+MERGE_KEY = [('ticker', ASCENDING), ('date', ASCENDING)]
+
+# Storage mode used when ohlcv_data does not exist yet: 'standard' or 'timeseries'
+STORAGE_MODE_ENV = 'OHLCV_STORAGE'
+STORAGE_MODES = ('standard', 'timeseries')
+
+# Daily bars, bucketed per ticker and roughly a year (~252 bars per bucket). 365 days is the most
+# MongoDB accepts (31,536,000 seconds), so buckets drift a day per leap year rather than fitting the
+# calendar year exactly. Custom bucketing needs MongoDB 6.3+; updates of stored bars (RS fields) need 7.0+.
+TIMESERIES_OPTIONS = {
+    'timeField': 'date',
+    'metaField': 'ticker',
+    'bucketMaxSpanSeconds': 365 * 86400,
+    'bucketRoundingSeconds': 365 * 86400,
+}
+
+
+def storage_mode():
+    """Return the storage mode requested through OHLCV_STORAGE, defaulting to a standard collection."""
+    mode = os.environ.get(STORAGE_MODE_ENV, 'standard')
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"{STORAGE_MODE_ENV} must be one of {', '.join(STORAGE_MODES)}, got {mode!r}")
+    return mode
+
+
+def is_timeseries(db, name=OHLCV_COLLECTION):
+    """True when the named collection exists and is a native time-series collection."""
+    for info in db.list_collections(filter={'name': name}):
+        return info.get('type') == 'timeseries'
+    return False
+
+
+def create_timeseries_collection(db, name=OHLCV_COLLECTION):
+    """Create an empty time-series collection for daily bars, with the manifest's indexes for it."""
+    db.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+    collection = db[name]
+    # Time-series collections cannot have unique indexes; the manifest drops the option and
+    # writers append only bars after the watermark instead
+    ensure_indexes(db, [name])
+    logging.info(f"Created time-series collection {name}")
+    return collection
+
+
+def ensure_ohlcv_collection(db, mode=None, with_indexes=True):
+    """
+    Return (collection, timeseries) for ohlcv_data. An existing collection keeps its layout;
+    a missing one is created in the given mode, or the OHLCV_STORAGE mode when none is given.
+    A backfill passes with_indexes=False and builds them once the data is merged.
+    """
+    if db.list_collection_names(filter={'name': OHLCV_COLLECTION}):
+        timeseries = is_timeseries(db)
+    else:
+        timeseries = (mode or storage_mode()) == 'timeseries'
+        if timeseries:
+            create_timeseries_collection(db)
+
+    if with_indexes:
+        # The unique (ticker, date) index keeps a standard collection free of duplicates
+        ensure_indexes(db, [OHLCV_COLLECTION])
+    return db[OHLCV_COLLECTION], timeseries
+
+
+def create_staging_collection(db, name=STAGING_COLLECTION):
+    """Create an empty staging collection with no index but _id, dropping any left by an earlier run."""
+    db.drop_collection(name)
+    db.create_collection(name)
+    return db[name]
+
+
+def merge_staging(db, name=STAGING_COLLECTION):
+    """
+    Merge every staged bar into ohlcv_data in one $merge keyed on (ticker, date): new bars are
+    inserted, stored bars get the staged fields set. Only the unique merge key index is built
+    beforehand; the rest of the manifest follows the merge, and raises if any index fails, since a
+    backfilled collection left without them would be scanned by every later query. Returns the
+    number of bars staged.
+    """
+    staged = db[name].estimated_document_count()
+    if not staged:
+        db.drop_collection(name)
+        return 0
+
+    tickers = db[name].distinct('ticker')
+    live = {tuple(info['key']) for info in db[OHLCV_COLLECTION].index_information().values()}
+    if tuple(MERGE_KEY) not in live:
+        db[OHLCV_COLLECTION].create_index(MERGE_KEY, unique=True)
+
+    db[name].aggregate([
+        # Staged _ids are never the stored ones, so they are left for the insert to assign
+        {'$project': {'_id': 0}},
+        {'$merge': {
+            'into': OHLCV_COLLECTION,
+            'on': [field for field, _ in MERGE_KEY],
+            'whenMatched': 'merge',
+            'whenNotMatched': 'insert',
+        }},
+    ], allowDiskUse=True)
+
+    # Stored bars of these tickers may have changed behind their watermarks
+    mark_rewritten(db, tickers)
+    ensure_indexes(db, [OHLCV_COLLECTION], strict=True)
+    db.drop_collection(name)
+    logging.info(f"Merged {staged} staged bars into {OHLCV_COLLECTION}")
+    return staged
@@ -0,0 +1,156 @@
+import logging
+import threading
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from trading_calendar import date_keys
+
+# yfinance history columns and the field names we store them under
+OHLCV_COLUMNS = {
+    'Open': 'open',
+    'High': 'high',
+    'Low': 'low',
+    'Close': 'close',
+    'Volume': 'volume'
+}
+
+
+def frame_to_documents(ticker, hist, **extra_columns):
+    """
+    Build one document per bar of a yfinance history frame, column by column.
+    Bars are keyed by their normalized trading date (naive midnight) and carry its integer day_id.
+    Extra keyword arguments are sequences aligned with the frame's index, e.g. dividends=[...].
+    """
+    dates, ids = date_keys(hist.index)
+    columns = {field: hist[column].tolist() for column, field in OHLCV_COLUMNS.items()}
+    for field, values in extra_columns.items():
+        columns[field] = list(values)
+
+    fields = list(columns)
+    documents = []
+    for date, day_id, values in zip(dates, ids, zip(*columns.values())):
+        document = dict(zip(fields, values))
+        document['ticker'] = ticker
+        document['date'] = date
+        document['day_id'] = day_id
+        documents.append(document)
+    return documents
+
+
+def upsert_operations(documents):
+    """Build one (ticker, date) keyed upsert per document."""
+    return [
+        UpdateOne({'ticker': doc['ticker'], 'date': doc['date']}, {'$set': doc}, upsert=True)
+        for doc in documents
+    ]
+
+
+def insert_operations(documents):
+    """Build plain inserts, for time-series collections which cannot upsert."""
+    return [InsertOne(doc) for doc in documents]
+
+
+def write_operations(documents, timeseries=False):
+    """Upserts for a standard ohlcv_data collection, inserts for a time-series one."""
+    return insert_operations(documents) if timeseries else upsert_operations(documents)
+
+
+class _Submission:
+    """The operations queued for one ticker and the callback to report their outcome to."""
+
+    def __init__(self, ticker, pending, callback):
+        self.ticker = ticker
+        self.pending = pending
+        self.callback = callback
+        self.error = None
+
+    def done(self, error):
+        if error and self.error is None:
+            self.error = error
+        self.pending -= 1
+        if self.pending == 0 and self.callback:
+            try:
+                self.callback(self.ticker, self.error)
+            except Exception as e:
+                logging.error(f"Write callback for {self.ticker} failed: {e}")
+
+
+class BulkWriter:
+    """
+    Collects write operations from many threads and flushes them with unordered bulk_write
+    once max_batch operations are queued or max_delay seconds have passed, whichever comes first.
+
+    Each submit() reports back through its callback as callback(ticker, error), where error
+    is None once every operation of that submission has been written.
+    """
+
+    def __init__(self, collection, max_batch=1000, max_delay=1.0):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.written = 0
+        self.failed = 0
+        self._queue = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bulk-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, ticker, operations, callback=None):
+        """Queue the operations for one ticker; flushes inline when the batch is full."""
+        if not operations:
+            if callback:
+                callback(ticker, None)
+            return
+
+        submission = _Submission(ticker, len(operations), callback)
+        with self._lock:
+            self._queue.extend((operation, submission) for operation in operations)
+            full = len(self._queue) >= self.max_batch
+
+        # The submitting thread pays for the flush, which throttles producers that outrun Mongo
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far and report the outcome of finished submissions."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queue = self._queue, []
+            if not batch:
+                return
+
+            errors = {}
+            try:
+                self.collection.bulk_write([operation for operation, _ in batch], ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get('writeErrors', []):
+                    errors[write_error['index']] = write_error.get('errmsg', 'write error')
+            except Exception as e:
+                # Anything else (a network error, or InvalidDocument from a value BSON cannot encode) fails the
+                # whole batch; it is still reported through the callbacks so no watermark waits on it forever
+                logging.error(f"Bulk write of {len(batch)} operations failed: {e}")
+                errors = {index: str(e) for index in range(len(batch))}
+
+            self.failed += len(errors)
+            self.written += len(batch) - len(errors)
+            for index, (_, submission) in enumerate(batch):
+                submission.done(errors.get(index))
+
+    def close(self):
+        """Stop the timer thread and flush whatever is left."""
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.max_delay):
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,31 +1,35 @@
 import pymongo
 import pandas as pd
 from pymongo.errors import AutoReconnect
-from pymongo import MongoClient, UpdateOne
+from pymongo import UpdateOne
+from mongo_client import get_db
 import logging
 from logging.handlers import RotatingFileHandler
 import time
 import concurrent.futures
 from functools import wraps
-
-# Setup logging
-log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-log_file = 'peer_score.log'
-log_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=3)
-log_handler.setFormatter(log_formatter)
+from price_panel import load_price_panel
+from trading_calendar import align_series, mean_by_day
 
 logger = logging.getLogger('PeerScoreCalculator')
 logger.setLevel(logging.INFO)
-logger.addHandler(log_handler)
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(log_formatter)
-logger.addHandler(console_handler)
+# Rotating log file written when the script runs; importing the module creates no file
+LOG_FILE = 'peer_score.log'
+
+# Function to attach the log file and console handlers
+def setup_logging(log_file=LOG_FILE):
+    log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    log_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=3)
+    log_handler.setFormatter(log_formatter)
+    logger.addHandler(log_handler)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(log_formatter)
+    logger.addHandler(console_handler)
 
-# MongoDB connection setup
-mongo_uri = 'mongodb://mongodb-9iyq:27017'
-client = MongoClient(mongo_uri, connectTimeoutMS=60000, socketTimeoutMS=60000)
-db = client['StockData']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 ohlcv_collection = db['ohlcv_data']
 indicators_collection = db['indicators']
 
@@ -66,34 +70,24 @@ def get_tickers_and_sectors():
     return tickers_and_sectors
 
 @retry_on_reconnect()
-def get_stock_data(ticker):
-    logger.info(f"Fetching data for {ticker}")
-    data = list(ohlcv_collection.find({"ticker": ticker}, {"date": 1, "close": 1}).sort("date", 1))
-    if data:
-        df = pd.DataFrame(data)
-        df['date'] = pd.to_datetime(df['date'])
-        return df.set_index('date')
-    return pd.DataFrame()
-
-def process_peer_rs(ticker, ticker_df, category, category_value, peers):
+def get_price_panel(tickers):
+    logger.info(f"Fetching closes for {len(tickers)} tickers")
+    return load_price_panel(db, tickers=tickers, fields=('close',))
+
+def process_peer_rs(ticker, ticker_df, category, category_value, peers, panel):
     if len(peers) < 2:
         logger.warning(f"Not enough peers for {ticker} in {category}: {category_value}. Skipping.")
         return []
 
-    peer_data = list(ohlcv_collection.find(
-        {"ticker": {"$in": peers, "$ne": ticker}},
-        {"date": 1, "close": 1}
-    ).sort("date", 1))
+    peer_closes = [panel.series(peer) for peer in peers if peer != ticker]
+    peer_closes = [closes for closes in peer_closes if not closes.empty]
 
-    if not peer_data:
+    if not peer_closes:
         logger.warning(f"No matching data found for {ticker} in {category}: {category_value}")
         return []
 
-    peer_df = pd.DataFrame(peer_data)
-    peer_df['date'] = pd.to_datetime(peer_df['date'])
-
-    merged_df = pd.merge(ticker_df[['close']], peer_df.groupby('date')['close'].mean().rename('peer_close'), on='date')
-    merged_df = merged_df.sort_index().reset_index()
+    # Average the peers per trading day id, then keep the days the ticker traded too
+    merged_df = align_series(close=ticker_df['close'], peer_close=mean_by_day(peer_closes))
 
     if len(merged_df) < LOOKBACK_DAYS:
         logger.warning(f"Not enough data to calculate peer RS for {ticker} in {category}: {category_value}")
@@ -130,14 +124,16 @@ def process_peer_rs(ticker, ticker_df, category, category_value, peers):
         ohlcv_collection.bulk_write(updates)
         logger.info(f"Inserted {len(updates)} peer RS scores for {ticker}")
 
-def calculate_and_store_peer_rs_for_ticker(ticker, sector, peers):
-    ticker_data = get_stock_data(ticker)
+def calculate_and_store_peer_rs_for_ticker(ticker, sector, peers, panel):
+    ticker_data = panel.frame(ticker)
     if not ticker_data.empty:
-        process_peer_rs(ticker, ticker_data, "sector", sector, peers)
+        process_peer_rs(ticker, ticker_data, "sector", sector, peers, panel)
 
 @retry_on_reconnect()
 def calculate_and_store_sector_peer_rs_scores():
     tickers_and_sectors = get_tickers_and_sectors()
+    # One bulk read of every ticker's closes; each ticker and its peers are then served from memory
+    panel = get_price_panel(list(tickers_and_sectors))
     sectors = {}
     for ticker, sector in tickers_and_sectors.items():
         sectors.setdefault(sector, []).append(ticker)
@@ -146,10 +142,11 @@ def calculate_and_store_sector_peer_rs_scores():
         futures = []
         for sector, tickers in sectors.items():
             for ticker in tickers:
-                futures.append(executor.submit(calculate_and_store_peer_rs_for_ticker, ticker, sector, tickers))
+                futures.append(executor.submit(calculate_and_store_peer_rs_for_ticker, ticker, sector, tickers, panel))
         concurrent.futures.wait(futures)
 
 if __name__ == "__main__":
+    setup_logging()
     start_time = time.time()
     calculate_and_store_sector_peer_rs_scores()
     logger.info(f"Total execution time: {time.time() - start_time:.2f} seconds")
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from price_cache import ROW_GROUP_ROWS, ticker_file_name
+from trading_calendar import HOLIDAY_CALENDARS, exchange_for, sessions as exchange_sessions
+
+# Directory of the cold tier; override with PRICE_ARCHIVE_DIR
+ARCHIVE_DIR_ENV = 'PRICE_ARCHIVE_DIR'
+DEFAULT_ARCHIVE_DIR = 'price_archive'
+
+# Trading sessions kept in ohlcv_data. RS4 needs 253 bars and the Weinstein stage ~52 weeks;
+# the rest is headroom for late runs and backfills. Override with OHLCV_HOT_SESSIONS.
+HOT_SESSIONS_ENV = 'OHLCV_HOT_SESSIONS'
+DEFAULT_HOT_SESSIONS = 300
+MIN_HOT_SESSIONS = 253
+
+COMPRESSION = 'zstd'
+
+
+def hot_sessions():
+    """Number of trading sessions ohlcv_data keeps, from OHLCV_HOT_SESSIONS."""
+    return int(os.environ.get(HOT_SESSIONS_ENV, DEFAULT_HOT_SESSIONS))
+
+
+def archive_cutoff(sessions=None, today=None, exchange='US'):
+    """
+    First trading day kept hot for an exchange's tickers: bars dated before it belong in the archive.
+    Sessions are counted on the exchange's own calendar, so each ticker keeps that many of its bars.
+    """
+    sessions = sessions or hot_sessions()
+    if sessions < MIN_HOT_SESSIONS:
+        raise ValueError(f"At least {MIN_HOT_SESSIONS} sessions (the RS4 window) must stay hot, got {sessions}")
+    today = pd.Timestamp(today or datetime.utcnow()).normalize()
+    calendar = exchange_sessions(exchange)
+    position = calendar.searchsorted(today, side='right')
+    return calendar[max(position - sessions, 0)].to_pydatetime()
+
+
+def archive_cutoffs(sessions=None, today=None):
+    """{exchange: archive_cutoff()} for every supported exchange."""
+    return {exchange: archive_cutoff(sessions, today, exchange) for exchange in HOLIDAY_CALENDARS}
+
+
+class PriceArchive:
+    """
+    Cold tier of ohlcv_data: one zstd-compressed Parquet file per ticker holding every stored
+    field of the bars older than the hot horizon. archive_ticker() moves bars out of Mongo and
+    load() reads them back with the same column and date filters as the price cache. The files
+    are the source of truth; the manifest summarizes them for reporting and records the newest
+    cutoff per exchange, which tells readers when a date range cannot reach the archive.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get(ARCHIVE_DIR_ENV, DEFAULT_ARCHIVE_DIR)
+        os.makedirs(self.path, exist_ok=True)
+        self._manifest_path = os.path.join(self.path, 'manifest.json')
+        self._lock = threading.Lock()
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path):
+            return {'tickers': {}}
+        with open(self._manifest_path) as f:
+            return json.load(f)
+
+    def write_manifest(self):
+        with self._lock:
+            tmp = self._manifest_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.manifest, f)
+            os.replace(tmp, self._manifest_path)
+
+    def record_cutoffs(self, cutoffs):
+        """Save {exchange: cutoff} before any bar is moved, keeping the later cutoff of this and earlier runs."""
+        with self._lock:
+            recorded = self.manifest.setdefault('cutoffs', {})
+            for exchange, cutoff in cutoffs.items():
+                recorded[exchange] = max(recorded.get(exchange, ''), cutoff.isoformat())
+        self.write_manifest()
+
+    def reaches(self, ticker, start):
+        """
+        False when no archived bar of the ticker can be dated start or later, so a read from start onwards
+        is entirely hot. Archives written before cutoffs were recorded always answer True.
+        """
+        if start is None or 'cutoffs' not in self.manifest:
+            return True
+        start = pd.Timestamp(start)
+        cutoff = self.manifest['cutoffs'].get(exchange_for(ticker))
+        if cutoff is not None and start < pd.Timestamp(cutoff):
+            return True
+        # Bars archived by an earlier run with a later cutoff
+        archived = self.manifest['tickers'].get(ticker)
+        return archived is not None and start <= pd.Timestamp(archived['last_date'])
+
+    def file_for(self, ticker):
+        return os.path.join(self.path, ticker_file_name(ticker))
+
+    def archive_ticker(self, collection, ticker, cutoff):
+        """
+        Append a ticker's bars dated before cutoff to its archive file, then delete exactly those
+        bars from the collection. Returns the number of bars moved.
+        """
+        rows = list(collection.find({'ticker': ticker, 'date': {'$lt': cutoff}}, {'ticker': 0}))
+        if not rows:
+            return 0
+
+        ids = [row.pop('_id') for row in rows]
+        fresh = pd.DataFrame(rows)
+        fresh['date'] = pd.to_datetime(fresh['date'])
+        path = self.file_for(ticker)
+        frame = fresh if not os.path.exists(path) else pd.concat([pq.read_table(path).to_pandas(), fresh],
+                                                                 ignore_index=True)
+        frame = frame.drop_duplicates(subset=['date'], keep='last').sort_values('date')
+
+        tmp = path + '.tmp'
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), tmp,
+                       row_group_size=ROW_GROUP_ROWS, compression=COMPRESSION)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self.manifest['tickers'][ticker] = {
+                'rows': len(frame),
+                'first_date': frame['date'].min().isoformat(),
+                'last_date': frame['date'].max().isoformat(),
+            }
+
+        # Only the bars just read are deleted, so a bar backfilled meanwhile stays until the next run
+        for start in range(0, len(ids), 1000):
+            collection.delete_many({'_id': {'$in': ids[start:start + 1000]}})
+        return len(ids)
+
+    def load(self, ticker, columns=('close',), start=None, end=None):
+        """Return a date-indexed frame of the requested archived columns; missing columns come back as NaN."""
+        path = self.file_for(ticker)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=list(columns), index=pd.DatetimeIndex([], name='date'))
+
+        stored = set(pq.read_schema(path).names)
+        filters = []
+        if start is not None:
+            filters.append(('date', '>=', pd.Timestamp(start).to_pydatetime()))
+        if end is not None:
+            filters.append(('date', '<=', pd.Timestamp(end).to_pydatetime()))
+        table = pq.read_table(path, columns=['date', *[column for column in columns if column in stored]],
+                              filters=filters or None)
+        return table.to_pandas().set_index('date').reindex(columns=list(columns))
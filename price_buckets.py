@@ -0,0 +1,102 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from pymongo import ReplaceOne
+
+from trading_calendar import normalize_dates
+
+# One document per ticker and calendar year, holding the year's bars as parallel arrays
+PRICE_BUCKET_COLLECTION = 'ohlcv_buckets'
+
+BUCKET_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def _bucket_arrays(doc):
+    dates = np.array(doc['dates'], dtype='datetime64[ns]')
+    return dates, {field: np.asarray(doc[field], dtype='float64') for field in BUCKET_FIELDS}
+
+
+def bucket_operations(collection, ticker, dates, columns, synced_at=None):
+    """
+    Merge bars into the ticker's year buckets and return one ReplaceOne per touched year.
+    dates is anything np.datetime64 accepts (normalized date keys); columns maps each of
+    BUCKET_FIELDS to values aligned with dates. Bars for a date already stored replace it.
+    Each touched bucket records synced_at, when its bars were read (default: now).
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    if dates.size == 0:
+        return []
+    columns = {field: np.asarray(columns[field], dtype='float64') for field in BUCKET_FIELDS}
+    years = dates.astype('datetime64[Y]').astype(int) + 1970
+    synced_at = synced_at or datetime.utcnow()
+
+    existing = {doc['year']: doc for doc in collection.find(
+        {'ticker': ticker, 'year': {'$in': np.unique(years).tolist()}}, {'_id': 0})}
+
+    operations = []
+    for year in np.unique(years):
+        mask = years == year
+        new_dates = dates[mask]
+        new_columns = {field: values[mask] for field, values in columns.items()}
+
+        if int(year) in existing:
+            old_dates, old_columns = _bucket_arrays(existing[int(year)])
+            new_dates = np.concatenate([new_dates, old_dates])
+            new_columns = {field: np.concatenate([new_columns[field], old_columns[field]]) for field in BUCKET_FIELDS}
+
+        # np.unique keeps the first occurrence, which is the newly written bar
+        merged_dates, first = np.unique(new_dates, return_index=True)
+        document = {
+            'ticker': ticker,
+            'year': int(year),
+            'dates': merged_dates.astype('datetime64[ms]').astype(datetime).tolist(),
+            'count': int(merged_dates.size),
+            'last_date': merged_dates[-1].astype('datetime64[ms]').astype(datetime),
+            'synced_at': synced_at,
+        }
+        for field in BUCKET_FIELDS:
+            document[field] = new_columns[field][first].tolist()
+        operations.append(ReplaceOne({'ticker': ticker, 'year': int(year)}, document, upsert=True))
+    return operations
+
+
+def frame_bucket_operations(collection, ticker, hist, synced_at=None):
+    """bucket_operations() for a frame with lowercase ohlcv columns and a date index or column."""
+    dates = hist['date'] if 'date' in hist.columns else hist.index
+    dates = normalize_dates(dates)
+    return bucket_operations(collection, ticker, dates.values, {field: hist[field].values for field in BUCKET_FIELDS},
+                             synced_at)
+
+
+def load_price_arrays(collection, ticker, fields=BUCKET_FIELDS, start=None, end=None):
+    """
+    Return {'date': datetime64[ns] array, field: float64 array, ...} for a ticker, sorted by date,
+    read from its year buckets (one document per year). start and end are inclusive timestamps.
+    """
+    query = {'ticker': ticker}
+    if start is not None or end is not None:
+        query['year'] = {}
+        if start is not None:
+            query['year']['$gte'] = pd.Timestamp(start).year
+        if end is not None:
+            query['year']['$lte'] = pd.Timestamp(end).year
+    projection = {'dates': 1, **{field: 1 for field in fields}, '_id': 0}
+    documents = list(collection.find(query, projection).sort('year', 1))
+
+    if not documents:
+        return {'date': np.array([], dtype='datetime64[ns]'), **{field: np.array([]) for field in fields}}
+
+    arrays = {'date': np.concatenate([np.array(doc['dates'], dtype='datetime64[ns]') for doc in documents])}
+    for field in fields:
+        arrays[field] = np.concatenate([np.asarray(doc[field], dtype='float64') for doc in documents])
+
+    lo = 0 if start is None else np.searchsorted(arrays['date'], np.datetime64(pd.Timestamp(start), 'ns'), 'left')
+    hi = None if end is None else np.searchsorted(arrays['date'], np.datetime64(pd.Timestamp(end), 'ns'), 'right')
+    return {key: values[lo:hi] for key, values in arrays.items()}
+
+
+def load_price_frame(collection, ticker, fields=BUCKET_FIELDS, start=None, end=None):
+    """load_price_arrays() as a date-indexed DataFrame, for code that already works on frames."""
+    arrays = load_price_arrays(collection, ticker, fields, start, end)
+    return pd.DataFrame({field: arrays[field] for field in fields}, index=pd.DatetimeIndex(arrays['date'], name='date'))
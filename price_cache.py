@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from watermarks import WATERMARK_COLLECTION
+
+# Directory of the local Parquet cache; override with PRICE_CACHE_DIR
+CACHE_DIR_ENV = 'PRICE_CACHE_DIR'
+DEFAULT_CACHE_DIR = 'price_cache'
+
+CACHE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# About one trading year per row group, so date filters skip whole years of a ticker's file
+ROW_GROUP_ROWS = 256
+
+SCHEMA = pa.schema([('date', pa.timestamp('ms'))] + [(column, pa.float64()) for column in CACHE_COLUMNS])
+
+
+def ticker_file_name(ticker):
+    """Parquet file name for a ticker; symbols like ^GSPC or BRK/B are not safe file names as they are."""
+    safe = ''.join(ch if ch.isalnum() or ch in '.-_' else f"%{ord(ch):02X}" for ch in ticker)
+    return f"{safe}.parquet"
+
+
+class PriceCache:
+    """
+    Local copy of ohlcv_data as one Parquet file per ticker (date plus OHLCV columns).
+    sync() pulls only the tickers whose ingest watermark was updated since the last sync,
+    and only their bars from the cached last date onwards, except tickers whose stored bars were
+    rewritten in place (watermarks.mark_rewritten), which are re-read in full; load() reads just
+    the requested columns and the row groups that overlap the requested dates.
+    """
+
+    def __init__(self, db, path=None, max_workers=8):
+        self.db = db
+        self.path = path or os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+        self.max_workers = max_workers
+        os.makedirs(self.path, exist_ok=True)
+        self._manifest_path = os.path.join(self.path, 'manifest.json')
+        self._lock = threading.Lock()
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path):
+            return {'synced_at': None, 'tickers': {}}
+        with open(self._manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        tmp = self._manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self._manifest_path)
+
+    def file_for(self, ticker):
+        return os.path.join(self.path, ticker_file_name(ticker))
+
+    def stale_tickers(self):
+        """
+        {ticker: rebuild} for the tickers never cached or whose watermark moved since the last sync;
+        rebuild is True when their stored bars were rewritten in place rather than appended to.
+        """
+        ohlcv_tickers = self.db['ohlcv_data'].distinct('ticker')
+        stale = {ticker: False for ticker in ohlcv_tickers if ticker not in self.manifest['tickers']}
+        synced_at = self.manifest['synced_at']
+        if synced_at is not None:
+            synced_at = datetime.fromisoformat(synced_at)
+            changed = self.db[WATERMARK_COLLECTION].find(
+                {'updated_at': {'$gt': synced_at}}, {'ticker': 1, 'rewritten_at': 1, '_id': 0})
+            for doc in changed:
+                if doc['ticker'] in self.manifest['tickers']:
+                    rewritten_at = doc.get('rewritten_at')
+                    stale[doc['ticker']] = rewritten_at is not None and rewritten_at > synced_at
+        return dict(sorted(stale.items()))
+
+    def sync_ticker(self, ticker, rebuild=False):
+        """Append a ticker's new bars from ohlcv_data to its Parquet file and return how many rows were read."""
+        path = self.file_for(ticker)
+        cached = None if rebuild or not os.path.exists(path) else pq.read_table(path).to_pandas()
+
+        query = {'ticker': ticker}
+        if cached is not None and not cached.empty:
+            # The newest cached day is read again, ingestion refreshes it while the session is open
+            query['date'] = {'$gte': cached['date'].max().to_pydatetime()}
+        rows = list(self.db['ohlcv_data'].find(query, {'date': 1, **{column: 1 for column in CACHE_COLUMNS}, '_id': 0}))
+
+        fresh = pd.DataFrame(rows).reindex(columns=['date', *CACHE_COLUMNS])
+        frame = fresh if cached is None else pd.concat([cached, fresh], ignore_index=True)
+        frame = frame.dropna(subset=['date'])
+        frame['date'] = pd.to_datetime(frame['date'])
+        frame = frame.drop_duplicates(subset=['date'], keep='last').sort_values('date')
+
+        table = pa.Table.from_pandas(frame.astype({column: 'float64' for column in CACHE_COLUMNS}),
+                                     schema=SCHEMA, preserve_index=False)
+        tmp = path + '.tmp'
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_ROWS)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self.manifest['tickers'][ticker] = {
+                'rows': len(frame),
+                'last_date': frame['date'].max().isoformat() if len(frame) else None,
+            }
+        return len(rows)
+
+    def sync(self, rebuild=False):
+        """Bring the cache up to date with ohlcv_data; returns the number of tickers refreshed."""
+        started = datetime.utcnow()
+        if rebuild:
+            tickers = {ticker: True for ticker in sorted(self.db['ohlcv_data'].distinct('ticker'))}
+        else:
+            tickers = self.stale_tickers()
+        if not tickers:
+            return 0
+
+        rows = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for count in executor.map(lambda item: self.sync_ticker(*item), tickers.items()):
+                rows += count
+
+        # Watermarks written while we were reading are picked up by the next sync
+        self.manifest['synced_at'] = started.isoformat()
+        self._write_manifest()
+        logging.info(f"Price cache: refreshed {len(tickers)} tickers ({rows} rows read from ohlcv_data)")
+        return len(tickers)
+
+    def load(self, ticker, columns=('close',), start=None, end=None):
+        """Return a date-indexed frame of the requested columns, reading only the overlapping row groups."""
+        path = self.file_for(ticker)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=list(columns), index=pd.DatetimeIndex([], name='date'))
+
+        filters = []
+        if start is not None:
+            filters.append(('date', '>=', pd.Timestamp(start).to_pydatetime()))
+        if end is not None:
+            filters.append(('date', '<=', pd.Timestamp(end).to_pydatetime()))
+        table = pq.read_table(path, columns=['date', *columns], filters=filters or None)
+        return table.to_pandas().set_index('date')
@@ -0,0 +1,91 @@
+import os
+import threading
+
+import pandas as pd
+
+from price_buckets import PRICE_BUCKET_COLLECTION, load_price_frame
+from trading_calendar import normalize_dates
+
+# Where the compute scripts read price history from:
+# 'parquet' (local cache synced from ohlcv_data, the default), 'buckets' (ohlcv_buckets), 'documents' (ohlcv_data)
+# or 'matrix' (the shared memory-mapped OHLCV matrices, indexed by trading day)
+PRICE_SOURCE_ENV = 'PRICE_SOURCE'
+PRICE_SOURCES = ('parquet', 'buckets', 'documents', 'matrix')
+
+_cache = None
+_cache_lock = threading.Lock()
+_archive = None
+
+
+def price_source():
+    """Return the price source named by PRICE_SOURCE, defaulting to the Parquet cache."""
+    source = os.environ.get(PRICE_SOURCE_ENV, 'parquet')
+    if source not in PRICE_SOURCES:
+        raise ValueError(f"{PRICE_SOURCE_ENV} must be one of {', '.join(PRICE_SOURCES)}, got {source!r}")
+    return source
+
+
+def price_cache(db):
+    """Return the process-wide PriceCache, synced with ohlcv_data the first time it is used."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from price_cache import PriceCache
+            _cache = PriceCache(db)
+            _cache.sync()
+        return _cache
+
+
+def price_archive():
+    """Return the process-wide PriceArchive holding the bars moved out of ohlcv_data."""
+    global _archive
+    with _cache_lock:
+        if _archive is None:
+            from price_archive import PriceArchive
+            _archive = PriceArchive()
+        return _archive
+
+
+def load_price_history(db, ticker, columns=('close',), start=None, end=None):
+    """
+    Return a ticker's bars as a frame indexed by normalized trading date, with the requested
+    lowercase columns, sorted by date, from whichever store PRICE_SOURCE selects. Bars that the
+    retention job moved to the cold Parquet archive are read back from there when the requested
+    range reaches them (a start on or after the archive cutoff does not); where both tiers hold a
+    day, the hot tier wins.
+    """
+    frame = _load_source(db, ticker, columns, start, end)
+    archive = price_archive()
+    has_cold = False
+    if archive.reaches(ticker, start):
+        cold = archive.load(ticker, columns, start, end)
+        has_cold = not cold.empty
+        if has_cold:
+            frame = pd.concat([cold, frame]) if not frame.empty else cold
+    frame.index = pd.DatetimeIndex(normalize_dates(frame.index), name='date')
+    frame = frame[~frame.index.duplicated(keep='last')]
+    return frame.sort_index() if has_cold else frame
+
+
+def _load_source(db, ticker, columns, start, end):
+    source = price_source()
+    if source == 'parquet':
+        return price_cache(db).load(ticker, columns, start, end)
+    if source == 'matrix':
+        from price_matrix import shared_matrix
+        frame = shared_matrix().frame(ticker, columns)
+        return frame.loc[start:end]
+    if source == 'buckets':
+        return load_price_frame(db[PRICE_BUCKET_COLLECTION], ticker, columns, start, end)
+
+    query = {'ticker': ticker}
+    if start is not None or end is not None:
+        query['date'] = {}
+        if start is not None:
+            query['date']['$gte'] = pd.Timestamp(start).to_pydatetime()
+        if end is not None:
+            query['date']['$lte'] = pd.Timestamp(end).to_pydatetime()
+    rows = list(db['ohlcv_data'].find(query, {'date': 1, **{column: 1 for column in columns}, '_id': 0}).sort('date', 1))
+    frame = pd.DataFrame(rows).reindex(columns=['date', *columns])
+    frame['date'] = pd.to_datetime(frame['date'])
+    return frame.set_index('date')
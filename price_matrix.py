@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import day_ids, master_sessions
+
+# Directory holding the matrix builds; override with PRICE_MATRIX_DIR
+MATRIX_DIR_ENV = 'PRICE_MATRIX_DIR'
+DEFAULT_MATRIX_DIR = 'price_matrix'
+
+# Every field the price cache holds, so any load_price_history() caller can run on PRICE_SOURCE=matrix
+MATRIX_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# Builds kept on disk, so a reader that opened the previous one keeps valid files while a new one is swapped in
+KEEP_BUILDS = 2
+
+
+def build_price_matrix(cache, path=None, tickers=None):
+    """
+    Write dense date x ticker float32 matrices of every OHLCV field as raw memmap files, with
+    tickers.json and dates.npy sidecars, into a new build directory under path, then point
+    CURRENT at it. Rows are consecutive trading days, so a bar's row is its day id minus
+    first_day_id in meta.json. Missing bars are NaN. Returns the build directory. Raises ValueError
+    when no ticker has a bar on the trading calendar, leaving the current build in place.
+    """
+    path = path or os.environ.get(MATRIX_DIR_ENV, DEFAULT_MATRIX_DIR)
+    tickers = sorted(tickers if tickers is not None else cache.manifest['tickers'])
+
+    frames = {}
+    for ticker in tickers:
+        frame = cache.load(ticker, columns=MATRIX_FIELDS)
+        ids = day_ids(frame.index)
+        if (ids >= 0).any():
+            frames[ticker] = (ids[ids >= 0], frame[ids >= 0])
+    if not frames:
+        raise ValueError(f"No bars to build a price matrix from ({len(tickers)} ticker(s) requested from the "
+                         f"price cache); sync the cache first or check the ticker list")
+    tickers = list(frames)
+    first = min(ids.min() for ids, _ in frames.values())
+    last = max(ids.max() for ids, _ in frames.values())
+    dates = master_sessions()[first:last + 1]
+
+    build = os.path.join(path, datetime.utcnow().strftime('%Y%m%dT%H%M%S%f'))
+    os.makedirs(build)
+    shape = (len(dates), len(tickers))
+    for field in MATRIX_FIELDS:
+        matrix = np.memmap(os.path.join(build, f"{field}.f32"), dtype='float32', mode='w+', shape=shape)
+        matrix[:] = np.nan
+        for column, ticker in enumerate(tickers):
+            ids, frame = frames[ticker]
+            matrix[ids - first, column] = frame[field].to_numpy(dtype='float32')
+        matrix.flush()
+        del matrix
+
+    np.save(os.path.join(build, 'dates.npy'), dates.values.astype('datetime64[D]'))
+    with open(os.path.join(build, 'tickers.json'), 'w') as f:
+        json.dump(tickers, f)
+    with open(os.path.join(build, 'meta.json'), 'w') as f:
+        json.dump({'shape': shape, 'fields': MATRIX_FIELDS, 'first_day_id': int(first),
+                   'built_at': datetime.utcnow().isoformat()}, f)
+
+    # Readers resolve CURRENT once when they open, so swapping it never changes a matrix under them
+    pointer = os.path.join(path, 'CURRENT')
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(os.path.basename(build))
+    os.replace(pointer + '.tmp', pointer)
+
+    for old in sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))[:-KEEP_BUILDS]:
+        shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+
+    logging.info(f"Price matrix built: {shape[0]} days x {shape[1]} tickers in {build}")
+    return build
+
+
+class PriceMatrix:
+    """
+    Read-only view of the newest matrix build. The field matrices are np.memmap arrays,
+    so every process that opens the same build shares one copy through the page cache.
+    Asking for a field the build does not hold raises ValueError.
+    """
+
+    def __init__(self, path=None):
+        path = path or os.environ.get(MATRIX_DIR_ENV, DEFAULT_MATRIX_DIR)
+        with open(os.path.join(path, 'CURRENT')) as f:
+            self.build = os.path.join(path, f.read().strip())
+        with open(os.path.join(self.build, 'meta.json')) as f:
+            meta = json.load(f)
+        with open(os.path.join(self.build, 'tickers.json')) as f:
+            self.tickers = json.load(f)
+
+        shape = tuple(meta['shape'])
+        self.first_day_id = meta['first_day_id']
+        self.dates = np.load(os.path.join(self.build, 'dates.npy'), mmap_mode='r')
+        self.columns = {ticker: column for column, ticker in enumerate(self.tickers)}
+        self.fields = {
+            field: np.memmap(os.path.join(self.build, f"{field}.f32"), dtype='float32', mode='r', shape=shape)
+            for field in meta['fields']
+        }
+
+    @property
+    def closes(self):
+        return self.fields['close']
+
+    @property
+    def volumes(self):
+        return self.fields['volume']
+
+    def field(self, field):
+        """The matrix of one field; builds made before all OHLCV fields were stored only hold close and volume."""
+        if field not in self.fields:
+            raise ValueError(f"Price matrix {self.build} has no {field!r} field (it holds {', '.join(self.fields)}); "
+                             f"rebuild it with build_price_matrix.py or use another PRICE_SOURCE")
+        return self.fields[field]
+
+    def rows(self, ids):
+        """Matrix rows for day ids from trading_calendar.day_ids()."""
+        return np.asarray(ids) - self.first_day_id
+
+    def series(self, ticker, field='close'):
+        """Return one ticker's column as a view (NaN where it has no bar), or None if it is not in the matrix."""
+        matrix = self.field(field)
+        column = self.columns.get(ticker)
+        return None if column is None else matrix[:, column]
+
+    def frame(self, ticker, fields=('close',)):
+        """One ticker's bars as a day-indexed frame, dropping the days it did not trade."""
+        matrices = {field: self.field(field) for field in fields}
+        column = self.columns.get(ticker)
+        if column is None:
+            return pd.DataFrame(columns=list(fields), index=pd.DatetimeIndex([], name='date'))
+        frame = pd.DataFrame({field: matrix[:, column] for field, matrix in matrices.items()},
+                             index=pd.DatetimeIndex(self.dates, name='date'))
+        return frame.dropna(how='all')
+
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def shared_matrix(path=None):
+    """Return the process-wide PriceMatrix, opening the current build on first use."""
+    global _matrix
+    with _matrix_lock:
+        if _matrix is None:
+            _matrix = PriceMatrix(path)
+        return _matrix
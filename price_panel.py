@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+
+from ohlcv_storage import OHLCV_COLLECTION
+from price_buckets import PRICE_BUCKET_COLLECTION
+from price_loader import load_price_history, price_archive, price_source
+from trading_calendar import normalize_dates
+
+PANEL_FIELDS = ('close', 'volume')
+
+# Documents per cursor batch; large batches keep the single stream from turning into many round trips
+CURSOR_BATCH = 10000
+
+
+class PricePanel:
+    """
+    Dense date x ticker float64 matrices of the requested fields, aligned to one shared index of
+    normalized trading dates (the days any loaded ticker has a bar). Missing bars are NaN.
+    """
+
+    def __init__(self, dates, tickers, fields):
+        self.dates = dates
+        self.tickers = tickers
+        self.fields = fields
+        self.columns = {ticker: column for column, ticker in enumerate(tickers)}
+
+    @property
+    def closes(self):
+        return self.fields['close']
+
+    @property
+    def volumes(self):
+        return self.fields['volume']
+
+    def series(self, ticker, field='close'):
+        """One ticker's values on the days it has a bar, as a date-indexed Series."""
+        column = self.columns.get(ticker)
+        if column is None:
+            return pd.Series(dtype='float64', index=pd.DatetimeIndex([], name='date'), name=field)
+        series = pd.Series(self.fields[field][:, column], index=self.dates, name=field)
+        return series.dropna()
+
+    def frame(self, ticker, fields=('close',)):
+        """One ticker's bars as a date-indexed frame, shaped like load_price_history()."""
+        column = self.columns.get(ticker)
+        if column is None:
+            return pd.DataFrame(columns=list(fields), index=pd.DatetimeIndex([], name='date'))
+        frame = pd.DataFrame({field: self.fields[field][:, column] for field in fields}, index=self.dates)
+        return frame.dropna(how='all')
+
+
+def _build_panel(tickers, dates, values, fields):
+    """Scatter flat (ticker, date, values) columns into dense matrices; a later duplicate bar wins."""
+    names, columns = np.unique(np.asarray(tickers, dtype=object).astype(str), return_inverse=True)
+    index, rows = np.unique(normalize_dates(dates).values, return_inverse=True)
+    matrices = {}
+    for field in fields:
+        matrix = np.full((len(index), len(names)), np.nan)
+        matrix[rows, columns] = np.asarray(values[field], dtype='float64')
+        matrices[field] = matrix
+    return PricePanel(pd.DatetimeIndex(index, name='date'), names.tolist(), matrices)
+
+
+def _date_query(field, start, end):
+    query = {}
+    if start is not None:
+        query['$gte'] = start
+    if end is not None:
+        query['$lte'] = end
+    return {field: query} if query else {}
+
+
+def _stream_documents(db, query, start, end, fields):
+    """One projected cursor over ohlcv_data, sorted on the (ticker, date) index."""
+    query.update(_date_query('date', start, end))
+    cursor = db[OHLCV_COLLECTION].find(query, {'ticker': 1, 'date': 1, **{field: 1 for field in fields}, '_id': 0})
+    cursor = cursor.sort([('ticker', 1), ('date', 1)]).batch_size(CURSOR_BATCH)
+
+    tickers, dates, values = [], [], {field: [] for field in fields}
+    for doc in cursor:
+        tickers.append(doc['ticker'])
+        dates.append(doc['date'])
+        for field in fields:
+            value = doc.get(field)
+            values[field].append(np.nan if value is None else value)
+    return tickers, dates, values
+
+
+def _stream_buckets(db, query, start, end, fields):
+    """One projected cursor over the year buckets, sorted on (ticker, year), flattened into bars."""
+    query.update(_date_query('year', start and start.year, end and end.year))
+    cursor = db[PRICE_BUCKET_COLLECTION].find(query, {'ticker': 1, 'dates': 1, **{field: 1 for field in fields}, '_id': 0})
+    cursor = cursor.sort([('ticker', 1), ('year', 1)]).batch_size(CURSOR_BATCH // 250)
+
+    tickers, dates, values = [], [], {field: [] for field in fields}
+    for doc in cursor:
+        tickers.extend([doc['ticker']] * len(doc['dates']))
+        dates.extend(doc['dates'])
+        for field in fields:
+            values[field].extend(doc[field])
+
+    dates = pd.DatetimeIndex(dates)
+    keep = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        keep &= dates >= start
+    if end is not None:
+        keep &= dates <= end
+    return (np.asarray(tickers, dtype=object)[keep], dates[keep],
+            {field: np.asarray(column, dtype='float64')[keep] for field, column in values.items()})
+
+
+def _flatten(frames, fields):
+    """Flat (ticker, date, values) columns of {ticker: date-indexed frame}."""
+    frames = {ticker: frame for ticker, frame in frames.items() if not frame.empty}
+    if not frames:
+        return [], [], {field: [] for field in fields}
+    return (np.concatenate([[ticker] * len(frame) for ticker, frame in frames.items()]),
+            np.concatenate([frame.index.values for frame in frames.values()]),
+            {field: np.concatenate([frame[field].to_numpy(dtype='float64') for frame in frames.values()])
+             for field in fields})
+
+
+def _read_local(db, tickers, start, end, fields):
+    """Per-ticker reads of the local Parquet cache or memory-mapped matrix; no Mongo query per ticker."""
+    if tickers is None:
+        tickers = db[OHLCV_COLLECTION].distinct('ticker')
+    return _flatten({ticker: load_price_history(db, ticker, columns=fields, start=start, end=end)
+                     for ticker in tickers}, fields)
+
+
+def _read_archive(tickers, start, end, fields):
+    """The cold tier's bars of the tickers whose requested range reaches it, as flat columns."""
+    archive = price_archive()
+    if tickers is None:
+        tickers = list(archive.manifest['tickers'])
+    return _flatten({ticker: archive.load(ticker, fields, start, end)
+                     for ticker in tickers if archive.reaches(ticker, start)}, fields)
+
+
+def _prepend(cold, hot, fields):
+    """Cold columns followed by hot ones, so _build_panel keeps the hot bar of a day both tiers hold."""
+    if not len(cold[0]):
+        return hot
+    return (np.concatenate([np.asarray(cold[0], dtype=object), np.asarray(hot[0], dtype=object)]),
+            pd.DatetimeIndex(cold[1]).append(pd.DatetimeIndex(hot[1])),
+            {field: np.concatenate([np.asarray(cold[2][field], dtype='float64'),
+                                    np.asarray(hot[2][field], dtype='float64')]) for field in fields})
+
+
+def load_price_panel(db, tickers=None, start=None, end=None, fields=PANEL_FIELDS):
+    """
+    Load every requested ticker's bars in one pass and return a PricePanel of dense date x ticker
+    matrices. With PRICE_SOURCE documents or buckets that is a single projected cursor sorted on
+    (ticker, date) instead of one query per ticker; with the local parquet or matrix sources it is
+    one file read per ticker. Bars moved to the cold archive are included whatever the source;
+    where both tiers hold a day, the hot tier wins. tickers limits the panel to a subset; start and
+    end are inclusive.
+    """
+    fields = tuple(fields)
+    start = None if start is None else pd.Timestamp(start).to_pydatetime()
+    end = None if end is None else pd.Timestamp(end).to_pydatetime()
+    query = {} if tickers is None else {'ticker': {'$in': list(tickers)}}
+
+    source = price_source()
+    if source == 'documents':
+        columns = _stream_documents(db, query, start, end, fields)
+    elif source == 'buckets':
+        columns = _stream_buckets(db, query, start, end, fields)
+    else:
+        # load_price_history already merges the archive per ticker
+        return _build_panel(*_read_local(db, tickers, start, end, fields), fields)
+    # The cursors read only the hot tier
+    columns = _prepend(_read_archive(tickers, start, end, fields), columns, fields)
+    return _build_panel(*columns, fields)
@@ -0,0 +1,126 @@
+import yfinance as yf
+from mongo_client import get_db
+import logging
+import argparse
+from collections import Counter
+from datetime import datetime, time, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http_session import shared_session_from_env, session_summary
+from fundamentals import (FUNDAMENTALS_COLLECTION, PERIOD_STATEMENTS, RECOMMENDATIONS_STALE, REFRESH_COLLECTION,
+                          store_fundamentals, stored_periods, refresh_reason, record_refresh,
+                          record_recommendations_refresh)
+from index_manifest import ensure_indexes
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+comprehensive_collection = db['comprehensive_data']
+
+# Keep-alive session shared by every yfinance call, optionally cached on disk (set YF_HTTP_CACHE)
+session = None
+
+# Configuration
+MAX_WORKERS = 4
+TTL_DAYS = 30
+EARNINGS_WINDOW_DAYS = 7
+RECOMMENDATIONS_TTL_DAYS = 30
+
+# Function to read the next expected earnings date from the Ticker calendar
+def next_earnings_date(stock):
+    try:
+        calendar = stock.calendar
+    except Exception as e:
+        logging.warning(f"Could not fetch calendar for {stock.ticker}: {e}")
+        return None
+    dates = calendar.get('Earnings Date') if isinstance(calendar, dict) else None
+    if not dates:
+        return None
+    return datetime.combine(min(dates), time())
+
+# Function to fetch a ticker's analyst recommendations summary
+def fetch_recommendations(stock):
+    try:
+        return stock.recommendations_summary
+    except Exception as e:
+        logging.warning(f"Could not fetch recommendations for {stock.ticker}: {e}")
+        return None
+
+# Function to refresh one ticker's fundamentals if they are due
+def refresh_ticker(ticker, state, now, ttl, earnings_window, recommendations_ttl):
+    periods = stored_periods(db, ticker)
+    reason = refresh_reason(state, periods, now, ttl=ttl, earnings_window=earnings_window,
+                            recommendations_ttl=recommendations_ttl)
+    if reason is None:
+        return 'skipped'
+
+    logging.info(f"Refreshing fundamentals for {ticker} ({reason})")
+    stock = yf.Ticker(ticker, session=session)
+    if reason == RECOMMENDATIONS_STALE:
+        # The statements are current; only the recommendations are re-read
+        store_fundamentals(db, ticker, {}, fetch_recommendations(stock))
+        record_recommendations_refresh(db, ticker)
+        return 'recommendations'
+
+    statements = {
+        'financials': stock.financials,
+        'balance_sheet': stock.balance_sheet,
+        'cashflow': stock.cashflow
+    }
+    new_periods = store_fundamentals(db, ticker, statements, fetch_recommendations(stock))
+    changed = any(new_periods.get(statement, [])[-1:] != periods.get(statement, [])[-1:]
+                  for statement in PERIOD_STATEMENTS)
+
+    # An earnings date that has passed is kept, so the filing is looked for through the window after it
+    passed = state.get('next_earnings') if state else None
+    last_earnings = passed if passed and passed <= now else None
+    record_refresh(db, ticker, next_earnings=next_earnings_date(stock), changed=changed, last_earnings=last_earnings)
+    return 'changed' if changed else 'unchanged'
+
+# Function to refresh every tracked ticker whose fundamentals are due
+def refresh_all_fundamentals(ttl_days=TTL_DAYS, earnings_window_days=EARNINGS_WINDOW_DAYS, max_workers=MAX_WORKERS,
+                             recommendations_ttl_days=RECOMMENDATIONS_TTL_DAYS):
+    ensure_indexes(db, [FUNDAMENTALS_COLLECTION, REFRESH_COLLECTION])
+    tickers = comprehensive_collection.distinct('ticker')
+    states = {doc['ticker']: doc for doc in db[REFRESH_COLLECTION].find({}, {'_id': 0})}
+    now = datetime.utcnow()
+    ttl = timedelta(days=ttl_days)
+    earnings_window = timedelta(days=earnings_window_days)
+    recommendations_ttl = timedelta(days=recommendations_ttl_days)
+
+    outcomes = Counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(refresh_ticker, ticker, states.get(ticker), now, ttl, earnings_window,
+                            recommendations_ttl): ticker
+            for ticker in tickers
+        }
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                outcomes[future.result()] += 1
+            except Exception as e:
+                logging.error(f"Error refreshing fundamentals for {ticker}: {e}")
+                outcomes['failed'] += 1
+
+    logging.info(f"Fundamentals refresh: {len(tickers)} tickers, {outcomes['skipped']} skipped as current, "
+                 f"{outcomes['changed']} with a new report period, {outcomes['unchanged']} unchanged, "
+                 f"{outcomes['recommendations']} recommendations only, {outcomes['failed']} failed")
+    if session is not None:
+        for line in session_summary(session):
+            logging.info(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh fundamentals for tickers near earnings or past their TTL")
+    parser.add_argument('--ttl-days', type=int, default=TTL_DAYS)
+    parser.add_argument('--earnings-window-days', type=int, default=EARNINGS_WINDOW_DAYS)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--recommendations-ttl-days', type=int, default=RECOMMENDATIONS_TTL_DAYS,
+                        help="re-read analyst recommendations this often, even while the statements are current")
+    args = parser.parse_args()
+    session = shared_session_from_env(pool_size=args.workers)
+    refresh_all_fundamentals(args.ttl_days, args.earnings_window_days, args.workers, args.recommendations_ttl_days)
@@ -1,12 +1,11 @@
-from pymongo import MongoClient
+from mongo_client import get_db
 import logging
 
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# MongoDB connection setup
-client = MongoClient("mongodb://mongodb-9iyq:27017")
-db = client['StockData']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 indicators_collection = db['indicators']
 
 def cleanup_indicators():
@@ -0,0 +1,27 @@
+from mongo_client import get_db
+import logging
+import argparse
+from indicator_snapshots import rollback, snapshot_names
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List indicator snapshots or swap one back in as indicators")
+    parser.add_argument('--list', action='store_true', help="list the snapshots kept for rollback")
+    parser.add_argument('--snapshot', help="snapshot collection to restore (default: the newest)")
+    parser.add_argument('--steps', type=int, default=1,
+                        help="restore the n-th newest snapshot; repeating a 1-step rollback toggles between "
+                             "the two newest versions, so use 2 or more to go further back")
+    args = parser.parse_args()
+    if args.list:
+        for name in snapshot_names(db):
+            logging.info(f"{name}: {db[name].estimated_document_count()} documents")
+    else:
+        rollback(db, args.snapshot, steps=args.steps)
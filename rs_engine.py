@@ -0,0 +1,132 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pymongo import UpdateOne
+
+# Trailing-return windows in trading days (~3, 6, 9 and 12 months)
+RS_PERIODS = {'RS1': 63, 'RS2': 126, 'RS3': 189, 'RS4': 252}
+
+RS_FIELDS = ('daily_pct_change', *RS_PERIODS)
+
+# Weights of the RS1-RS4 windows in the benchmark-relative 1-99 score
+RS_SCORE_WEIGHTS = (2, 1, 1, 1)
+
+WRITE_BATCH = 1000
+
+# Progress is logged once per this many written batches
+LOG_EVERY_BATCHES = 100
+
+
+def _compact_order(closes, valid=None):
+    """Per-column row order that moves each ticker's bars to the top, in date order, and its gaps below."""
+    missing = np.isnan(closes) if valid is None else ~valid
+    return np.argsort(missing, axis=0, kind='stable')
+
+
+def _pct_change(compact, period):
+    out = np.full(compact.shape, np.nan)
+    if period < len(compact):
+        previous = compact[:-period]
+        # A zero earlier close has no % change; left undefined, as the server engine and rs_state do
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[period:] = np.where(previous != 0, (compact[period:] - previous) / previous * 100, np.nan)
+    return out
+
+
+def rs_matrices(closes):
+    """
+    daily_pct_change and RS1-RS4 (% change over 63/126/189/252 bars) for a whole date x ticker
+    close matrix at once. Returns {field: matrix} shaped like closes, NaN where a value is undefined.
+    Windows count each ticker's own bars, as a per-ticker shift() did: the days a ticker did not
+    trade are squeezed out before shifting and restored afterwards.
+    """
+    closes = np.asarray(closes, dtype='float64')
+    order = _compact_order(closes)
+    compact = np.take_along_axis(closes, order, axis=0)
+
+    matrices = {}
+    for field, period in (('daily_pct_change', 1), *RS_PERIODS.items()):
+        values = _pct_change(compact, period)
+        matrix = np.empty_like(values)
+        np.put_along_axis(matrix, order, values, axis=0)
+        # A return only exists on a day the ticker has a close
+        matrix[np.isnan(closes)] = np.nan
+        matrices[field] = matrix
+    return matrices
+
+
+def benchmark_rs_scores(closes, benchmark, periods=tuple(RS_PERIODS.values()), weights=RS_SCORE_WEIGHTS):
+    """
+    1-99 benchmark-relative RS score for every day of every ticker in a date x ticker close matrix,
+    against a benchmark close column on the same dates. Only the days both traded count, and each
+    day is scored on the history up to it with the warm-up of the per-day scorer it replaces: a
+    window longer than that history reaches back to its first day, min(len - 1, period) bars.
+    Days the ticker or the benchmark did not trade are NaN.
+    """
+    closes = np.asarray(closes, dtype='float64')
+    benchmark = np.broadcast_to(np.asarray(benchmark, dtype='float64')[:, None], closes.shape)
+    valid = ~np.isnan(closes) & ~np.isnan(benchmark)
+    order = _compact_order(closes, valid)
+    ticker_closes = np.take_along_axis(closes, order, axis=0)
+    benchmark_closes = np.take_along_axis(benchmark, order, axis=0)
+
+    raw = np.zeros(closes.shape)
+    positions = np.arange(len(closes))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for period, weight in zip(periods, weights):
+            previous = np.maximum(positions - period, 0)
+            raw += weight * (ticker_closes / ticker_closes[previous] - benchmark_closes / benchmark_closes[previous])
+
+    # Raw scores run from -sum(weights) to +sum(weights); map that onto 1-99
+    total = sum(weights)
+    compact = np.clip((raw + total) / (2 * total) * 98 + 1, 1, 99)
+    scores = np.empty_like(compact)
+    np.put_along_axis(scores, order, compact, axis=0)
+    scores[~valid] = np.nan
+    return scores
+
+
+def rs_update_operations(dates, tickers, matrices):
+    """
+    Yield one UpdateOne per (ticker, date) that has at least one defined value, setting only
+    the non-NaN fields; bars are addressed by their normalized date key.
+    """
+    fields = list(matrices)
+    stacked = np.stack([matrices[field] for field in fields])
+    defined = ~np.isnan(stacked)
+    rows, columns = np.nonzero(defined.any(axis=0))
+    dates = dates.to_pydatetime()
+    for row, column in zip(rows.tolist(), columns.tolist()):
+        cell = stacked[:, row, column]
+        update = {field: float(value) for field, value, ok in zip(fields, cell, defined[:, row, column]) if ok}
+        yield UpdateOne({'ticker': tickers[column], 'date': dates[row]}, {'$set': update})
+
+
+def write_rs_values(collection, dates, tickers, matrices, batch_size=WRITE_BATCH, max_workers=4):
+    """Write the defined RS cells to the collection as unordered bulk updates; returns the number of bars updated."""
+    def batches():
+        batch = []
+        for operation in rs_update_operations(dates, tickers, matrices):
+            batch.append(operation)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    written = 0
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for count, batch in enumerate(batches(), start=1):
+            pending.append(executor.submit(collection.bulk_write, batch, ordered=False))
+            # Bounded in-flight batches, so operations are built only as fast as they are written
+            if len(pending) >= max_workers * 2:
+                written += pending.popleft().result().matched_count
+            if count % LOG_EVERY_BATCHES == 0:
+                logging.info(f"RS values: {count} batches sent, {written} bars written so far")
+        while pending:
+            written += pending.popleft().result().matched_count
+    logging.info(f"RS values written for {written} bars")
+    return written
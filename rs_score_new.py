@@ -1,10 +1,10 @@
-import pandas as pd
-from pymongo import MongoClient, UpdateOne
+from mongo_client import get_db
 import logging
-from datetime import datetime
 import warnings
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+from price_panel import load_price_panel
+from rs_engine import rs_matrices, write_rs_values
+from rs_server import RS_ENGINES, compute_rs_server, resolve_rs_engine
 
 # Suppress warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -15,95 +15,32 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# MongoDB connection setup
-client = MongoClient("mongodb://mongodb-9iyq:27017")
-db = client['StockData']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 ohlcv_collection = db['ohlcv_data']
 
-def calculate_rs_scores(ticker):
-    try:
-        # Get all historical data for the ticker
-        history = list(ohlcv_collection.find(
-            {"ticker": ticker},
-            {"date": 1, "close": 1, "_id": 0}
-        ))
+def main(engine=None):
+    if resolve_rs_engine(db, engine) == 'server':
+        # One $setWindowFields pipeline computes and $merges the values inside MongoDB
+        logging.info("Starting server-side RS update")
+        compute_rs_server(db)
+        logging.info("Bulk update complete")
+        return
 
-        if not history:
-            return f"No data found for {ticker}"
+    # One bulk read of every ticker's closes instead of a query per ticker
+    panel = load_price_panel(db, fields=('close',))
+    logging.info(f"Starting bulk update for {len(panel.tickers)} tickers")
 
-        df = pd.DataFrame(history)
-        df = df.sort_values('date').drop_duplicates(subset=['date'], keep='last').reset_index(drop=True)
+    # daily_pct_change and RS1-RS4 for the whole close matrix at once
+    matrices = rs_matrices(panel.closes)
 
-        # Compute daily_pct_change
-        df['daily_pct_change'] = df['close'].pct_change() * 100
-
-        periods = {
-            "RS1": 63,
-            "RS2": 126,
-            "RS3": 189,
-            "RS4": 252
-        }
-
-        # Compute RS values using shifted close prices
-        for rs_key, period in periods.items():
-            df[f'close_shift_{period}'] = df['close'].shift(period)
-            df[rs_key] = (df['close'] - df[f'close_shift_{period}']) / df[f'close_shift_{period}'] * 100
-
-        # Drop rows where 'daily_pct_change' is NaN (first row)
-        df = df.dropna(subset=['daily_pct_change']).reset_index(drop=True)
-
-        # Prepare bulk operations
-        bulk_operations = []
-        batch_size = 100  # Control the size of batches to avoid memory issues
-
-        for idx, row in df.iterrows():
-            current_date = row['date']
-            update_doc = {
-                "daily_pct_change": row['daily_pct_change']
-            }
-
-            for rs_key in periods.keys():
-                if pd.notnull(row[rs_key]):
-                    update_doc[rs_key] = row[rs_key]
-
-            bulk_operations.append(UpdateOne(
-                {"ticker": ticker, "date": current_date},
-                {"$set": update_doc}
-            ))
-
-            # Perform batch updates
-            if len(bulk_operations) >= batch_size:
-                ohlcv_collection.bulk_write(bulk_operations, ordered=False)
-                bulk_operations.clear()
-
-        if bulk_operations:
-            ohlcv_collection.bulk_write(bulk_operations, ordered=False)
-
-        return f"Successfully updated {ticker} - {len(df)} records"
-    except Exception as e:
-        return f"Error processing {ticker}: {str(e)}"
-
-def main():
-    tickers = ohlcv_collection.distinct("ticker")
-    total_tickers = len(tickers)
-
-    logging.info(f"Starting bulk update for {total_tickers} tickers")
-
-    # Use ThreadPoolExecutor with appropriate number of workers
-    with ThreadPoolExecutor(max_workers=5) as executor:  # Adjust workers based on resources
-        futures = {executor.submit(calculate_rs_scores, ticker): ticker for ticker in tickers}
-
-        for future in tqdm(as_completed(futures), total=total_tickers, desc="Processing tickers"):
-            result = future.result()
-            ticker = futures[future]
-            if "Error" in result:
-                logging.error(result)
-            elif "No data" in result:
-                logging.warning(result)
-            else:
-                logging.info(result)
+    # Only the non-NaN cells become updates; bars without any RS value are left alone
+    write_rs_values(ohlcv_collection, panel.dates, panel.tickers, matrices, max_workers=5)
 
     logging.info("Bulk update complete")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Bulk update daily % change and RS1-RS4 on every OHLCV bar")
+    parser.add_argument('--engine', choices=RS_ENGINES, help="where to compute the values (default: RS_ENGINE, else python)")
+    args = parser.parse_args()
+    main(engine=args.engine)
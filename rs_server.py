@@ -0,0 +1,76 @@
+import logging
+import os
+
+from ohlcv_storage import OHLCV_COLLECTION, is_timeseries
+from rs_engine import RS_PERIODS
+
+# Where daily_pct_change and RS1-RS4 are computed: 'python' loads the closes and uses rs_engine,
+# 'server' runs one $setWindowFields pipeline in MongoDB (5.0+) and $merges the results back
+RS_ENGINE_ENV = 'RS_ENGINE'
+RS_ENGINES = ('python', 'server')
+
+
+def rs_engine_mode():
+    """Return the RS engine requested through RS_ENGINE, defaulting to the Python engine."""
+    engine = os.environ.get(RS_ENGINE_ENV, 'python')
+    if engine not in RS_ENGINES:
+        raise ValueError(f"{RS_ENGINE_ENV} must be one of {', '.join(RS_ENGINES)}, got {engine!r}")
+    return engine
+
+
+def resolve_rs_engine(db, engine=None):
+    """
+    The engine to run: the given one or the RS_ENGINE one. $merge cannot write into a time-series
+    collection, so the server engine falls back to the Python one there.
+    """
+    engine = engine or rs_engine_mode()
+    if engine == 'server' and is_timeseries(db):
+        logging.warning(f"{OHLCV_COLLECTION} is a time-series collection, which $merge cannot write to; "
+                        f"using the python RS engine")
+        return 'python'
+    return engine
+
+
+def _pct_change(previous):
+    """% change from a shifted close; removed from the output when there is no usable earlier close."""
+    return {'$cond': [
+        {'$and': [{'$ne': [previous, None]}, {'$ne': [previous, 0]}]},
+        {'$multiply': [{'$divide': [{'$subtract': ['$close', previous]}, previous]}, 100]},
+        '$$REMOVE',
+    ]}
+
+
+def rs_pipeline(tickers=None, since=None):
+    """
+    Aggregation that computes daily_pct_change and RS1-RS4 for every bar with a close, shifting
+    within each ticker's own bars in date order as rs_engine.rs_matrices does, and $merges only
+    those fields back onto the bars by _id. Bars without a defined value are left untouched.
+    since limits which bars are written; the windows still see the history before it.
+    """
+    match = {'close': {'$type': 'number', '$ne': float('nan')}}
+    if tickers is not None:
+        match['ticker'] = {'$in': list(tickers)}
+
+    shifts = {'daily_pct_change': 1, **RS_PERIODS}
+    pipeline = [
+        {'$match': match},
+        {'$setWindowFields': {
+            'partitionBy': '$ticker',
+            'sortBy': {'date': 1},
+            'output': {f'_previous_{field}': {'$shift': {'output': '$close', 'by': -period, 'default': None}}
+                       for field, period in shifts.items()},
+        }},
+    ]
+    if since is not None:
+        pipeline.append({'$match': {'date': {'$gte': since}}})
+    pipeline += [
+        {'$project': {field: _pct_change(f'$_previous_{field}') for field in shifts}},
+        {'$merge': {'into': OHLCV_COLLECTION, 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}},
+    ]
+    return pipeline
+
+
+def compute_rs_server(db, tickers=None, since=None):
+    """Run rs_pipeline() on ohlcv_data; nothing but the pipeline and its acknowledgement crosses the network."""
+    db[OHLCV_COLLECTION].aggregate(rs_pipeline(tickers, since), allowDiskUse=True)
+    logging.info("RS values computed and merged on the server")
@@ -0,0 +1,128 @@
+import logging
+import os
+
+import numpy as np
+
+from ohlcv_storage import OHLCV_COLLECTION
+from rs_engine import RS_PERIODS
+from trading_calendar import normalize_date
+
+# File holding the rolling RS state; override with RS_STATE_PATH
+RS_STATE_ENV = 'RS_STATE_PATH'
+DEFAULT_RS_STATE_PATH = 'rs_state.npz'
+
+# Closes kept per ticker: today's and the one RS4's 252-bar window reaches back to
+RING_SIZE = max(RS_PERIODS.values()) + 1
+
+
+class RSState:
+    """
+    Ring buffer of each ticker's last RING_SIZE closes with the date of its newest bar, so the daily
+    RS step appends today's close and reads the 1/63/126/189/252-bars-back closes without querying
+    ohlcv_data. closes[row, heads[row]] is the newest close; the close k bars back sits k slots
+    before it, modulo RING_SIZE. counts[row] is how many slots are filled.
+    """
+
+    def __init__(self, tickers, closes, heads, counts, last_dates):
+        self.tickers = list(tickers)
+        self.rows = {ticker: row for row, ticker in enumerate(self.tickers)}
+        self.closes = closes
+        self.heads = heads
+        self.counts = counts
+        self.last_dates = last_dates
+
+    @classmethod
+    def empty(cls):
+        return cls([], np.empty((0, RING_SIZE)), np.empty(0, dtype='int64'), np.empty(0, dtype='int64'),
+                   np.empty(0, dtype='datetime64[D]'))
+
+    @classmethod
+    def load(cls, path=None):
+        """Read the state file, or start an empty state when there is none yet."""
+        path = path or os.environ.get(RS_STATE_ENV, DEFAULT_RS_STATE_PATH)
+        if not os.path.exists(path):
+            return cls.empty()
+        with np.load(path) as data:
+            if data['closes'].shape[1] != RING_SIZE:
+                logging.warning(f"{path} holds {data['closes'].shape[1]} closes per ticker, not {RING_SIZE}; starting over")
+                return cls.empty()
+            return cls(data['tickers'].tolist(), data['closes'], data['heads'], data['counts'], data['last_dates'])
+
+    def save(self, path=None):
+        """Write the state to a temporary file and swap it in, so a crash never leaves a partial file."""
+        path = path or os.environ.get(RS_STATE_ENV, DEFAULT_RS_STATE_PATH)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, tickers=np.array(self.tickers, dtype=str), closes=self.closes, heads=self.heads,
+                     counts=self.counts, last_dates=self.last_dates)
+        os.replace(path + '.tmp', path)
+
+    def _row(self, ticker):
+        row = self.rows.get(ticker)
+        if row is None:
+            row = len(self.tickers)
+            self.tickers.append(ticker)
+            self.rows[ticker] = row
+            self.closes = np.vstack([self.closes, np.full((1, RING_SIZE), np.nan)])
+            self.heads = np.append(self.heads, RING_SIZE - 1)
+            self.counts = np.append(self.counts, 0)
+            self.last_dates = np.append(self.last_dates, np.datetime64('NaT', 'D'))
+        return row
+
+    def last_date(self, ticker):
+        """Normalized date of the newest close held for a ticker, or None."""
+        row = self.rows.get(ticker)
+        if row is None or np.isnat(self.last_dates[row]):
+            return None
+        return self.last_dates[row].astype('datetime64[ms]').item()
+
+    def reset(self, ticker):
+        row = self._row(ticker)
+        self.closes[row] = np.nan
+        self.heads[row] = RING_SIZE - 1
+        self.counts[row] = 0
+        self.last_dates[row] = np.datetime64('NaT', 'D')
+
+    def append(self, ticker, date, close):
+        """
+        Add a bar in date order. A bar on the newest day replaces that close (a partial bar being
+        refreshed); older bars and missing closes are ignored. Returns True when the bar was taken.
+        """
+        if close is None or np.isnan(close):
+            return False
+        row = self._row(ticker)
+        date = np.datetime64(normalize_date(date), 'D')
+        last = self.last_dates[row]
+        if not np.isnat(last) and date < last:
+            return False
+        if np.isnat(last) or date > last:
+            self.heads[row] = (self.heads[row] + 1) % RING_SIZE
+            self.counts[row] = min(self.counts[row] + 1, RING_SIZE)
+            self.last_dates[row] = date
+        self.closes[row, self.heads[row]] = close
+        return True
+
+    def rs_values(self, ticker):
+        """daily_pct_change and RS1-RS4 of the newest bar, for the windows the buffer already covers."""
+        row = self.rows[ticker]
+        head = self.heads[row]
+        newest = self.closes[row, head]
+        values = {}
+        for field, period in (('daily_pct_change', 1), *RS_PERIODS.items()):
+            if self.counts[row] > period:
+                previous = self.closes[row, (head - period) % RING_SIZE]
+                if previous:
+                    values[field] = float((newest - previous) / previous * 100)
+        return values
+
+
+def seed_from_collection(db, state, ticker, before):
+    """Refill a ticker's buffer from its last RING_SIZE stored closes before a date."""
+    state.reset(ticker)
+    # The same closes the server engine windows over: numbers, but not NaN
+    query = {'ticker': ticker, 'close': {'$type': 'number', '$ne': float('nan')}}
+    if before is not None:
+        query['date'] = {'$lt': before}
+    history = list(db[OHLCV_COLLECTION].find(query, {'date': 1, 'close': 1, '_id': 0})
+                   .sort('date', -1).limit(RING_SIZE))
+    for doc in reversed(history):
+        state.append(ticker, doc['date'], doc['close'])
@@ -1,34 +1,22 @@
 import pymongo
 import logging
-from pymongo import MongoClient
-import os
+from mongo_client import get_db
 from datetime import datetime
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
-# MongoDB connection setup
-try:
-    mongo_uri = os.environ.get('MONGO_URI', 'mongodb://mongodb-9iyq:27017')
-    client = MongoClient(mongo_uri)
-    db = client['StockData']
-    ohlcv_collection = db['ohlcv_data']
-    indicators_collection = db['indicators']
-    sector_trends_collection = db['sector_trends']
-    logging.info("Successfully connected to MongoDB.")
-except Exception as e:
-    logging.error(f"Error connecting to MongoDB: {e}")
-    client = None
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+ohlcv_collection = db['ohlcv_data']
+indicators_collection = db['indicators']
+sector_trends_collection = db['sector_trends']
 
 # Define the start date (You can change this as needed)
 start_date = datetime.strptime("2023-04-15", "%Y-%m-%d")
 
 # Function to calculate sector and industry trends
 def calculate_sector_trends():
-    if client is None:
-        logging.error("MongoDB client is not connected.")
-        return
-
     # Get distinct dates from ohlcv_data for RS scores that are greater than or equal to the start date
     distinct_dates = ohlcv_collection.distinct('date', {'date': {'$gte': start_date}})
 
@@ -1,18 +1,10 @@
 import csv
 import requests
-from pymongo import MongoClient
-import os
+from mongo_client import get_db
 
-# MongoDB connection setup
-try:
-    mongo_uri = os.environ.get('MONGO_URI', 'mongodb://mongodb-9iyq:27017')
-    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-    db = client['StockData']
-    indicators_collection = db['indicators']
-    print("Successfully connected to MongoDB.")
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-    client = None
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+indicators_collection = db['indicators']
 
 # Function to download CSV from GitHub
 def download_csv_from_github(url, local_filename):
@@ -28,10 +20,6 @@ def download_csv_from_github(url, local_filename):
 
 # Function to update sector and industry in the indicators collection
 def update_sector_and_industry(csv_file_path):
-    if client is None:
-        print("Unable to connect to the database.")
-        return
-
     with open(csv_file_path, newline='') as csvfile:
         reader = csv.DictReader(csvfile)
 
@@ -0,0 +1,76 @@
+from mongo_client import get_db
+import pandas as pd
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from index_manifest import ensure_indexes
+from price_buckets import PRICE_BUCKET_COLLECTION, BUCKET_FIELDS, frame_bucket_operations
+from watermarks import WATERMARK_COLLECTION
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+ohlcv_collection = db['ohlcv_data']
+bucket_collection = db[PRICE_BUCKET_COLLECTION]
+
+MAX_WORKERS = 4
+
+# Function to copy a ticker's ohlcv_data rows newer than its buckets into the year buckets.
+# Bars rewritten in place (watermarks.mark_rewritten) after a bucket was synced are re-read in full instead.
+def sync_ticker(ticker, rebuild=False, rewritten_at=None):
+    started = datetime.utcnow()
+    query = {'ticker': ticker}
+    if not rebuild and rewritten_at is not None:
+        # Buckets written before synced_at was recorded count as older than any rewrite
+        oldest = bucket_collection.find_one({'ticker': ticker}, {'synced_at': 1}, sort=[('synced_at', 1)])
+        rebuild = oldest is not None and (oldest.get('synced_at') is None or oldest['synced_at'] < rewritten_at)
+    if rebuild:
+        bucket_collection.delete_many({'ticker': ticker})
+    else:
+        latest = bucket_collection.find_one({'ticker': ticker}, {'last_date': 1}, sort=[('year', -1)])
+        if latest:
+            # Re-read the newest stored day as well, ingestion refreshes it while the session is open
+            query['date'] = {'$gte': latest['last_date']}
+
+    rows = list(ohlcv_collection.find(query, {'date': 1, **{field: 1 for field in BUCKET_FIELDS}, '_id': 0}))
+    if not rows:
+        return 0
+
+    hist = pd.DataFrame(rows).reindex(columns=['date', *BUCKET_FIELDS])
+    operations = frame_bucket_operations(bucket_collection, ticker, hist, synced_at=started)
+    if operations:
+        bucket_collection.bulk_write(operations, ordered=False)
+    return len(rows)
+
+# Function to bring every ticker's buckets up to date with ohlcv_data
+def sync_all(rebuild=False, max_workers=MAX_WORKERS):
+    ensure_indexes(db, [PRICE_BUCKET_COLLECTION])
+    tickers = sorted(ohlcv_collection.distinct('ticker'))
+    rewrites = {doc['ticker']: doc['rewritten_at'] for doc in db[WATERMARK_COLLECTION].find(
+        {'rewritten_at': {'$exists': True}}, {'ticker': 1, 'rewritten_at': 1, '_id': 0})}
+    logging.info(f"Syncing price buckets for {len(tickers)} tickers{' (full rebuild)' if rebuild else ''}")
+
+    synced = failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(sync_ticker, ticker, rebuild, rewrites.get(ticker)): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            try:
+                synced += future.result()
+            except Exception as e:
+                logging.error(f"Error syncing price buckets for {futures[future]}: {e}")
+                failed += 1
+
+    logging.info(f"Price buckets synced: {synced} rows copied, {failed} tickers failed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the per-ticker-year array documents in ohlcv_buckets")
+    parser.add_argument('--rebuild', action='store_true', help="drop and rebuild every ticker's buckets")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+    sync_all(args.rebuild, args.workers)
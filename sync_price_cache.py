@@ -0,0 +1,23 @@
+from mongo_client import get_db
+import logging
+import argparse
+from price_cache import PriceCache
+
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the local Parquet price cache from ohlcv_data")
+    parser.add_argument('--path', help="cache directory (default: $PRICE_CACHE_DIR or ./price_cache)")
+    parser.add_argument('--rebuild', action='store_true', help="re-read every ticker's full history")
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    cache = PriceCache(db, path=args.path, max_workers=args.workers)
+    refreshed = cache.sync(rebuild=args.rebuild)
+    logging.info(f"Price cache at {cache.path} is current ({refreshed} tickers refreshed)")
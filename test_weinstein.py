@@ -1,24 +1,22 @@
 import pandas as pd
-from pymongo import MongoClient
+from mongo_client import get_db
 import numpy as np
+import argparse
 from datetime import datetime
+from indicator_snapshots import write_indicators
+from price_panel import load_price_panel
 
-# MongoDB connection (adjust the connection string as necessary)
-client = MongoClient("mongodb://mongodb-9iyq:27017")
-db = client['StockData']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 ohlcv_collection = db['ohlcv_data']
 
 # Market index symbol (using ^GSPC instead of SPY)
 market_ticker = '^GSPC'
 
-# Function to fetch data from MongoDB
-def fetch_daily_data(ticker):
-    data = list(ohlcv_collection.find({"ticker": ticker}).sort("date", 1))
-    if data:
-        df = pd.DataFrame(data)
-        df['date'] = pd.to_datetime(df['date'])
-        df.set_index('date', inplace=True)
-        df = df[['open', 'high', 'low', 'close', 'volume']].sort_index()
+# Function to take a ticker's daily bars from the panel loaded for the whole run
+def fetch_daily_data(panel, ticker):
+    df = panel.frame(ticker, ('open', 'high', 'low', 'close', 'volume'))
+    if not df.empty:
         df.columns = ['Open', 'High', 'Low', 'Close', 'Volume']
         return df
     else:
@@ -96,13 +94,15 @@ def weinstein_stage_analysis(ticker_df, market_df):
     return ticker_df
 
 # Main function to process all tickers
-def main():
-    # Fetch all tickers from the database
-    all_tickers = ohlcv_collection.distinct('ticker')
+def main(publish=False):
+    # One bulk read of every ticker's daily bars, the market index included
+    panel = load_price_panel(db, fields=('open', 'high', 'low', 'close', 'volume'))
+    all_tickers = panel.tickers
     print(f"Total tickers to process: {len(all_tickers)}")
+    updates = {}
 
     # Fetch market data
-    market_daily_df = fetch_daily_data(market_ticker)
+    market_daily_df = fetch_daily_data(panel, market_ticker)
     if market_daily_df is None:
         print("Market data not available.")
         return
@@ -113,7 +113,7 @@ def main():
     # Process each ticker
     for ticker in all_tickers:
         print(f"Processing {ticker}")
-        ticker_daily_df = fetch_daily_data(ticker)
+        ticker_daily_df = fetch_daily_data(panel, ticker)
         if ticker_daily_df is None:
             continue
 
@@ -151,12 +151,7 @@ def main():
                 "date": pd.to_datetime('today'),
             }
             # Convert numpy types to native types
-            indicator_data = convert_numpy_types(indicator_data)
-            db.indicators.update_one(
-                {"ticker": ticker},
-                {"$set": indicator_data},
-                upsert=True
-            )
+            updates[(ticker,)] = convert_numpy_types(indicator_data)
         else:
             print(f"No buy signal for {ticker}")
             # Optionally update the indicator data without buy signal
@@ -169,12 +164,10 @@ def main():
                 "date": pd.to_datetime('today'),
             }
             # Convert numpy types to native types
-            indicator_data = convert_numpy_types(indicator_data)
-            db.indicators.update_one(
-                {"ticker": ticker},
-                {"$set": indicator_data},
-                upsert=True
-            )
+            updates[(ticker,)] = convert_numpy_types(indicator_data)
+
+    # One bulk write (or snapshot swap) into the indicators collection for the whole run
+    write_indicators(db, updates, key=('ticker',), publish=publish)
 
 # Function to convert numpy data types to native Python types
 def convert_numpy_types(data):
@@ -192,4 +185,8 @@ def convert_numpy_types(data):
         return data
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run Weinstein stage analysis and store the signals in indicators")
+    parser.add_argument('--publish', action='store_true',
+                        help="write a complete new indicators snapshot and swap it in atomically")
+    args = parser.parse_args()
+    main(publish=args.publish)
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from async_fetcher import AsyncYahooFetcher, TokenBucket
+from dead_tickers import NoDataError, is_no_data_error
+
+# Three daily bars, shaped like Yahoo's v8 chart response
+CHART = {'chart': {'result': [{
+    'meta': {'exchangeTimezoneName': 'America/New_York'},
+    'timestamp': [1704205800, 1704292200, 1704378600],
+    'indicators': {
+        'quote': [{'open': [10.0, 11.0, 12.0], 'high': [10.5, 11.5, 12.5], 'low': [9.5, 10.5, 11.5],
+                   'close': [10.0, 11.0, 12.0], 'volume': [100, 200, 300]}],
+        'adjclose': [{'adjclose': [10.0, 11.0, 12.0]}],
+    },
+}]}}
+
+
+def stub_app(calls, failures):
+    """A chart endpoint that answers failures[ticker] statuses first, then CHART; MISSING is always 404."""
+    async def chart(request):
+        ticker = request.match_info['ticker']
+        calls.append((ticker, time.monotonic()))
+        if ticker == 'MISSING':
+            return web.json_response({'chart': {'result': None}}, status=404)
+        pending = failures.get(ticker)
+        if pending:
+            return web.Response(status=pending.pop(0), headers={'Retry-After': '0'})
+        return web.json_response(CHART)
+
+    app = web.Application()
+    app.router.add_get('/v8/finance/chart/{ticker}', chart)
+    return app
+
+
+def fetch(tickers, failures=None, **options):
+    """Run the fetcher against a stub server; returns ({ticker: (hist, error)}, calls, fetcher)."""
+    calls, results = [], {}
+    options = {'backoff_base': 0.01, **options}
+
+    async def run():
+        async with TestServer(stub_app(calls, failures or {})) as server:
+            fetcher = AsyncYahooFetcher(base_url=str(server.make_url('')), **options)
+            await fetcher.fetch_many([(ticker, {}) for ticker in tickers],
+                                     lambda ticker, hist, error: results.update({ticker: (hist, error)}))
+            return fetcher
+
+    return results, calls, asyncio.run(run())
+
+
+def test_fractional_rate_bucket_still_grants_tokens():
+    async def acquire():
+        await asyncio.wait_for(TokenBucket(0.5).acquire(), timeout=1)
+
+    asyncio.run(acquire())
+
+
+def test_requests_are_held_to_the_rate_limit():
+    tickers = [f"T{number}" for number in range(20)]
+    results, calls, _ = fetch(tickers, requests_per_second=10, max_in_flight=20)
+
+    assert all(error is None and len(hist) == 3 for hist, error in results.values())
+    # A full bucket covers the first 10 requests at once; the other 10 arrive one token (0.1s) apart
+    started = sorted(moment for _, moment in calls)
+    assert started[-1] - started[0] >= 0.9
+
+
+def test_throttled_and_failing_responses_are_retried():
+    results, calls, fetcher = fetch(['FLAKY', 'OK'], failures={'FLAKY': [429, 503]}, requests_per_second=100)
+
+    hist, error = results['FLAKY']
+    assert error is None and list(hist['Close']) == [10.0, 11.0, 12.0]
+    assert [ticker for ticker, _ in calls].count('FLAKY') == 3
+    assert fetcher.stats['retries'] == 2 and fetcher.stats['throttled'] == 1
+
+
+def test_gives_up_after_max_retries():
+    results, calls, fetcher = fetch(['DOWN'], failures={'DOWN': [503] * 10}, requests_per_second=100, max_retries=2)
+
+    hist, error = results['DOWN']
+    assert hist is None and 'Giving up on DOWN' in str(error)
+    assert len(calls) == 3
+
+
+def test_missing_ticker_is_not_retried():
+    results, calls, _ = fetch(['MISSING'], requests_per_second=100)
+
+    hist, error = results['MISSING']
+    assert hist is None and isinstance(error, NoDataError)
+    assert len(calls) == 1
+
+
+def test_only_confirmed_misses_count_as_no_data():
+    results, _, _ = fetch(['DOWN'], failures={'DOWN': [429] * 10}, requests_per_second=100, max_retries=1)
+
+    assert not is_no_data_error(results['DOWN'][1])
+    assert is_no_data_error(RuntimeError('$OLD: possibly delisted; no price data found  (period=2y)'))
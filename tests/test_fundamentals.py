@@ -0,0 +1,17 @@
+from datetime import datetime, timedelta
+
+from fundamentals import refresh_reason
+
+NOW = datetime(2024, 6, 1)
+
+
+def test_ticker_without_statements_is_refreshed_on_the_ttl_alone():
+    state = {'last_checked': NOW - timedelta(days=1)}
+    assert refresh_reason(state, {}, NOW) is None
+
+    state = {'last_checked': NOW - timedelta(days=31)}
+    assert refresh_reason(state, {}, NOW) == 'ttl expired'
+
+
+def test_ticker_never_checked_is_refreshed():
+    assert refresh_reason(None, {}, NOW) == 'never refreshed'
@@ -0,0 +1,48 @@
+import http.server
+import threading
+
+import pytest
+
+import http_cache
+from http_cache import CachedSession, ResponseCache
+
+
+class YahooStub(http.server.BaseHTTPRequestHandler):
+    """/cookie sets the A3 session cookie, /getcrumb answers a crumb; every request is counted."""
+    requests = []
+
+    def do_GET(self):
+        YahooStub.requests.append(self.path)
+        self.send_response(200)
+        if self.path.startswith('/cookie'):
+            self.send_header('Set-Cookie', 'A3=session; Path=/')
+        self.end_headers()
+        self.wfile.write(b'crumb' if self.path.startswith('/getcrumb') else b'')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def yahoo(monkeypatch):
+    YahooStub.requests = []
+    server = http.server.HTTPServer(('127.0.0.1', 0), YahooStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # The stub serves both endpoints from one host, so classify them by path
+    monkeypatch.setattr(http_cache, 'endpoint_for', lambda url, params=None: (
+        'cookie' if '/cookie' in url else 'crumb' if '/getcrumb' in url else None))
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_cached_crumb_comes_back_with_its_cookies(yahoo, tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    for _ in range(2):
+        session = CachedSession(ResponseCache(path))
+        cookie = session.get(f"{yahoo}/cookie")
+        crumb = session.get(f"{yahoo}/getcrumb")
+        assert dict(cookie.cookies) == {'A3': 'session'}
+        assert dict(session.cookies) == {'A3': 'session'} and crumb.text == 'crumb'
+
+    # The second session was answered entirely from the cache
+    assert len(YahooStub.requests) == 2
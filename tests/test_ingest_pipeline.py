@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+from pymongo import InsertOne
+
+from ingest_pipeline import IngestPipeline
+
+
+class ListCollection:
+    """Just enough of a collection for BulkWriter: bulk_write appends the inserted documents."""
+
+    def __init__(self):
+        self.documents = []
+        self._lock = threading.Lock()
+
+    def bulk_write(self, operations, ordered=True):
+        with self._lock:
+            self.documents.extend(operation._doc for operation in operations)
+
+
+def run_with_deadline(pipeline, tickers, seconds=20):
+    """Run the pipeline in a thread; returns the exception it raised, failing the test if it hangs."""
+    outcome = {}
+
+    def target():
+        try:
+            pipeline.run(tickers)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "pipeline blocked"
+    return outcome.get('error')
+
+
+def test_every_ticker_is_written():
+    collection = ListCollection()
+    written = []
+    pipeline = IngestPipeline(collection, fetch=lambda ticker: ticker,
+                              transform=lambda ticker, fetched: [InsertOne({'ticker': fetched})],
+                              on_written=lambda ticker, error: written.append((ticker, error)),
+                              fetch_workers=4, queue_size=2, write_batch=10)
+
+    assert run_with_deadline(pipeline, [f"T{number}" for number in range(200)]) is None
+    assert len(collection.documents) == 200
+    assert all(error is None for _, error in written) and len(written) == 200
+
+
+def test_failed_fetch_is_reported_and_the_rest_written():
+    collection = ListCollection()
+    failed = []
+
+    def fetch(ticker):
+        if ticker == 'BAD':
+            raise ValueError('no data')
+        return ticker
+
+    pipeline = IngestPipeline(collection, fetch, lambda ticker, fetched: [InsertOne({'ticker': fetched})],
+                              on_failed=lambda ticker, stage, error: failed.append((ticker, stage)))
+
+    assert run_with_deadline(pipeline, ['A', 'BAD', 'B']) is None
+    assert failed == [('BAD', 'fetch')]
+    assert sorted(doc['ticker'] for doc in collection.documents) == ['A', 'B']
+
+
+@pytest.mark.parametrize('write_workers', [1, 2])
+def test_dead_write_worker_stops_the_pipeline(write_workers):
+    # A transform result that is not a list of operations kills the writer thread that receives it
+    pipeline = IngestPipeline(ListCollection(), fetch=lambda ticker: ticker, transform=lambda ticker, fetched: 5,
+                              fetch_workers=4, write_workers=write_workers, queue_size=2)
+
+    error = run_with_deadline(pipeline, [f"T{number}" for number in range(500)])
+    assert isinstance(error, RuntimeError) and 'write worker failed' in str(error)
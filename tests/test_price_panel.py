@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import price_loader
+from price_archive import PriceArchive
+from price_loader import PRICE_SOURCE_ENV
+from price_panel import load_price_panel
+
+
+class Cursor(list):
+    def sort(self, key):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+
+class DocumentCollection:
+    """Just enough of ohlcv_data for the documents cursor and archive_ticker: find returns every bar."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection):
+        return Cursor(dict(document) for document in self.documents)
+
+    def delete_many(self, query):
+        pass
+
+
+def test_panel_merges_the_archive_and_keeps_the_hot_bar(monkeypatch, tmp_path):
+    archive = PriceArchive(str(tmp_path))
+    archive.archive_ticker(DocumentCollection([
+        {'_id': 1, 'date': datetime(2024, 1, 2), 'close': 10.0},
+        {'_id': 2, 'date': datetime(2024, 1, 3), 'close': 99.0},
+    ]), 'AAA', datetime(2024, 1, 4))
+    monkeypatch.setattr(price_loader, '_archive', archive)
+    monkeypatch.setenv(PRICE_SOURCE_ENV, 'documents')
+
+    db = {'ohlcv_data': DocumentCollection([{'ticker': 'AAA', 'date': datetime(2024, 1, 3), 'close': 11.0}])}
+    panel = load_price_panel(db, fields=('close',))
+
+    assert panel.tickers == ['AAA']
+    assert panel.series('AAA').to_dict() == {datetime(2024, 1, 2): 10.0, datetime(2024, 1, 3): 11.0}
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from rs_engine import RS_FIELDS, RS_PERIODS, rs_matrices
+
+
+def server_reference(closes):
+    """
+    What rs_server.rs_pipeline() computes, bar by bar: each ticker's numeric, non-NaN closes in date
+    order, shifted back by each period, with no value where the earlier close is missing or zero.
+    """
+    expected = {field: np.full(closes.shape, np.nan) for field in RS_FIELDS}
+    for column in range(closes.shape[1]):
+        rows = np.flatnonzero(~np.isnan(closes[:, column]))
+        series = pd.Series(closes[rows, column])
+        for field, period in (('daily_pct_change', 1), *RS_PERIODS.items()):
+            previous = series.shift(period)
+            values = ((series - previous) / previous * 100).where(previous.notna() & (previous != 0))
+            expected[field][rows, column] = values.to_numpy()
+    return expected
+
+
+def test_python_engine_matches_the_server_pipeline():
+    rng = np.random.default_rng(7)
+    closes = 100 * np.cumprod(1 + rng.normal(0, 0.02, (600, 12)), axis=0)
+    closes[rng.random(closes.shape) < 0.05] = np.nan  # Days a ticker did not trade
+    closes[:150, 3] = np.nan  # Listed late
+    closes[rng.integers(0, 600, 4), 5] = 0.0  # Bad zero closes
+
+    matrices = rs_matrices(closes)
+    expected = server_reference(closes)
+    for field in RS_FIELDS:
+        np.testing.assert_allclose(matrices[field], expected[field], equal_nan=True, err_msg=field)
@@ -0,0 +1,171 @@
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import MO
+from pandas.tseries.holiday import (AbstractHolidayCalendar, Holiday, GoodFriday, EasterMonday, USMartinLutherKingJr,
+                                    USPresidentsDay, USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday,
+                                    next_monday, next_monday_or_tuesday, sunday_to_monday)
+from pandas.tseries.offsets import DateOffset
+
+# Range the session tables cover; day ids count sessions from CALENDAR_START
+CALENDAR_START = '2000-01-01'
+CALENDAR_END = '2035-12-31'
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+class LSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=next_monday),
+        GoodFriday,
+        EasterMonday,
+        Holiday('Early May Bank Holiday', month=5, day=1, offset=DateOffset(weekday=MO(1))),
+        Holiday('Spring Bank Holiday', month=5, day=31, offset=DateOffset(weekday=MO(-1))),
+        Holiday('Summer Bank Holiday', month=8, day=31, offset=DateOffset(weekday=MO(-1))),
+        Holiday('Christmas', month=12, day=25, observance=next_monday),
+        Holiday('Boxing Day', month=12, day=26, observance=next_monday_or_tuesday),
+    ]
+
+
+# One-off closures, and rule-based holidays that were moved that year and so were trading days
+SPECIAL_CLOSURES = {
+    'US': ['2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14', '2004-06-11', '2007-01-02',
+           '2012-10-29', '2012-10-30', '2018-12-05', '2025-01-09'],
+    'LSE': ['1999-12-31', '2002-06-03', '2002-06-04', '2011-04-29', '2012-06-04', '2012-06-05', '2020-05-08',
+            '2022-06-02', '2022-06-03', '2022-09-19', '2023-05-08'],
+}
+MOVED_HOLIDAYS = {
+    'US': [],
+    'LSE': ['2002-05-27', '2012-05-28', '2020-05-04', '2022-05-30'],
+}
+
+HOLIDAY_CALENDARS = {'US': NYSEHolidayCalendar, 'LSE': LSEHolidayCalendar}
+
+
+def exchange_for(ticker):
+    """London listings carry Yahoo's .L suffix; everything else trades on a US calendar."""
+    return 'LSE' if ticker.lower().endswith('.l') else 'US'
+
+
+@lru_cache(maxsize=None)
+def sessions(exchange):
+    """Every trading day of an exchange between CALENDAR_START and CALENDAR_END."""
+    holidays = HOLIDAY_CALENDARS[exchange]().holidays(CALENDAR_START, CALENDAR_END)
+    holidays = holidays.union(pd.DatetimeIndex(SPECIAL_CLOSURES[exchange]))
+    holidays = holidays.difference(pd.DatetimeIndex(MOVED_HOLIDAYS[exchange]))
+    weekdays = pd.bdate_range(CALENDAR_START, CALENDAR_END)
+    return weekdays.difference(holidays)
+
+
+@lru_cache(maxsize=None)
+def master_sessions():
+    """Days on which any supported exchange traded; a bar's day id is its position in this index."""
+    index = sessions('US')
+    for exchange in HOLIDAY_CALENDARS:
+        index = index.union(sessions(exchange))
+    return index
+
+
+def normalize_dates(dates):
+    """
+    Map bar timestamps to naive midnight date keys. yfinance's tz-aware index is already
+    exchange-local midnight; naive values read back from Mongo are UTC, so they are rounded to
+    the nearest midnight (London's 23:00 and New York's 04:00/05:00 UTC land on their own day).
+    """
+    dates = pd.DatetimeIndex(dates)
+    if dates.tz is not None:
+        return dates.tz_localize(None).normalize()
+    return dates.round('D')
+
+
+def normalize_date(date):
+    """normalize_dates() for a single timestamp, as the datetime stored under 'date'."""
+    return normalize_dates([date])[0].to_pydatetime()
+
+
+def day_ids(dates):
+    """Integer day id per date (index into master_sessions()), -1 for days no exchange traded."""
+    return master_sessions().get_indexer(normalize_dates(dates))
+
+
+def date_keys(dates):
+    """(date keys, day ids) for writes: the datetimes stored under 'date' and the ids stored under 'day_id'."""
+    normalized = normalize_dates(dates)
+    ids = master_sessions().get_indexer(normalized)
+    return normalized.to_pydatetime(), [int(day_id) if day_id >= 0 else None for day_id in ids]
+
+
+def _session_ids(values, name):
+    """day_ids() of a series' index, logging the values dated on days no exchange traded, which are left out."""
+    ids = day_ids(values.index)
+    off_session = ids < 0
+    if off_session.any():
+        first = pd.Timestamp(values.index[np.flatnonzero(off_session)[0]])
+        logging.warning(f"Ignoring {off_session.sum()} {name} values dated on days no exchange traded "
+                        f"(first {first:%Y-%m-%d})")
+    return ids
+
+
+def align_series(**series):
+    """
+    Inner-join date-indexed series on their trading day by array indexing rather than a hash merge.
+    Returns a frame with a 'date' column and one column per keyword, keeping only the days every
+    series has a value for, e.g. align_series(close_ticker=ticker['close'], close_benchmark=benchmark['close']).
+    Values dated on days no exchange traded are logged and left out.
+    """
+    columns = {}
+    present = None
+    for name, values in series.items():
+        ids = _session_ids(values, name)
+        valid = ids >= 0
+        column = np.full(len(master_sessions()), np.nan)
+        column[ids[valid]] = values.to_numpy(dtype='float64')[valid]
+        columns[name] = column
+        has_value = ~np.isnan(column)
+        present = has_value if present is None else present & has_value
+
+    rows = np.flatnonzero(present)
+    frame = pd.DataFrame({name: column[rows] for name, column in columns.items()})
+    frame.insert(0, 'date', master_sessions()[rows])
+    return frame
+
+
+def mean_by_day(series_list):
+    """
+    Average several date-indexed series per trading day (NaNs ignored), as a day-indexed series.
+    Values dated on days no exchange traded are logged and left out.
+    """
+    size = len(master_sessions())
+    totals = np.zeros(size)
+    counts = np.zeros(size)
+    for values in series_list:
+        ids = _session_ids(values, values.name or 'series')
+        data = values.to_numpy(dtype='float64')
+        valid = (ids >= 0) & ~np.isnan(data)
+        totals += np.bincount(ids[valid], weights=data[valid], minlength=size)
+        counts += np.bincount(ids[valid], minlength=size)
+    rows = np.flatnonzero(counts)
+    return pd.Series(totals[rows] / counts[rows], index=pd.DatetimeIndex(master_sessions()[rows], name='date'))
+
+
+def has_session_since(ticker, last_date, until):
+    """True when the ticker's exchange traded on a day after last_date, up to and including until."""
+    exchange_sessions = sessions(exchange_for(ticker))
+    start = exchange_sessions.searchsorted(normalize_dates([last_date])[0], side='right')
+    end = exchange_sessions.searchsorted(pd.Timestamp(until).normalize(), side='right')
+    return end > start
@@ -1,8 +1,10 @@
 import pandas as pd
-from pymongo import MongoClient, UpdateOne
+from mongo_client import DB_NAME, get_db
 import logging
+import argparse
 from datetime import datetime
 import numpy as np
+from indicator_snapshots import write_indicators
 
 # Setup basic logging
 logging.basicConfig(
@@ -11,10 +13,13 @@ logging.basicConfig(
 )
 
 class RSScoreCalculator:
-    def __init__(self, mongodb_uri="mongodb://mongodb-9iyq:27017", db_name='StockData'):
-        """Initialize the RS Score Calculator with MongoDB connection."""
-        self.client = MongoClient(mongodb_uri)
-        self.db = self.client[db_name]
+    def __init__(self, db=None, db_name=DB_NAME, publish=False):
+        """
+        Initialize the RS Score Calculator on the given database, or the shared MongoDB connection.
+        With publish=True the scores replace indicators as one atomic snapshot swap.
+        """
+        self.db = db if db is not None else get_db(db_name)
+        self.publish = publish
         self.ohlcv_collection = self.db['ohlcv_data']
         self.indicators_collection = self.db['indicators']
         
@@ -124,38 +129,25 @@ class RSScoreCalculator:
         df['sector_rank'] = df.groupby('sector')['sector_score'].rank(ascending=False, method='min').astype(int)
         df['industry_rank'] = df.groupby('industry')['industry_score'].rank(ascending=False, method='min').astype(int)
         
-        # Prepare bulk operations with only essential fields
-        bulk_operations = []
+        # Collect only the essential fields per (ticker, date)
+        updates = {}
         for _, row in df.iterrows():
-            bulk_operations.append(
-                UpdateOne(
-                    {
-                        "ticker": row['ticker'],
-                        "date": row['date']
-                    },
-                    {
-                        "$set": {
-                            # Market score and rank
-                            "rs_score_market": int(row['market_score']),
-                            "rs_rank_market": int(row['market_rank']),
-                            
-                            # Sector score and rank
-                            "rs_score_sector": int(row['sector_score']),
-                            "rs_rank_sector": int(row['sector_rank']),
-                            
-                            # Industry score and rank
-                            "rs_score_industry": int(row['industry_score']),
-                            "rs_rank_industry": int(row['industry_rank'])
-                        }
-                    },
-                    upsert=True
-                )
-            )
+            updates[(row['ticker'], pd.Timestamp(row['date']).to_pydatetime())] = {
+                # Market score and rank
+                "rs_score_market": int(row['market_score']),
+                "rs_rank_market": int(row['market_rank']),
+                
+                # Sector score and rank
+                "rs_score_sector": int(row['sector_score']),
+                "rs_rank_sector": int(row['sector_rank']),
+                
+                # Industry score and rank
+                "rs_score_industry": int(row['industry_score']),
+                "rs_rank_industry": int(row['industry_rank'])
+            }
         
-        # Execute bulk update
-        if bulk_operations:
-            result = self.indicators_collection.bulk_write(bulk_operations, ordered=False)
-            logging.info(f"Updated {result.modified_count} documents")
+        # Execute bulk update, or publish the whole ranking as one snapshot swap
+        write_indicators(self.db, updates, key=('ticker', 'date'), publish=self.publish)
 
     def calculate_all_scores(self):
         """Calculate and update RS scores for all stocks."""
@@ -194,5 +186,9 @@ class RSScoreCalculator:
             logging.error(f"Error in calculate_all_scores: {str(e)}")
 
 if __name__ == "__main__":
-    calculator = RSScoreCalculator()
+    parser = argparse.ArgumentParser(description="Recalculate market, sector and industry RS scores and ranks")
+    parser.add_argument('--publish', action='store_true',
+                        help="write a complete new indicators snapshot and swap it in atomically")
+    args = parser.parse_args()
+    calculator = RSScoreCalculator(publish=args.publish)
     calculator.calculate_all_scores()
\ No newline at end of file
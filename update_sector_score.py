@@ -1,13 +1,13 @@
-from pymongo import MongoClient, UpdateOne
+from pymongo import UpdateOne
+from mongo_client import get_db
 import pandas as pd
 import logging
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
-# MongoDB connection setup
-client = MongoClient("mongodb://mongodb-9iyq:27017")
-db = client['StockData']
+# MongoDB connection (shared pool, configured through MONGO_URI)
+db = get_db()
 indicators_collection = db['indicators']
 
 def calculate_rs_scores_for_group(stocks, field_name):
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from trading_calendar import normalize_date
+
+# Collection holding the last stored bar date (high-water mark) per ticker
+WATERMARK_COLLECTION = 'ingest_watermarks'
+
+
+def get_watermarks(db, tickers):
+    """
+    Return {ticker: last stored bar date} for the given tickers.
+    Tickers without a watermark yet are bootstrapped from their newest ohlcv_data row,
+    and tickers that have never been stored map to None.
+    """
+    watermarks = {doc['ticker']: doc['last_date'] for doc in db[WATERMARK_COLLECTION].find(
+        {'ticker': {'$in': list(tickers)}},
+        {'ticker': 1, 'last_date': 1, '_id': 0}
+    )}
+
+    for ticker in tickers:
+        if ticker in watermarks:
+            continue
+        latest = db['ohlcv_data'].find_one({'ticker': ticker}, {'date': 1}, sort=[('date', -1)])
+        watermarks[ticker] = normalize_date(latest['date']) if latest else None
+        if latest:
+            set_watermark(db, ticker, latest['date'])
+
+    return watermarks
+
+
+def get_watermark(db, ticker):
+    """Return the last stored bar date for a single ticker, or None."""
+    return get_watermarks(db, [ticker])[ticker]
+
+
+def set_watermark(db, ticker, last_date):
+    """Advance a ticker's watermark to a bar's normalized date. $max keeps it monotonic when several writers race."""
+    last_date = normalize_date(last_date)
+    db[WATERMARK_COLLECTION].update_one(
+        {'ticker': ticker},
+        {'$max': {'last_date': last_date}, '$set': {'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def mark_rewritten(db, tickers=None):
+    """
+    Record that stored bars were changed in place (a backfill merge, the date key migration, archiving)
+    rather than appended after the watermark, so caches that only pull newer bars rebuild these tickers.
+    tickers=None marks every ticker with a watermark.
+    """
+    now = datetime.utcnow()
+    query = {} if tickers is None else {'ticker': {'$in': list(tickers)}}
+    db[WATERMARK_COLLECTION].update_many(query, {'$set': {'rewritten_at': now, 'updated_at': now}})
+
+
+def history_range(watermark):
+    """
+    Return the (start, end) dates to request for a ticker, or None when it has no watermark.
+    The start is inclusive of the watermark's day so a partial bar stored intraday gets refreshed;
+    the end is exclusive in yfinance, so it is set to tomorrow.
+    """
+    if watermark is None:
+        return None
+    end = datetime.utcnow().date() + timedelta(days=1)
+    return watermark.date(), end
+
+
+def rows_after_watermark(hist, watermark, inclusive=True):
+    """
+    Drop the rows of a history frame that are older than the ticker's watermark.
+    With inclusive=False the watermark's own day is dropped too, for insert-only
+    (time-series) storage where re-writing that bar would duplicate it.
+    """
+    if watermark is None or hist.empty:
+        return hist
+    cutoff = pd.Timestamp(watermark.date())
+    if hist.index.tz is not None:
+        cutoff = cutoff.tz_localize(hist.index.tz)
+    return hist[hist.index >= cutoff] if inclusive else hist[hist.index > cutoff]
+